@@ -3,13 +3,25 @@ import numpy as np
 import streamlit as st
 import warnings
 import os
+from functools import partial
 
 # 导入自定义模块
-from utils.io import load_data
-from utils.prep import preprocess_data
+from utils.io import get_file_fingerprint, DATA_PATH, STREAMING_AUTO_BYTES
+from utils.memory import track_rss
+from utils.filters import (load_filter_index, load_dimension_catalog, cached_select_rows,
+                           normalize_filters, filter_state_hash, default_ranges, KEYWORD_FILTER)
+from utils.crossfilter import load_binned_columns, load_crossfilter
+from utils.cube import load_category_cube
+from utils.sketch import load_sketch_columns, load_filter_sketches
+from utils.text_index import load_text_index
+from utils.correlation import load_filter_correlations
+from utils.incremental import load_processed_data, get_data_version, start_data_watcher, DATA_WATCH_INTERVAL
+from utils.agg import load_streaming_aggregate
 from sections.intro import show_intro, show_data_caveats
-from sections.overview import show_kpi_metrics, show_data_quality_report
-from sections.deep_dives import show_deep_dives
+from sections.overview import (show_kpi_metrics, show_data_quality_report, format_bytes,
+                               show_kpi_metrics_from_aggregate, show_data_quality_report_from_aggregate)
+from sections.deep_dives import (show_deep_dives, show_distributions_from_aggregate,
+                                 show_advanced_analytics_from_aggregate)
 from sections.conclusions import show_conclusions, show_implications
 
 warnings.filterwarnings('ignore')
@@ -94,11 +106,68 @@ def setup_sidebar():
         st.sidebar.info("请将WUT.png文件放入assets目录")
 
 
+def setup_data_mode():
+    """设置数据加载模式，返回(是否使用流式模式, 是否使用紧凑内存模式)"""
+    st.sidebar.markdown("---")
+    st.sidebar.subheader("⚙️ Data Mode")
+
+    # 大文件默认使用流式模式
+    try:
+        large_file = get_file_fingerprint(DATA_PATH)['size'] >= STREAMING_AUTO_BYTES
+    except OSError:
+        large_file = False
+
+    streaming = st.sidebar.checkbox(
+        "🌊 Streaming mode",
+        value=large_file,
+        help="Read the dataset in chunks and keep only aggregates in memory. "
+             "Use for datasets larger than RAM; filters and row-level charts are disabled."
+    )
+    compact = st.sidebar.checkbox(
+        "🗜️ Compact memory",
+        value=True,
+        disabled=streaming,
+        help="Store status and category columns as categoricals, counts as uint32 and rates as float32, "
+             "and drop the raw numeric columns once cleaned."
+    )
+    return streaming, compact
+
+
+@st.fragment(run_every=DATA_WATCH_INTERVAL)
+def watch_data_updates(df, compact):
+    """数据文件被后台线程刷新后重新运行页面，无需重启服务"""
+    if get_data_version(compact=compact) != df.attrs.get('data_version'):
+        st.rerun()
+
+    mode, rows = df.attrs.get('last_refresh', ('full', len(df)))
+    if mode == 'append':
+        st.caption(f"🔄 Data v{df.attrs['data_version']}: {rows:,} new rows appended ({len(df):,} total)")
+    else:
+        st.caption(f"🔄 Data v{df.attrs.get('data_version', 1)}: {len(df):,} rows, watching for updates")
+
+
 # -----------------------------
 # Main interface filters
 # -----------------------------
-def setup_main_filters(df):
-    """在主界面设置过滤器"""
+def category_multiselect(label, dimension):
+    """根据维度目录生成多选框，选项附带行数，缺失值作为单独选项；列不存在时返回空列表（不过滤）"""
+    if dimension is None:
+        return []
+
+    counts = dict(dimension['values'])
+    if dimension['null_count']:
+        counts[None] = dimension['null_count']
+    options = list(counts)
+    return st.multiselect(
+        label,
+        options=options,
+        default=options,
+        format_func=lambda value: f"{'(missing)' if value is None else value} ({counts[value]:,})"
+    )
+
+
+def setup_main_filters(catalog, keyword_search=False):
+    """在主界面设置过滤器（选项和范围来自维度目录）；keyword_search为True时显示转录文本关键词搜索"""
     st.header("🔍 Data Filters")
     st.markdown("""
     ### 🎛️ Customize Your Analysis Scope
@@ -115,6 +184,10 @@ def setup_main_filters(df):
     - Compare filtered vs unfiltered results to understand impacts
     - Save interesting filter combinations for future analysis
     """)
+    categorical = catalog['categorical']
+    numeric = catalog['numeric']
+    defaults = default_ranges(catalog)
+
     with st.expander("Filter Options", expanded=True):
         col1, col2, col3 = st.columns(3)
 
@@ -122,56 +195,26 @@ def setup_main_filters(df):
 
         with col1:
             # Status filters
-            if 'verified_status' in df.columns:
-                filters['verified_options'] = st.multiselect(
-                    "✅ Verified Status",
-                    options=df['verified_status'].unique(),
-                    default=df['verified_status'].unique()
-                )
-            else:
-                filters['verified_options'] = []
-
-            if 'author_ban_status' in df.columns:
-                filters['ban_options'] = st.multiselect(
-                    "🚫 Author Ban Status",
-                    options=df['author_ban_status'].unique(),
-                    default=df['author_ban_status'].unique()
-                )
-            else:
-                filters['ban_options'] = []
+            filters['verified_options'] = category_multiselect("✅ Verified Status", categorical.get('verified_status'))
+            filters['ban_options'] = category_multiselect("🚫 Author Ban Status", categorical.get('author_ban_status'))
 
         with col2:
-            if 'claim_status' in df.columns:
-                filters['claim_options'] = st.multiselect(
-                    "📋 Claim Status",
-                    options=df['claim_status'].unique(),
-                    default=df['claim_status'].unique()
-                )
-            else:
-                filters['claim_options'] = []
+            filters['claim_options'] = category_multiselect("📋 Claim Status", categorical.get('claim_status'))
 
             # Content category filter
-            if 'content_category' in df.columns:
-                filters['category_options'] = st.multiselect(
-                    "📁 Content Category",
-                    options=df['content_category'].unique(),
-                    default=df['content_category'].unique()
-                )
-            else:
-                filters['category_options'] = []
+            filters['category_options'] = category_multiselect("📁 Content Category",
+                                                               categorical.get('content_category'))
 
         with col3:
             # Video duration filter
-            if 'video_duration_sec_clean' in df.columns:
-                duration_data = df['video_duration_sec_clean'].dropna()
-                if not duration_data.empty:
-                    duration_min = float(duration_data.min())
-                    duration_max = float(duration_data.max())
+            duration = numeric.get('video_duration_sec_clean')
+            if duration is not None:
+                if duration['min'] is not None:
                     filters['min_duration'], filters['max_duration'] = st.slider(
                         "⏱️ Video Duration (seconds)",
-                        min_value=duration_min,
-                        max_value=duration_max,
-                        value=(0.0, min(duration_max, 60.0)),
+                        min_value=duration['min'],
+                        max_value=duration['max'],
+                        value=defaults['video_duration_sec_clean'],
                         help="Filter videos by duration in seconds"
                     )
                 else:
@@ -181,16 +224,14 @@ def setup_main_filters(df):
                 filters['min_duration'], filters['max_duration'] = (0, 60)
 
             # View count filter
-            if 'video_view_count_clean' in df.columns:
-                view_data = df['video_view_count_clean'].dropna()
-                if not view_data.empty:
-                    view_min = float(view_data.min())
-                    view_max = float(view_data.max())
+            views = numeric.get('video_view_count_clean')
+            if views is not None:
+                if views['min'] is not None:
                     filters['min_views'], filters['max_views'] = st.slider(
                         "👀 View Count Range",
-                        min_value=view_min,
-                        max_value=view_max,
-                        value=(0.0, min(view_max, float(view_data.quantile(0.95)) if not view_data.empty else 1000000)),
+                        min_value=views['min'],
+                        max_value=views['max'],
+                        value=defaults['video_view_count_clean'],
                         help="Filter videos by view count range"
                     )
                 else:
@@ -199,87 +240,155 @@ def setup_main_filters(df):
             else:
                 filters['min_views'], filters['max_views'] = (0, 1000000)
 
+        # 转录文本关键词搜索（由倒排索引回答，与其他过滤条件取交集）
+        if keyword_search:
+            filters[KEYWORD_FILTER] = st.text_input(
+                "🔎 Transcription Keywords",
+                placeholder="e.g. vaccine OR covid -opinion",
+                help="Keep videos whose transcription contains all of the words. Use OR between alternatives "
+                     "and -word to exclude a word. Common stop words and numbers are ignored"
+            )
+
     return filters
 
 
-def apply_filters(df, filters):
-    """应用过滤器"""
-    filtered_df = df.copy()
+def apply_filters(df, filters, index, data_key):
+    """
+    应用过滤器: 行号来自共享的结果缓存或过滤索引，最后只取一次子集（不复制整个表）
+
+    返回(过滤后的数据, 行号数组)
+    """
+    stage_memory = {}
+    with track_rss('filter', stage_memory):
+        row_ids, source = cached_select_rows(data_key, filters, index)
+        filtered_df = df.take(row_ids)
+
+        # category列只保留筛选结果中出现的类别，避免图表中出现计数为0的类别
+        for col in filtered_df.select_dtypes('category').columns:
+            filtered_df[col] = filtered_df[col].cat.remove_unused_categories()
+
+    filtered_df.attrs = {**filtered_df.attrs, 'filter_memory': stage_memory.get('filter'), 'filter_source': source}
+    return filtered_df, row_ids
+
+
+# -----------------------------
+# Main application flow
+# -----------------------------
+def show_footer():
+    """显示页脚"""
+    st.markdown("---")
+    st.caption("TikTok Video Data Analyzer | Built with Streamlit")
+    st.caption("Project by Jianyu Li (20252230) | Supervised by Prof. Mano Joseph MATHEW")
 
-    if filters['verified_options']:
-        filtered_df = filtered_df[filtered_df['verified_status'].isin(filters['verified_options'])]
 
-    if filters['ban_options']:
-        filtered_df = filtered_df[filtered_df['author_ban_status'].isin(filters['ban_options'])]
+def run_streaming_mode():
+    """流式模式: 只基于分块聚合结果渲染，不保留原始行"""
+    aggregate = load_streaming_aggregate()
 
-    if filters['claim_options']:
-        filtered_df = filtered_df[filtered_df['claim_status'].isin(filters['claim_options'])]
+    if aggregate is None or aggregate.row_count == 0:
+        st.error("No data loaded. Please check if tiktok_dataset.csv exists in the same directory.")
+        st.stop()
 
-    if filters['category_options'] and 'content_category' in df.columns:
-        filtered_df = filtered_df[filtered_df['content_category'].isin(filters['category_options'])]
+    show_intro()
+    show_data_caveats()
 
-    if 'video_duration_sec_clean' in df.columns:
-        filtered_df = filtered_df[
-            (filtered_df['video_duration_sec_clean'] >= filters['min_duration']) &
-            (filtered_df['video_duration_sec_clean'] <= filters['max_duration'])
-            ]
+    st.header("📊 Key Metrics")
+    show_kpi_metrics_from_aggregate(aggregate)
+    show_data_quality_report_from_aggregate(aggregate)
 
-    if 'video_view_count_clean' in df.columns:
-        filtered_df = filtered_df[
-            (filtered_df['video_view_count_clean'] >= filters['min_views']) &
-            (filtered_df['video_view_count_clean'] <= filters['max_views'])
-            ]
+    st.markdown("---")
+    st.info("🌊 Streaming mode is on: metrics are computed from chunked aggregates over "
+            f"{aggregate.row_count:,} videos. Filters and row-level analysis are disabled; "
+            "turn off streaming mode in the sidebar to use them.")
 
-    return filtered_df
+    show_distributions_from_aggregate(aggregate)
+    show_advanced_analytics_from_aggregate(aggregate)
+    show_implications()
+    show_footer()
 
 
-# -----------------------------
-# Main application flow
-# -----------------------------
 def main():
     # 设置侧边栏内容
     setup_sidebar()
 
-    # 加载数据
-    df_raw = load_data()
+    streaming, compact = setup_data_mode()
+    if streaming:
+        run_streaming_mode()
+        return
+
+    # 加载并预处理数据（文件追加新行时只处理新增部分）
+    df = load_processed_data(compact=compact)
 
-    if df_raw.empty:
+    if df.empty:
         st.error("No data loaded. Please check if tiktok_dataset.csv exists in the same directory.")
         st.stop()
 
-    # 预处理数据
-    df = preprocess_data(df_raw)
+    # 监视数据文件，更新后自动刷新页面
+    start_data_watcher()
+    with st.sidebar:
+        watch_data_updates(df, compact)
 
     # 显示介绍部分
     show_intro()
     show_data_caveats()
 
-    # 显示KPI指标（使用原始数据）
+    # 显示KPI指标（使用原始数据，由分类维度立方体汇总得到）
+    data_key = (DATA_PATH, compact, df.attrs.get('data_version'))
+    sketch_columns = load_sketch_columns(data_key, df)
+    catalog = load_dimension_catalog(data_key, df)
+    cube = load_category_cube(data_key, df, sketch_columns, default_ranges(catalog))
     st.header("📊 Key Metrics")
-    show_kpi_metrics(df)
+    show_kpi_metrics(df, cube.rollup())
 
     # 显示数据质量报告
     show_data_quality_report(df)
 
     # 设置主界面过滤器
     st.markdown("---")  # 添加分隔线
-    filters = setup_main_filters(df)
+    # 转录文本的词频矩阵和倒排索引按数据版本构建一次，并与数据集缓存一起保存
+    term_matrix, inverted_index = load_text_index(data_key, df)
+    filters = setup_main_filters(catalog, keyword_search=inverted_index is not None)
 
-    # 应用过滤器
-    filtered_df = apply_filters(df, filters)
+    # 应用过滤器（过滤索引按数据版本构建一次）
+    index = load_filter_index(data_key, df, inverted_index)
+    filtered_df, row_ids = apply_filters(df, filters, index, data_key)
 
     # 显示过滤结果统计
     st.success(f"✅ Filtered dataset: {len(filtered_df)} videos (from original {len(df)} videos)")
+    source_labels = {'cache': 'served from the filter cache', 'refined': 'refined from a cached wider filter',
+                     'computed': 'computed from the filter index'}
+    filter_memory = filtered_df.attrs.get('filter_memory')
+    caption = f"Filter result {source_labels.get(filtered_df.attrs.get('filter_source'), 'computed')}"
+    if filter_memory:
+        change = filter_memory['end'] - filter_memory['start']
+        caption += (f" | RSS: {format_bytes(filter_memory['end'])} "
+                    f"({'+' if change >= 0 else '-'}{format_bytes(abs(change))} while filtering)")
+    # 只有分类过滤器生效时，汇总统计直接由立方体单元格合并得到
+    aggregate = cube.rollup(filters)
+    if aggregate is not None:
+        caption += " | summaries rolled up from the category cube"
+    st.caption(caption)
+    if filters.get(KEYWORD_FILTER):
+        ignored = inverted_index.search(filters[KEYWORD_FILTER])[1]
+        if ignored:
+            st.caption(f"Ignored in keyword search (stop words and numbers): {', '.join(sorted(set(ignored)))}")
+
+    # 联动直方图的分箱计数立方体（分箱编号按数据版本计算，计数按过滤条件计算）
+    state_hash = filter_state_hash(normalize_filters(filters))
+    crossfilter = load_crossfilter(data_key, state_hash, load_binned_columns(data_key, df), row_ids)
+
+    # 分位数草图: 只有分类过滤器生效时来自立方体，否则对过滤结果的桶编号计数一次
+    sketches = (aggregate.sketches if aggregate is not None
+                else load_filter_sketches(data_key, state_hash, sketch_columns, row_ids))
+
+    # 相关矩阵按过滤条件缓存，只在性能指标标签页打开时计算
+    correlations = partial(load_filter_correlations, data_key, state_hash, df, row_ids)
 
     # 显示深度分析和结论（使用过滤后的数据）
-    show_deep_dives(filtered_df)
-    show_conclusions(filtered_df)
+    show_deep_dives(filtered_df, aggregate, crossfilter, sketches, term_matrix, row_ids, correlations)
+    show_conclusions(filtered_df, aggregate)
     show_implications()
-
-    # Footer
-    st.markdown("---")
-    st.caption("TikTok Video Data Analyzer | Built with Streamlit")
-    st.caption("Project by Jianyu Li (20252230) | Supervised by Prof. Mano Joseph MATHEW")
+    show_footer()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,65 @@
+"""
+数值清洗基准: 逐值apply(clean_numeric_data) vs 向量化clean_numeric_series
+
+运行: python -m benchmarks.bench_clean --rows 1000000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.prep import clean_numeric_data, clean_numeric_series
+
+
+def make_plain_column(rows, rng):
+    """只含普通数字和缺失值的列（与Kaggle导出格式一致）"""
+    values = rng.lognormal(9, 2.5, rows).round().astype(object)
+    values[rng.random(rows) < 0.015] = np.nan
+    return pd.Series(values, dtype=object)
+
+
+def make_scraped_column(rows, rng):
+    """混合千位分隔符、K/M后缀、空白和无效值的列"""
+    numbers = rng.lognormal(9, 2.5, rows)
+    formats = rng.integers(0, 5, rows)
+    values = np.empty(rows, dtype=object)
+    values[formats == 0] = [f"{v:.0f}" for v in numbers[formats == 0]]
+    values[formats == 1] = [f"{v:,.0f}" for v in numbers[formats == 1]]
+    values[formats == 2] = [f" {v / 1e3:.1f}K " for v in numbers[formats == 2]]
+    values[formats == 3] = [f"{v / 1e6:.2f}M" for v in numbers[formats == 3]]
+    values[formats == 4] = np.nan
+    values[rng.random(rows) < 0.001] = 'n/a'
+    return pd.Series(values, dtype=object)
+
+
+def time_call(func, repeat):
+    best = np.inf
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def run(rows, repeat):
+    rng = np.random.default_rng(42)
+    for name, series in [('plain', make_plain_column(rows, rng)), ('scraped', make_scraped_column(rows, rng))]:
+        per_cell_time, per_cell = time_call(lambda: series.apply(clean_numeric_data), repeat)
+        vectorized_time, (vectorized, failures) = time_call(lambda: clean_numeric_series(series), repeat)
+
+        parsed_per_cell = int(per_cell.notna().sum())
+        parsed_vectorized = int(vectorized.notna().sum())
+        print(f"[{name}] rows={rows:,}")
+        print(f"  per-cell apply : {per_cell_time * 1000:9.1f} ms  parsed={parsed_per_cell:,}")
+        print(f"  vectorized     : {vectorized_time * 1000:9.1f} ms  parsed={parsed_vectorized:,}  failures={failures:,}")
+        print(f"  speedup        : {per_cell_time / vectorized_time:9.1f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    run(args.rows, args.repeat)
@@ -0,0 +1,115 @@
+"""
+过滤基准: 原apply_filters（copy + 逐个布尔索引）vs 过滤索引
+
+运行: python -m benchmarks.bench_filters --rows 1000000 10000000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.filters import FilterIndex, FilterResultCache
+
+CATEGORY_VALUES = {
+    'verified_status': ['verified', 'not verified'],
+    'author_ban_status': ['active', 'under review', 'banned'],
+    'claim_status': ['claim', 'opinion'],
+    'content_category': ['Science', 'History', 'Technology', 'Sports', 'Animals', 'Geography', 'Other'],
+}
+
+FILTERS = {
+    'verified_options': ['not verified'],
+    'ban_options': ['active', 'under review'],
+    'claim_options': ['claim', 'opinion'],
+    'category_options': ['Science', 'History', 'Technology'],
+    'min_duration': 5.0, 'max_duration': 30.0,
+    'min_views': 1000.0, 'max_views': 500000.0,
+}
+
+# 拖动滑块到较窄范围时的过滤条件
+NARROW_FILTERS = dict(FILTERS, min_duration=20.0, max_duration=22.0, min_views=5000.0, max_views=6000.0)
+
+
+def make_frame(rows, rng):
+    """与紧凑内存模式相同的列类型"""
+    data = {col: pd.Categorical.from_codes(rng.integers(0, len(values), rows), categories=values)
+            for col, values in CATEGORY_VALUES.items()}
+    data['video_duration_sec_clean'] = rng.integers(5, 61, rows).astype(np.float32)
+    data['video_view_count_clean'] = np.minimum(rng.lognormal(9, 2.5, rows), 4e9).astype(np.uint32)
+    return pd.DataFrame(data)
+
+
+def sequential_filters(df, filters):
+    """原实现: 先复制，再对每个条件做一次布尔索引"""
+    filtered_df = df.copy()
+    filtered_df = filtered_df[filtered_df['verified_status'].isin(filters['verified_options'])]
+    filtered_df = filtered_df[filtered_df['author_ban_status'].isin(filters['ban_options'])]
+    filtered_df = filtered_df[filtered_df['claim_status'].isin(filters['claim_options'])]
+    filtered_df = filtered_df[filtered_df['content_category'].isin(filters['category_options'])]
+    filtered_df = filtered_df[(filtered_df['video_duration_sec_clean'] >= filters['min_duration']) &
+                              (filtered_df['video_duration_sec_clean'] <= filters['max_duration'])]
+    filtered_df = filtered_df[(filtered_df['video_view_count_clean'] >= filters['min_views']) &
+                              (filtered_df['video_view_count_clean'] <= filters['max_views'])]
+    return filtered_df
+
+
+def time_call(func, repeat):
+    best = np.inf
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def time_refinement(data_key, index, wider, narrower, repeat):
+    """在只缓存了wider结果的新缓存上计算narrower，返回(耗时, 来源)"""
+    best = np.inf
+    for _ in range(repeat):
+        cache = FilterResultCache()
+        cache.select_rows(data_key, wider, index)
+        start = time.perf_counter()
+        _, source = cache.select_rows(data_key, narrower, index)
+        best = min(best, time.perf_counter() - start)
+    return best, source
+
+
+def run(row_counts, repeat):
+    rng = np.random.default_rng(42)
+    for rows in row_counts:
+        df = make_frame(rows, rng)
+        build_time, index = time_call(lambda: FilterIndex.from_frame(df), 1)
+        print(f"rows={rows:,}  index build: {build_time * 1000:.1f} ms (once per data version)")
+
+        for name, filters in [('wide', FILTERS), ('narrow', NARROW_FILTERS)]:
+            sequential_time, expected = time_call(lambda: sequential_filters(df, filters), repeat)
+            select_time, row_ids = time_call(lambda: index.select_rows(filters), repeat)
+            take_time, filtered = time_call(lambda: df.take(row_ids), repeat)
+
+            assert filtered.index.equals(expected.index)
+            print(f"  [{name}] matched={len(row_ids):,}")
+            print(f"    sequential passes: {sequential_time * 1000:9.1f} ms")
+            print(f"    index select     : {select_time * 1000:9.1f} ms")
+            print(f"    take matched rows: {take_time * 1000:9.1f} ms")
+
+        # 结果缓存: 重复相同条件直接命中；更窄的条件在已缓存的宽条件结果上细化
+        cache = FilterResultCache()
+        cache.select_rows(rows, FILTERS, index)
+        hit_time, (_, source) = time_call(lambda: cache.select_rows(rows, FILTERS, index), repeat)
+        assert source == 'cache'
+        print(f"  [cache] hit             : {hit_time * 1000:9.3f} ms")
+        # 只收窄分类条件时范围切片仍然很宽，在缓存结果上细化更快
+        fewer_categories = dict(FILTERS, category_options=['Science'])
+        for name, narrower in [('fewer categories', fewer_categories), ('narrow sliders', NARROW_FILTERS)]:
+            refine_time, source = time_refinement(rows, index, FILTERS, narrower, repeat)
+            print(f"  [cache] {name:<16}: {refine_time * 1000:9.3f} ms ({source})")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000_000, 10_000_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    run(args.rows, args.repeat)
@@ -0,0 +1,56 @@
+"""
+关键词搜索基准: str.contains逐行扫描转录文本 vs 倒排索引（压缩的行号列表 / 位集）
+
+运行: python -m benchmarks.bench_keywords --rows 1000000 --words 12
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.bench_filters import time_call
+from utils.text_index import TermMatrix, InvertedIndex
+
+
+def make_texts(rows, words, rng):
+    """词频服从Zipf分布的合成转录文本（w1最常见）"""
+    ranks = np.minimum(rng.zipf(1.3, size=(rows, words)), 200_000)
+    vocabulary = np.array([f'w{rank}' for rank in range(200_001)], dtype=object)
+    return pd.Series([' '.join(row) for row in vocabulary[ranks]])
+
+
+def run(rows, words, repeat):
+    rng = np.random.default_rng(42)
+    texts = make_texts(rows, words, rng)
+    matrix_time, matrix = time_call(lambda: TermMatrix.from_texts(texts), 1)
+    index_time, index = time_call(lambda: InvertedIndex.from_term_matrix(matrix), 1)
+    raw_bytes = len(matrix.indices) * 4
+    print(f"rows={rows:,}  vocabulary={len(matrix.vocabulary):,}  term matrix {matrix_time:.1f} s, "
+          f"inverted index {index_time:.1f} s (once per data version)")
+    print(f"  postings: {index.nbytes / 1e6:.1f} MB compressed vs {raw_bytes / 1e6:.1f} MB as int32 row ids, "
+          f"{int(index.dense.sum())} terms stored as bitsets")
+
+    queries = ['w1', 'w7', 'w150', 'w5000', 'w7 w150', 'w150 OR w5000', 'w7 -w1', 'w150 w5000 OR w7 -w2']
+    print(f"  {'query':<22} {'matches':>9} {'str.contains':>13} {'index':>10}")
+    for query in queries:
+        result, _ = index.search(query)
+        kind, data = result
+        matches = len(data) if kind == 'ids' else int(np.unpackbits(data, count=rows, bitorder='little').sum())
+        search_time, _ = time_call(lambda: index.search(query), repeat)
+        # 只对单个词比较逐行扫描
+        if ' ' not in query:
+            scan_time, scanned = time_call(lambda: texts.str.contains(rf'\b{query}\b', regex=True), 1)
+            assert int(scanned.sum()) == matches
+            scan = f"{scan_time * 1000:10.1f} ms"
+        else:
+            scan = f"{'-':>13}"
+        print(f"  {query:<22} {matches:>9,} {scan} {search_time * 1000:7.3f} ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--words', type=int, default=12)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    run(args.rows, args.words, args.repeat)
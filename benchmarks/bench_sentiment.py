@@ -0,0 +1,73 @@
+"""
+情感分析后端基准: 各后端的吞吐量，以及与TextBlob结果的一致程度
+
+数据集中的转录文本几乎没有否定、修饰和感叹，另外用含这些结构的合成句子检查一致程度。
+
+运行: python -m benchmarks.bench_sentiment --path tiktok_dataset.csv --rows 20000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from utils.io import DATA_PATH, read_csv_with_schema
+from utils.sentiment import SENTIMENT_BACKENDS, label_sentiment
+
+
+def load_texts(path, rows, seed):
+    """从数据集中抽样转录文本"""
+    texts = read_csv_with_schema(path)['video_transcription_text'].dropna()
+    if rows and rows < len(texts):
+        texts = texts.sample(rows, random_state=seed)
+    return texts.tolist()
+
+
+# 合成句子的组成部分: 否定、修饰词、情感词、结尾（感叹号和表情符号）
+NEGATIONS = ['', 'not ', 'never ', "isn't ", 'really not ', 'not a ']
+INTENSIFIERS = ['', 'very ', 'really ', 'extremely ', 'very very ', 'quite ']
+POLAR_WORDS = ['good', 'bad', 'amazing', 'terrible', 'happy', 'sad', 'great', 'awful', 'best', 'boring']
+ENDINGS = ['.', '!', '!!!', ' :)', ' :(', '... ok', ' (!)', ' <3', '?']
+
+
+def make_polarity_sentences(count, seed):
+    """由否定、修饰词、情感词和感叹号/表情符号组合出的合成句子"""
+    rng = np.random.default_rng(seed)
+    parts = [rng.choice(options, count) for options in (NEGATIONS, INTENSIFIERS, POLAR_WORDS, ENDINGS)]
+    return [f"This is {negation}{intensifier}{word}{ending}" for negation, intensifier, word, ending in zip(*parts)]
+
+
+def compare(label, texts):
+    """各后端的吞吐量和与TextBlob结果的一致程度"""
+    print(f"{label}: texts={len(texts):,}")
+    results = {}
+    for name, (scorer, _) in SENTIMENT_BACKENDS.items():
+        # 预热一次，排除词典编译等一次性开销
+        scorer(texts[:10])
+        start = time.perf_counter()
+        scores = np.asarray(scorer(texts), dtype=float)
+        elapsed = time.perf_counter() - start
+        results[name] = (scores, elapsed)
+
+    reference, _ = results['textblob']
+    reference_labels = label_sentiment(reference)
+
+    print(f"{'backend':<10} {'texts/s':>12} {'pearson':>9} {'MAE':>8} {'label agree':>12}")
+    for name, (scores, elapsed) in results.items():
+        pearson = np.corrcoef(reference, scores)[0, 1] if np.std(scores) > 0 else np.nan
+        mae = np.abs(reference - scores).mean()
+        label_agreement = (label_sentiment(scores) == reference_labels).mean()
+        print(f"{name:<10} {len(texts) / elapsed:>12,.0f} {pearson:>9.3f} {mae:>8.4f} {label_agreement:>11.1%}")
+
+
+def run(path, rows, seed):
+    compare(f"transcriptions from {path}", load_texts(path, rows, seed))
+    compare("negated / intensified / exclamation sentences", make_polarity_sentences(rows or 20000, seed))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--path', default=DATA_PATH)
+    parser.add_argument('--rows', type=int, default=20000, help='sample size (0 = all transcriptions)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    run(args.path, args.rows, args.seed)
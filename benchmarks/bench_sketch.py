@@ -0,0 +1,56 @@
+"""
+分位数基准: Series.quantile（每次排序）vs 分位数草图（按数据版本编号一次，按过滤条件计数一次）
+
+运行: python -m benchmarks.bench_sketch --rows 1000000 10000000
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.bench_filters import time_call
+from utils.sketch import RELATIVE_ACCURACY, QuantileSketch, SketchColumns
+
+QUANTILES = [0.05, 0.25, 0.5, 0.75, 0.8, 0.95, 0.99]
+
+
+def make_frame(rows, rng):
+    views = np.minimum(rng.lognormal(9, 2.5, rows), 4e9)
+    return pd.DataFrame({
+        'video_view_count_clean': views.astype(np.uint32),
+        'like_rate': rng.beta(2, 8, rows).astype(np.float32),
+    })
+
+
+def run(row_counts, repeat):
+    rng = np.random.default_rng(42)
+    for rows in row_counts:
+        df = make_frame(rows, rng)
+        build_time, columns = time_call(lambda: SketchColumns.from_frame(df), 1)
+        row_ids = np.flatnonzero(rng.random(rows) < 0.5)
+        print(f"rows={rows:,}  bucket codes: {build_time * 1000:.1f} ms (once per data version), "
+              f"filtered rows={len(row_ids):,}")
+
+        for col in df.columns:
+            filtered = df[col].take(row_ids)
+            pandas_time, exact = time_call(lambda: [filtered.quantile(q) for q in QUANTILES], repeat)
+            sketch_time, sketch = time_call(lambda: columns.sketches(row_ids)[col], repeat)
+            query_time, estimates = time_call(lambda: sketch.quantiles(QUANTILES), repeat)
+            error = max(abs(e - x) / x for e, x in zip(estimates, exact) if x)
+            merged = QuantileSketch.from_values(filtered[:rows // 4]).merge(QuantileSketch.from_values(filtered[rows // 4:]))
+
+            assert error <= RELATIVE_ACCURACY * 1.01
+            assert merged.quantiles(QUANTILES) == estimates
+            print(f"  [{col}]")
+            print(f"    Series.quantile x{len(QUANTILES)}  : {pandas_time * 1000:9.2f} ms")
+            print(f"    sketch for filter state: {sketch_time * 1000:9.2f} ms (once per filter state)")
+            print(f"    sketch queries x{len(QUANTILES)}   : {query_time * 1000:9.3f} ms, "
+                  f"max relative error {error:.4f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000_000, 10_000_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    run(args.rows, args.repeat)
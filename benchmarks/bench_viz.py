@@ -0,0 +1,70 @@
+"""
+图表大小基准: px.histogram / px.scatter / px.box（发送原始值）vs 服务器端分箱的直方图、密度栅格散点图、
+预先计算统计量的箱线图和仪表板
+
+运行: python -m benchmarks.bench_viz --rows 10000 100000 1000000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+
+from sections.overview import format_bytes
+from utils.agg import DatasetAggregate
+from utils.viz import (create_histogram, create_scatter_plot, create_box_plot, box_statistics_from_sketches,
+                       create_comprehensive_dashboard, figure_size)
+
+
+def make_frame(rows, rng):
+    return pd.DataFrame({
+        'video_view_count_clean': np.minimum(rng.lognormal(9, 2.5, rows), 4e9).astype(np.uint32),
+        'video_like_count_clean': np.minimum(rng.lognormal(6, 2.5, rows), 4e9).astype(np.uint32),
+        'video_duration_sec_clean': rng.integers(5, 61, rows).astype(np.float32),
+        'content_category': pd.Categorical.from_codes(rng.integers(0, 3, rows), ['Science', 'History', 'Sports']),
+        'verified_status': pd.Categorical.from_codes((rng.random(rows) < 0.06).astype(int), ['not verified', 'verified']),
+    })
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def run(row_counts):
+    rng = np.random.default_rng(42)
+    for rows in row_counts:
+        df = make_frame(rows, rng)
+        upper = df['video_view_count_clean'].quantile(0.95)
+        group_sketches = DatasetAggregate.from_frame(df).grouped_sketches[('verified_status', 'video_view_count_clean')]
+        print(f"rows={rows:,}")
+        for name, build in [
+            ('px.histogram (raw values)', lambda: px.histogram(df, x='video_view_count_clean', nbins=30)),
+            ('binned histogram', lambda: create_histogram(df, 'video_view_count_clean', 'Views', 'View Count',
+                                                          log_bins=True)),
+            ('px.scatter (raw values)', lambda: px.scatter(df, x='video_view_count_clean', y='video_like_count_clean',
+                                                          render_mode='webgl')),
+            ('density scatter', lambda: create_scatter_plot(df, 'video_view_count_clean', 'video_like_count_clean',
+                                                            'Views vs Likes', log_x=True, log_y=True)),
+            ('px.box (raw values)', lambda: px.box(df[df['video_view_count_clean'] <= upper],
+                                                   x='verified_status', y='video_view_count_clean')),
+            ('box plot (groupby stats)', lambda: create_box_plot(df, 'verified_status', 'video_view_count_clean',
+                                                                 'Views', upper=upper)),
+            ('box plot (sketch stats)', lambda: create_box_plot(
+                df, 'verified_status', 'video_view_count_clean', 'Views', upper=upper,
+                stats=box_statistics_from_sketches(group_sketches, upper))),
+            ('dashboard', lambda: create_comprehensive_dashboard(df)),
+        ]:
+            build_time, fig = timed(build)
+            json_time, size = timed(lambda: figure_size(fig))
+            print(f"  {name:<26}: {format_bytes(size):>10} payload, "
+                  f"build {build_time * 1000:7.1f} ms, serialize {json_time * 1000:7.1f} ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+    run(args.rows)
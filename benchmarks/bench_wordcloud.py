@@ -0,0 +1,53 @@
+"""
+词云基准: 拼接全部文本后WordCloud.generate（每次重新分词）vs 词频矩阵按行求和 + 按词频哈希缓存的图片
+
+运行: python -m benchmarks.bench_wordcloud --path tiktok_dataset.csv --rows 20000 200000
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+from wordcloud import WordCloud
+
+from benchmarks.bench_filters import time_call
+from utils.io import DATA_PATH, read_csv_with_schema
+from utils.text_index import TermMatrix, frequency_hash
+from utils.viz import render_wordcloud
+
+
+def load_texts(path, rows, rng):
+    """从数据集中有放回地抽样转录文本"""
+    texts = read_csv_with_schema(path)['video_transcription_text'].dropna().to_numpy()
+    return pd.Series(texts[rng.integers(0, len(texts), rows)])
+
+
+def run(path, row_counts, repeat):
+    rng = np.random.default_rng(42)
+    for rows in row_counts:
+        texts = load_texts(path, rows, rng)
+        row_ids = np.flatnonzero(rng.random(rows) < 0.5)
+        build_time, matrix = time_call(lambda: TermMatrix.from_texts(texts), 1)
+        print(f"rows={rows:,}  term matrix: {build_time * 1000:.1f} ms (once per data version), "
+              f"vocabulary={len(matrix.vocabulary):,}, {matrix.nbytes / 1e6:.1f} MB, selected rows={len(row_ids):,}")
+
+        selected = texts.iloc[row_ids]
+        generate_time, _ = time_call(
+            lambda: WordCloud(width=800, height=400, background_color='white', max_words=100).generate(
+                ' '.join(selected.astype(str))), 1)
+        sum_time, top_terms = time_call(lambda: matrix.top_terms(matrix.frequencies(row_ids)), repeat)
+        render_time, _ = time_call(lambda: render_wordcloud(frequency_hash(top_terms), top_terms), 1)
+        cached_time, _ = time_call(lambda: render_wordcloud(frequency_hash(top_terms), top_terms), repeat)
+
+        print(f"  join + WordCloud.generate : {generate_time * 1000:9.1f} ms")
+        print(f"  sparse column sum + top   : {sum_time * 1000:9.2f} ms")
+        print(f"  render (first time)       : {render_time * 1000:9.1f} ms")
+        print(f"  render (cached PNG)       : {cached_time * 1000:9.2f} ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--path', default=DATA_PATH)
+    parser.add_argument('--rows', type=int, nargs='+', default=[20_000, 200_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    run(args.path, args.rows, args.repeat)
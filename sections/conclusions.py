@@ -2,8 +2,8 @@ import streamlit as st
 import pandas as pd
 from utils.io import generate_csv_data, save_data_to_directory
 
-def show_conclusions(filtered_df):
-    """显示结论和洞察"""
+def show_conclusions(filtered_df, aggregate=None):
+    """显示结论和洞察；给定立方体汇总aggregate时直接读取其中的统计量而不扫描行"""
     st.header("💡 Key Insights & Actionable Recommendations")
     st.markdown("""
     ### Transform Data into Strategic Decisions
@@ -27,8 +27,12 @@ def show_conclusions(filtered_df):
         insights_data = []
 
         if 'video_view_count_clean' in filtered_df.columns:
-            avg_views = filtered_df['video_view_count_clean'].mean()
-            max_views = filtered_df['video_view_count_clean'].max()
+            if aggregate is not None:
+                view_stats = aggregate.metrics['video_view_count_clean']
+                avg_views, max_views = view_stats.mean, view_stats.to_dict()['max']
+            else:
+                avg_views = filtered_df['video_view_count_clean'].mean()
+                max_views = filtered_df['video_view_count_clean'].max()
 
             st.metric("Average Views", f"{avg_views:,.0f}", 
                      help="Typical view count for videos in current selection")
@@ -47,7 +51,10 @@ def show_conclusions(filtered_df):
             })
 
         if 'like_rate' in filtered_df.columns:
-            avg_like_rate = filtered_df['like_rate'].mean() * 100
+            if aggregate is not None:
+                avg_like_rate = aggregate.metrics['like_rate'].mean * 100
+            else:
+                avg_like_rate = filtered_df['like_rate'].mean() * 100
             st.metric("Average Like Rate", f"{avg_like_rate:.2f}%",
                      help="Percentage of viewers who like videos")
 
@@ -70,7 +77,10 @@ def show_conclusions(filtered_df):
 
         # 基于数据分析生成洞察
         if 'verified_status' in filtered_df.columns:
-            verified_views = filtered_df.groupby('verified_status')['video_view_count_clean'].mean()
+            if aggregate is not None:
+                verified_views = aggregate.grouped_table('verified_status', 'video_view_count_clean')['mean']
+            else:
+                verified_views = filtered_df.groupby('verified_status')['video_view_count_clean'].mean()
             if len(verified_views) > 1:
                 max_status = verified_views.idxmax()
                 max_views = verified_views.max()
@@ -83,8 +93,10 @@ def show_conclusions(filtered_df):
                          help="Performance difference between best and worst performing status")
 
         if 'content_category' in filtered_df.columns:
-            top_category = filtered_df['content_category'].value_counts().index[0]
-            top_count = filtered_df['content_category'].value_counts().iloc[0]
+            category_counts = (aggregate.value_counts('content_category') if aggregate is not None
+                               else filtered_df['content_category'].value_counts())
+            top_category = category_counts.index[0]
+            top_count = category_counts.iloc[0]
             total_videos = len(filtered_df)
             category_percentage = (top_count / total_videos) * 100
             
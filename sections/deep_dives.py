@@ -1,26 +1,220 @@
+import inspect
+
+import numpy as np
 import streamlit as st
 import pandas as pd
 from utils.viz import *
-from utils.prep import analyze_sentiment
+from utils.sentiment import get_sentiment_scores, label_sentiment
 from utils.io import generate_csv_data, save_data_to_directory
-
-def show_performance_metrics_tab(filtered_df):
-    """显示性能指标标签页"""
-    st.markdown("""
-    ### 🎬 Video Performance Analysis
-    
-    This section helps you understand how videos perform across different metrics:
-    - **Distribution patterns**: How views, likes, and other metrics are spread
-    - **Duration analysis**: Optimal video length insights
-    - **Metric relationships**: How different performance indicators correlate
-    
-    **Key Questions Answered:**
-    - What is the typical view count distribution?
-    - Is there an optimal video duration for engagement?
-    - How do different performance metrics relate to each other?
-    """)
+from utils.crossfilter import CROSSFILTER_DIMENSIONS
+from utils.text_index import TermMatrix, frequency_hash
+from utils.correlation import correlation_matrices
+from sections.overview import format_bytes
+
+# 较新的Streamlit中标签页和折叠区域可以记录状态（on_change="rerun"），只运行可见的内容；
+# 旧版本没有这些参数，此时与之前一样渲染全部内容
+LAZY_TABS = 'on_change' in inspect.signature(st.tabs).parameters
+LAZY_EXPANDERS = 'on_change' in inspect.signature(st.expander).parameters
+
+CROSSFILTER_LABELS = {
+    'video_view_count_clean': 'views',
+    'video_duration_sec_clean': 'duration',
+    'like_rate': 'like rate',
+    'share_rate': 'share rate',
+}
+
+
+def _store_crossfilter_brush(col):
+    """
+    框选变化时把刷选区间保存到会话状态: 联动直方图分布在不同标签页中，
+    隐藏标签页不渲染图表，其组件状态会被清除，刷选区间需要单独保存
+    """
+    state = st.session_state.get(f"crossfilter_{col}")
+    points = state['selection']['points'] if state else []
+    bins = [point['point_index'] for point in points if 'point_index' in point]
+    brushes = st.session_state.setdefault('crossfilter_brushes', {})
+    if bins:
+        brushes[col] = (min(bins), max(bins))
+    else:
+        brushes.pop(col, None)
+
+
+def _tracked_tabs(labels, key):
+    """记录选中项的标签页（不支持时为普通标签页）"""
+    if LAZY_TABS:
+        return st.tabs(labels, key=key, on_change="rerun")
+    return st.tabs(labels)
+
+
+def _tracked_expander(label, key, expanded=False):
+    """记录展开状态的折叠区域（不支持时为普通折叠区域）"""
+    if LAZY_EXPANDERS:
+        return st.expander(label, expanded=expanded, key=key, on_change="rerun")
+    return st.expander(label, expanded=expanded)
+
+
+def _is_open(container):
+    """容器内容是否需要运行: 只有明确处于隐藏或折叠状态时才跳过"""
+    return getattr(container, 'open', None) is not False
+
+
+def _crossfilter_brushes(crossfilter):
+    """读取各联动直方图的刷选区间 {列: (起始分箱, 结束分箱)}"""
+    brushes = st.session_state.get('crossfilter_brushes', {})
+    return {col: brushes[col] for col in crossfilter.dimensions if col in brushes}
+
+
+def _format_bound(value):
+    return f"{value:,.0f}" if abs(value) >= 100 else f"{value:.4g}"
+
+
+def show_crossfilter_summary(crossfilter):
+    """显示联动直方图的使用说明和当前刷选命中的视频数"""
+    brushes = _crossfilter_brushes(crossfilter)
+    st.caption("🔗 Linked histograms: drag horizontally on the views, duration, like rate or share rate histogram "
+               "to brush a range, and the other three update to the brushed videos. "
+               "Double-click a chart to clear its brush.")
+    if brushes:
+        ranges = ', '.join(
+            f"{CROSSFILTER_LABELS[col]} {_format_bound(low)}–{_format_bound(high)}"
+            for col, (low, high) in ((col, crossfilter.brush_range(col, brush)) for col, brush in brushes.items())
+        )
+        st.info(f"**{crossfilter.match_count(brushes):,} videos** match the brushed ranges: {ranges}")
+
+
+def show_crossfilter_histogram(crossfilter, col, title, xaxis_title, upper=None):
+    """
+    联动直方图: 分布受其他直方图刷选的约束，框选本图会过滤其他联动直方图；
+    upper为截断上界，只显示左边界小于它的分箱（分箱编号不变，刷选区间仍然有效）
+    """
+    brushes = _crossfilter_brushes(crossfilter)
+    edges, counts = crossfilter.edges[col], crossfilter.histogram(col, brushes)
+    if upper is not None:
+        bins = max(int(np.searchsorted(edges, upper, side='left')), 1)
+        edges, counts = edges[:bins + 1], counts[:bins]
+    fig = create_binned_histogram(
+        edges,
+        counts,
+        title,
+        xaxis_title,
+        log_x=CROSSFILTER_DIMENSIONS[col] == 'log',
+        selected=brushes.get(col)
+    )
+    # 拖动时只在水平方向框选分箱
+    fig.update_layout(dragmode='select', selectdirection='h')
+    st.plotly_chart(fig, use_container_width=True, key=f"crossfilter_{col}",
+                    on_select=lambda: _store_crossfilter_brush(col), selection_mode=('box',))
+    _show_payload(fig)
+
+
+def _show_payload(fig):
+    """显示图表序列化后发送到浏览器的大小（服务器端分箱和汇总后与行数无关）"""
+    st.caption(f"Chart payload sent to the browser: {format_bytes(figure_size(fig))}")
+
+
+def _quantile(df, column, q, sketches=None):
+    """分位数: 有分位数草图时直接查询（相对误差不超过1%），否则在df上计算"""
+    if sketches and column in sketches:
+        return sketches[column].quantile(q)
+    return df[column].quantile(q)
+
+
+def _box_stats(aggregate, group_col, column, upper):
+    """
+    立方体能回答当前过滤条件时，由分组草图估计箱线图的 (统计量, 离群点)；
+    否则返回 (None, None)（由原始行计算）
+    """
+    if aggregate is None or (group_col, column) not in aggregate.grouped_sketches:
+        return None, None
+    sketches = aggregate.grouped_sketches[(group_col, column)]
+    stats = box_statistics_from_sketches(sketches, upper)
+    return stats, box_outliers_from_sketches(sketches, group_col, column, stats, upper)
+
+
+def _plot_distribution(df, crossfilter, column, title, xaxis_title, upper=None):
+    """
+    有联动立方体时显示联动直方图，否则直接绘制df的直方图；返回是否显示了图表。
+    df已按upper截断时传入upper，联动直方图按同一上界截断
+    """
+    if crossfilter is not None and column in crossfilter.dimensions:
+        show_crossfilter_histogram(crossfilter, column, title, xaxis_title, upper)
+        return True
+    fig = create_histogram(df, column, title, xaxis_title, log_bins=CROSSFILTER_DIMENSIONS.get(column) == 'log')
+    if fig:
+        st.plotly_chart(fig, use_container_width=True)
+        _show_payload(fig)
+    return fig is not None
+
+
+@st.fragment
+def _show_correlation_heatmap(correlations):
+    """相关矩阵热力图；作为片段运行，切换相关方法时只重新运行这一部分"""
+    method = st.radio("Correlation method:", ["Pearson", "Spearman"], horizontal=True,
+                      help="Pearson measures linear relationships; Spearman compares rank order and is "
+                           "less sensitive to viral outliers")
+    fig_heatmap = create_correlation_heatmap(correlations[method.lower()], f'{method} Correlation Matrix')
+    st.plotly_chart(fig_heatmap, use_container_width=True)
+    st.caption("Pairs are computed on videos where both metrics are available. "
+               "Blank cells mean a metric is constant or missing under the current filters")
+
+
+@st.fragment
+def _show_metric_relationship(filtered_df, available_metrics, correlations):
+    """
+    两个指标的散点图和相关系数（从相关矩阵中读取）；作为片段运行，切换指标时只重新运行这一部分
+    """
+    col1, col2 = st.columns(2)
+    with col1:
+        metric1 = st.selectbox("Select first metric:", available_metrics, 
+                             help="Choose the primary metric for comparison")
+    with col2:
+        other_metrics = [m for m in available_metrics if m != metric1]
+        metric2 = st.selectbox("Select second metric:", other_metrics, 
+                             index=min(1, len(other_metrics) - 1),
+                             help="Choose the secondary metric to compare against")
     
-    st.subheader("📊 Performance Distributions")
+    st.markdown(f"### 📈 {metric1.replace('_clean', '').replace('_', ' ').title()} vs {metric2.replace('_clean', '').replace('_', ' ').title()}")
+
+    if metric1 and metric2:
+        fig_scatter = create_scatter_plot(
+            filtered_df,
+            metric1,
+            metric2,
+            f'{metric1.replace("_clean", "").replace("_", " ").title()} vs {metric2.replace("_clean", "").replace("_", " ").title()}',
+            log_x=True,
+            log_y=True
+        )
+        if fig_scatter:
+            st.plotly_chart(fig_scatter, use_container_width=True)
+            _show_payload(fig_scatter)
+            if fig_scatter.data[0].type == 'heatmap':
+                st.caption("Color shows how many videos fall in each cell (log scale). "
+                           "Red points are individual videos in sparse regions")
+            else:
+                st.caption("Each point represents a video. Clustered points indicate strong correlation")
+            
+            # 相关系数直接读取当前过滤条件下缓存的相关矩阵
+            correlation = correlations['pearson'].loc[metric1, metric2]
+            col1, col2 = st.columns(2)
+            with col1:
+                st.metric("Correlation Coefficient", f"{correlation:.3f}")
+            with col2:
+                st.metric("Rank Correlation (Spearman)", f"{correlations['spearman'].loc[metric1, metric2]:.3f}")
+            if correlation > 0.7:
+                st.success("Strong positive correlation: These metrics tend to increase together")
+            elif correlation > 0.3:
+                st.info("Moderate positive correlation")
+            elif correlation > -0.3:
+                st.warning("Weak correlation: Metrics are largely independent")
+            else:
+                st.error("Negative correlation: Metrics move in opposite directions")
+
+
+@st.fragment
+def _show_performance_distributions(filtered_df, crossfilter=None):
+    """观看量和时长分布；作为片段运行，刷选联动直方图时只重新运行联动摘要和直方图"""
+    if crossfilter is not None:
+        show_crossfilter_summary(crossfilter)
 
     col1, col2 = st.columns(2)
 
@@ -32,14 +226,8 @@ def show_performance_metrics_tab(filtered_df):
         - Helps identify what constitutes 'high performance'
         """)
         if 'video_view_count_clean' in filtered_df.columns:
-            fig_views = create_histogram(
-                filtered_df,
-                'video_view_count_clean',
-                'Distribution of Video Views',
-                'View Count'
-            )
-            if fig_views:
-                st.plotly_chart(fig_views, use_container_width=True)
+            if _plot_distribution(filtered_df, crossfilter, 'video_view_count_clean',
+                                  'Distribution of Video Views', 'View Count'):
                 st.caption("Most videos get modest views, with a few high-performing outliers")
         else:
             st.info("View count data not available for analysis")
@@ -52,18 +240,35 @@ def show_performance_metrics_tab(filtered_df):
         - Longer doesn't always mean better performance
         """)
         if 'video_duration_sec_clean' in filtered_df.columns:
-            fig_duration = create_histogram(
-                filtered_df,
-                'video_duration_sec_clean',
-                'Distribution of Video Duration',
-                'Duration (seconds)'
-            )
-            if fig_duration:
-                st.plotly_chart(fig_duration, use_container_width=True)
+            if _plot_distribution(filtered_df, crossfilter, 'video_duration_sec_clean',
+                                  'Distribution of Video Duration', 'Duration (seconds)'):
                 st.caption("Typical TikTok video durations range from 15-60 seconds")
         else:
             st.info("Video duration data not available")
 
+
+def show_performance_metrics_tab(filtered_df, crossfilter=None, correlations=None):
+    """
+    显示性能指标标签页；crossfilter为当前过滤条件下的联动分箱立方体，
+    correlations为返回当前过滤条件下相关矩阵的函数（按过滤条件缓存），为None时直接计算
+    """
+    st.markdown("""
+    ### 🎬 Video Performance Analysis
+    
+    This section helps you understand how videos perform across different metrics:
+    - **Distribution patterns**: How views, likes, and other metrics are spread
+    - **Duration analysis**: Optimal video length insights
+    - **Metric relationships**: How different performance indicators correlate
+    
+    **Key Questions Answered:**
+    - What is the typical view count distribution?
+    - Is there an optimal video duration for engagement?
+    - How do different performance metrics relate to each other?
+    """)
+    
+    st.subheader("📊 Performance Distributions")
+    _show_performance_distributions(filtered_df, crossfilter)
+
     # Metrics correlation
     st.subheader("🔗 Metrics Correlation Analysis")
     st.markdown("""
@@ -84,46 +289,70 @@ def show_performance_metrics_tab(filtered_df):
                          if metric in filtered_df.columns and not filtered_df[metric].isna().all()]
 
     if len(available_metrics) >= 2:
-        col1, col2 = st.columns(2)
-        with col1:
-            metric1 = st.selectbox("Select first metric:", available_metrics, 
-                                 help="Choose the primary metric for comparison")
-        with col2:
-            other_metrics = [m for m in available_metrics if m != metric1]
-            metric2 = st.selectbox("Select second metric:", other_metrics, 
-                                 index=min(1, len(other_metrics) - 1),
-                                 help="Choose the secondary metric to compare against")
-        
-        st.markdown(f"### 📈 {metric1.replace('_clean', '').replace('_', ' ').title()} vs {metric2.replace('_clean', '').replace('_', ' ').title()}")
+        correlations = correlations() if correlations is not None else correlation_matrices(filtered_df)
+        _show_correlation_heatmap(correlations)
+        _show_metric_relationship(filtered_df, available_metrics, correlations)
+    else:
+        st.info("Need at least 2 valid metrics for correlation analysis. Check your data filters.")
 
-        if metric1 and metric2:
-            fig_scatter = create_scatter_plot(
+
+@st.fragment
+def _show_status_impact(filtered_df, available_performance_metrics, aggregate=None, sketches=None):
+    """按账户状态分组的箱线图；作为片段运行，切换指标时只重新运行这一部分"""
+    status_metric = st.selectbox("Select performance metric:", available_performance_metrics,
+                                help="Choose which performance metric to analyze by account status")
+    
+    metric_name = status_metric.replace('_clean', '').replace('_', ' ').title()
+    upper = _quantile(filtered_df, status_metric, 0.95, sketches)
+
+    col1, col2 = st.columns(2)
+
+    with col1:
+        st.markdown(f"#### 📊 {metric_name} by Verified Status")
+        if 'verified_status' in filtered_df.columns:
+            stats, outliers = _box_stats(aggregate, 'verified_status', status_metric, upper)
+            fig_status = create_box_plot(
                 filtered_df,
-                metric1,
-                metric2,
-                f'{metric1.replace("_clean", "").replace("_", " ").title()} vs {metric2.replace("_clean", "").replace("_", " ").title()}'
+                'verified_status',
+                status_metric,
+                f'{metric_name} by Verified Status',
+                upper=upper,
+                stats=stats,
+                outliers=outliers
             )
-            if fig_scatter:
-                st.plotly_chart(fig_scatter, use_container_width=True)
-                st.caption("Each point represents a video. Clustered points indicate strong correlation")
-                
-                # 添加简单的相关性分析
-                correlation = filtered_df[metric1].corr(filtered_df[metric2])
-                st.metric("Correlation Coefficient", f"{correlation:.3f}")
-                if correlation > 0.7:
-                    st.success("Strong positive correlation: These metrics tend to increase together")
-                elif correlation > 0.3:
-                    st.info("Moderate positive correlation")
-                elif correlation > -0.3:
-                    st.warning("Weak correlation: Metrics are largely independent")
-                else:
-                    st.error("Negative correlation: Metrics move in opposite directions")
-    else:
-        st.info("Need at least 2 valid metrics for correlation analysis. Check your data filters.")
+            if fig_status:
+                st.plotly_chart(fig_status, use_container_width=True)
+                _show_payload(fig_status)
+                st.caption("Compare performance between verified and non-verified accounts")
+        else:
+            st.info("Verified status data not available")
+
+    with col2:
+        st.markdown(f"#### 📊 {metric_name} by Ban Status")
+        if 'author_ban_status' in filtered_df.columns:
+            stats, outliers = _box_stats(aggregate, 'author_ban_status', status_metric, upper)
+            fig_ban_impact = create_box_plot(
+                filtered_df,
+                'author_ban_status',
+                status_metric,
+                f'{metric_name} by Ban Status',
+                upper=upper,
+                stats=stats,
+                outliers=outliers
+            )
+            if fig_ban_impact:
+                st.plotly_chart(fig_ban_impact, use_container_width=True)
+                _show_payload(fig_ban_impact)
+                st.caption("Analyze performance differences by account standing")
+        else:
+            st.info("Ban status data not available")
 
 
-def show_user_analysis_tab(filtered_df):
-    """显示用户分析标签页"""
+def show_user_analysis_tab(filtered_df, aggregate=None, sketches=None):
+    """
+    显示用户分析标签页；给定立方体汇总aggregate时，状态分布直接读取其中的计数，
+    箱线图的统计量由其中的分组草图估计；sketches为当前过滤条件下各数值列的分位数草图
+    """
     st.markdown("""
     ### 👥 User Account Analysis
     
@@ -150,7 +379,8 @@ def show_user_analysis_tab(filtered_df):
         - Helps understand platform influencer composition
         """)
         if 'verified_status' in filtered_df.columns:
-            verified_counts = filtered_df['verified_status'].value_counts()
+            verified_counts = (aggregate.value_counts('verified_status') if aggregate is not None
+                               else filtered_df['verified_status'].value_counts())
             fig_verified = create_pie_chart(
                 verified_counts.values,
                 verified_counts.index,
@@ -169,7 +399,8 @@ def show_user_analysis_tab(filtered_df):
         - Platform health and content moderation insights
         """)
         if 'author_ban_status' in filtered_df.columns:
-            ban_counts = filtered_df['author_ban_status'].value_counts()
+            ban_counts = (aggregate.value_counts('author_ban_status') if aggregate is not None
+                          else filtered_df['author_ban_status'].value_counts())
             fig_ban = create_pie_chart(
                 ban_counts.values,
                 ban_counts.index,
@@ -199,48 +430,16 @@ def show_user_analysis_tab(filtered_df):
                                      if metric in filtered_df.columns and not filtered_df[metric].isna().all()]
 
     if available_performance_metrics:
-        status_metric = st.selectbox("Select performance metric:", available_performance_metrics,
-                                    help="Choose which performance metric to analyze by account status")
-        
-        metric_name = status_metric.replace('_clean', '').replace('_', ' ').title()
-
-        col1, col2 = st.columns(2)
-
-        with col1:
-            st.markdown(f"#### 📊 {metric_name} by Verified Status")
-            if 'verified_status' in filtered_df.columns:
-                fig_status = create_box_plot(
-                    filtered_df,
-                    'verified_status',
-                    status_metric,
-                    f'{metric_name} by Verified Status'
-                )
-                if fig_status:
-                    st.plotly_chart(fig_status, use_container_width=True)
-                    st.caption("Compare performance between verified and non-verified accounts")
-            else:
-                st.info("Verified status data not available")
-
-        with col2:
-            st.markdown(f"#### 📊 {metric_name} by Ban Status")
-            if 'author_ban_status' in filtered_df.columns:
-                fig_ban_impact = create_box_plot(
-                    filtered_df,
-                    'author_ban_status',
-                    status_metric,
-                    f'{metric_name} by Ban Status'
-                )
-                if fig_ban_impact:
-                    st.plotly_chart(fig_ban_impact, use_container_width=True)
-                    st.caption("Analyze performance differences by account standing")
-            else:
-                st.info("Ban status data not available")
+        _show_status_impact(filtered_df, available_performance_metrics, aggregate, sketches)
     else:
         st.info("No performance metrics available for status impact analysis. Check your data filters.")
 
 
-def show_content_analysis_tab(filtered_df):
-    """显示内容分析标签页"""
+def show_content_analysis_tab(filtered_df, term_matrix=None, row_ids=None):
+    """
+    显示内容分析标签页；term_matrix为整个数据集的词频矩阵，row_ids为过滤后的行号，
+    词云的词频由这些行的词频求和得到
+    """
     st.markdown("""
     ### 📝 Content Analysis
     
@@ -311,12 +510,13 @@ def show_content_analysis_tab(filtered_df):
     if 'video_transcription_text' in filtered_df.columns:
         if st.button("🔄 Generate Word Cloud", help="Click to generate/refresh the word cloud visualization"):
             with st.spinner('Generating word cloud from transcription text...'):
-                all_text = ' '.join(filtered_df['video_transcription_text'].dropna().astype(str))
-                if all_text.strip():
-                    fig_wordcloud = create_wordcloud(all_text)
-                    if fig_wordcloud:
-                        st.pyplot(fig_wordcloud)
-                        st.caption("Word size indicates frequency. Common stop words are filtered out.")
+                if term_matrix is None or row_ids is None:
+                    term_matrix, row_ids = TermMatrix.from_texts(filtered_df['video_transcription_text']), None
+                top_terms = term_matrix.top_terms(term_matrix.frequencies(row_ids))
+                if top_terms:
+                    st.image(render_wordcloud(frequency_hash(top_terms), top_terms),
+                             caption='Video Transcription Word Cloud', use_container_width=True)
+                    st.caption("Word size indicates frequency. Common stop words are filtered out.")
                 else:
                     st.warning("No transcription text available for word cloud generation")
         else:
@@ -341,8 +541,8 @@ def show_content_analysis_tab(filtered_df):
     if 'video_transcription_text' in filtered_df.columns:
         if st.button("🔍 Analyze Sentiment", help="Perform sentiment analysis on transcription text"):
             with st.spinner('Analyzing sentiment in video transcriptions...'):
-                sentiment_df = filtered_df.copy()
-                sentiment_df['transcription_sentiment'] = sentiment_df['video_transcription_text'].apply(analyze_sentiment)
+                # 已计算过的文本直接从持久化存储中查找
+                sentiment_df = get_sentiment_scores(filtered_df).to_frame()
 
             st.success(f"Sentiment analysis complete! Analyzed {len(sentiment_df.dropna(subset=['transcription_sentiment']))} transcriptions")
 
@@ -359,6 +559,7 @@ def show_content_analysis_tab(filtered_df):
                     )
                     if fig_sentiment:
                         st.plotly_chart(fig_sentiment, use_container_width=True)
+                        _show_payload(fig_sentiment)
                         st.caption("Distribution of sentiment scores across all analyzed transcriptions")
                 else:
                     st.info("No sentiment data available after analysis")
@@ -367,17 +568,10 @@ def show_content_analysis_tab(filtered_df):
                 st.markdown("#### 🥧 Sentiment Category Distribution")
                 if not sentiment_df['transcription_sentiment'].isna().all():
                     # Classify sentiments
-                    sentiment_labels = []
-                    for sentiment in sentiment_df['transcription_sentiment'].dropna():
-                        if sentiment > 0.1:
-                            sentiment_labels.append('Positive')
-                        elif sentiment < -0.1:
-                            sentiment_labels.append('Negative')
-                        else:
-                            sentiment_labels.append('Neutral')
-
-                    if sentiment_labels:
-                        sentiment_counts = pd.Series(sentiment_labels).value_counts()
+                    sentiment_labels = label_sentiment(sentiment_df['transcription_sentiment'].dropna())
+
+                    if not sentiment_labels.empty:
+                        sentiment_counts = sentiment_labels.value_counts()
                         fig_sentiment_pie = create_pie_chart(
                             sentiment_counts.values,
                             sentiment_counts.index,
@@ -401,23 +595,67 @@ def show_content_analysis_tab(filtered_df):
         st.info("Transcription text data not available for sentiment analysis")
 
 
-def show_engagement_analysis_tab(filtered_df):
-    """显示互动分析标签页"""
-    st.markdown("""
-    ### 💬 Engagement Analysis
-    
-    Understand how audiences interact with content:
-    - **Engagement rates**: Like, share, and comment rates relative to views
-    - **High-performance analysis**: Characteristics of top-performing content
-    - **Audience behavior**: How viewers engage with different content types
-    
-    **Strategic Applications:**
-    - Identify content that drives meaningful engagement
-    - Understand what makes videos shareable and interactive
-    - Optimize for engagement metrics that matter most
-    """)
-    
-    st.subheader("📈 Engagement Rate Analysis")
+@st.fragment
+def _show_high_engagement_analysis(filtered_df, sketches=None):
+    """高互动视频分析；作为片段运行，拖动阈值滑块时只重新运行这一部分"""
+    engagement_threshold = st.slider("Engagement Threshold (Percentile)", 50, 95, 80,
+                                   help="Set the percentile threshold for high engagement classification")
+
+    high_engagement_threshold = _quantile(filtered_df, 'video_view_count_clean', engagement_threshold / 100, sketches)
+    high_engagement_videos = filtered_df[filtered_df['video_view_count_clean'] >= high_engagement_threshold]
+
+    st.success(f"**High engagement threshold**: {high_engagement_threshold:,.0f} views")
+    st.metric("High Engagement Videos", 
+             f"{len(high_engagement_videos)} ({len(high_engagement_videos) / len(filtered_df) * 100:.1f}%)",
+             help=f"Videos in the top {100-engagement_threshold}% by view count")
+
+    if len(high_engagement_videos) > 0:
+        col1, col2 = st.columns(2)
+
+        with col1:
+            st.markdown("#### ✅ Verified Status in Top Performers")
+            if 'verified_status' in high_engagement_videos.columns:
+                high_engagement_verified = high_engagement_videos['verified_status'].value_counts()
+                if not high_engagement_verified.empty:
+                    fig_high_verified = create_pie_chart(
+                        high_engagement_verified.values,
+                        high_engagement_verified.index,
+                        'Verified Status in High Engagement Videos'
+                    )
+                    st.plotly_chart(fig_high_verified, use_container_width=True)
+                    
+                    # 比较验证状态比例
+                    overall_verified_pct = (filtered_df['verified_status'] == 'verified').mean() * 100
+                    high_engagement_verified_pct = (high_engagement_videos['verified_status'] == 'verified').mean() * 100
+                    
+                    st.metric("Verified in Top Performers", f"{high_engagement_verified_pct:.1f}%", 
+                             delta=f"{high_engagement_verified_pct - overall_verified_pct:.1f}% vs overall")
+            else:
+                st.info("Verified status data not available for high engagement videos")
+
+        with col2:
+            st.markdown("#### 📂 Top Categories in High Performers")
+            if 'content_category' in high_engagement_videos.columns:
+                high_engagement_category = high_engagement_videos['content_category'].value_counts().head(10)
+                if not high_engagement_category.empty:
+                    fig_high_category = create_bar_chart(
+                        high_engagement_category.index,
+                        high_engagement_category.values,
+                        'Top Categories in High Engagement Videos'
+                    )
+                    st.plotly_chart(fig_high_category, use_container_width=True)
+                    st.caption(f"Most common category: {high_engagement_category.index[0]}")
+            else:
+                st.info("Content category data not available for high engagement videos")
+    else:
+        st.warning("No videos meet the current high engagement threshold. Try lowering the percentile.")
+
+
+@st.fragment
+def _show_engagement_distributions(filtered_df, crossfilter=None, sketches=None):
+    """点赞率和分享率分布；作为片段运行，刷选联动直方图时只重新运行联动摘要和直方图"""
+    if crossfilter is not None:
+        show_crossfilter_summary(crossfilter)
 
     engagement_metrics = ['like_rate', 'share_rate', 'comment_rate']
     available_engagement_metrics = [metric for metric in engagement_metrics if
@@ -434,16 +672,11 @@ def show_engagement_analysis_tab(filtered_df):
             - High like rates indicate resonant content
             """)
             if 'like_rate' in filtered_df.columns and not filtered_df['like_rate'].isna().all():
-                like_data = filtered_df[filtered_df['like_rate'] < filtered_df['like_rate'].quantile(0.95)]
+                like_upper = _quantile(filtered_df, 'like_rate', 0.95, sketches)
+                like_data = filtered_df[filtered_df['like_rate'] < like_upper]
                 if not like_data.empty:
-                    fig_like_rate = create_histogram(
-                        like_data,
-                        'like_rate',
-                        'Distribution of Like Rates',
-                        'Like Rate'
-                    )
-                    if fig_like_rate:
-                        st.plotly_chart(fig_like_rate, use_container_width=True)
+                    if _plot_distribution(like_data, crossfilter, 'like_rate', 'Distribution of Like Rates', 'Like Rate',
+                                          like_upper):
                         avg_like_rate = like_data['like_rate'].mean()
                         st.metric("Average Like Rate", f"{avg_like_rate:.4f}")
                 else:
@@ -459,16 +692,11 @@ def show_engagement_analysis_tab(filtered_df):
             - High share rates indicate valuable/entertaining content
             """)
             if 'share_rate' in filtered_df.columns and not filtered_df['share_rate'].isna().all():
-                share_data = filtered_df[filtered_df['share_rate'] < filtered_df['share_rate'].quantile(0.95)]
+                share_upper = _quantile(filtered_df, 'share_rate', 0.95, sketches)
+                share_data = filtered_df[filtered_df['share_rate'] < share_upper]
                 if not share_data.empty:
-                    fig_share_rate = create_histogram(
-                        share_data,
-                        'share_rate',
-                        'Distribution of Share Rates',
-                        'Share Rate'
-                    )
-                    if fig_share_rate:
-                        st.plotly_chart(fig_share_rate, use_container_width=True)
+                    if _plot_distribution(share_data, crossfilter, 'share_rate', 'Distribution of Share Rates',
+                                          'Share Rate', share_upper):
                         avg_share_rate = share_data['share_rate'].mean()
                         st.metric("Average Share Rate", f"{avg_share_rate:.4f}")
                 else:
@@ -478,6 +706,26 @@ def show_engagement_analysis_tab(filtered_df):
     else:
         st.info("Engagement rate data not available. Rates require both engagement metrics and view counts.")
 
+
+def show_engagement_analysis_tab(filtered_df, crossfilter=None, sketches=None):
+    """显示互动分析标签页；crossfilter为当前过滤条件下的联动分箱立方体，sketches为分位数草图"""
+    st.markdown("""
+    ### 💬 Engagement Analysis
+    
+    Understand how audiences interact with content:
+    - **Engagement rates**: Like, share, and comment rates relative to views
+    - **High-performance analysis**: Characteristics of top-performing content
+    - **Audience behavior**: How viewers engage with different content types
+    
+    **Strategic Applications:**
+    - Identify content that drives meaningful engagement
+    - Understand what makes videos shareable and interactive
+    - Optimize for engagement metrics that matter most
+    """)
+    
+    st.subheader("📈 Engagement Rate Analysis")
+    _show_engagement_distributions(filtered_df, crossfilter, sketches)
+
     # High engagement videos analysis
     st.subheader("🏆 High Engagement Videos Analysis")
     st.markdown("""
@@ -500,57 +748,7 @@ def show_engagement_analysis_tab(filtered_df):
         - 80th percentile is a common benchmark for 'high performing'
         """)
         
-        engagement_threshold = st.slider("Engagement Threshold (Percentile)", 50, 95, 80,
-                                       help="Set the percentile threshold for high engagement classification")
-
-        high_engagement_threshold = filtered_df['video_view_count_clean'].quantile(engagement_threshold / 100)
-        high_engagement_videos = filtered_df[filtered_df['video_view_count_clean'] >= high_engagement_threshold]
-
-        st.success(f"**High engagement threshold**: {high_engagement_threshold:,.0f} views")
-        st.metric("High Engagement Videos", 
-                 f"{len(high_engagement_videos)} ({len(high_engagement_videos) / len(filtered_df) * 100:.1f}%)",
-                 help=f"Videos in the top {100-engagement_threshold}% by view count")
-
-        if len(high_engagement_videos) > 0:
-            col1, col2 = st.columns(2)
-
-            with col1:
-                st.markdown("#### ✅ Verified Status in Top Performers")
-                if 'verified_status' in high_engagement_videos.columns:
-                    high_engagement_verified = high_engagement_videos['verified_status'].value_counts()
-                    if not high_engagement_verified.empty:
-                        fig_high_verified = create_pie_chart(
-                            high_engagement_verified.values,
-                            high_engagement_verified.index,
-                            'Verified Status in High Engagement Videos'
-                        )
-                        st.plotly_chart(fig_high_verified, use_container_width=True)
-                        
-                        # 比较验证状态比例
-                        overall_verified_pct = (filtered_df['verified_status'] == 'verified').mean() * 100
-                        high_engagement_verified_pct = (high_engagement_videos['verified_status'] == 'verified').mean() * 100
-                        
-                        st.metric("Verified in Top Performers", f"{high_engagement_verified_pct:.1f}%", 
-                                 delta=f"{high_engagement_verified_pct - overall_verified_pct:.1f}% vs overall")
-                else:
-                    st.info("Verified status data not available for high engagement videos")
-
-            with col2:
-                st.markdown("#### 📂 Top Categories in High Performers")
-                if 'content_category' in high_engagement_videos.columns:
-                    high_engagement_category = high_engagement_videos['content_category'].value_counts().head(10)
-                    if not high_engagement_category.empty:
-                        fig_high_category = create_bar_chart(
-                            high_engagement_category.index,
-                            high_engagement_category.values,
-                            'Top Categories in High Engagement Videos'
-                        )
-                        st.plotly_chart(fig_high_category, use_container_width=True)
-                        st.caption(f"Most common category: {high_engagement_category.index[0]}")
-                else:
-                    st.info("Content category data not available for high engagement videos")
-        else:
-            st.warning("No videos meet the current high engagement threshold. Try lowering the percentile.")
+        _show_high_engagement_analysis(filtered_df, sketches)
     else:
         st.info("View count data not available for engagement analysis. Check your data filters.")
 
@@ -578,12 +776,97 @@ def show_dashboard_tab(filtered_df):
     if fig_dashboard:
         st.plotly_chart(fig_dashboard, use_container_width=True)
         st.caption("Interactive dashboard: Hover over elements for detailed information")
+        _show_payload(fig_dashboard)
     else:
         st.info("Dashboard requires view count and duration data. Check your data filters.")
 
 
-def show_advanced_analytics(filtered_df):
-    """显示高级分析"""
+def show_advanced_analytics(filtered_df, aggregate=None):
+    """
+    显示高级分析；给定立方体汇总aggregate时直接使用其中的分组统计。
+    分组统计表放在可折叠区域中，只有展开时才计算
+    """
+    _show_advanced_analytics_intro()
+    with _tracked_expander("📋 Group Statistics", key="advanced_analytics") as section:
+        if not _is_open(section):
+            return
+        if aggregate is not None:
+            _render_advanced_analytics(*_grouped_stats_from_aggregate(aggregate))
+        else:
+            _render_advanced_analytics(*_grouped_stats(filtered_df))
+
+
+def _grouped_stats(filtered_df):
+    """在过滤后的数据上按类别和认证状态分组统计"""
+    performance_stats = None
+    if ('content_category' in filtered_df.columns and
+            'video_view_count_clean' in filtered_df.columns and
+            not filtered_df['video_view_count_clean'].isna().all()):
+
+        performance_data = filtered_df.dropna(subset=['video_view_count_clean'])
+        performance_stats = performance_data.groupby('content_category')['video_view_count_clean'].agg([
+            'count', 'mean', 'std', 'min', 'max'
+        ])
+
+    engagement_stats = None
+    if ('verified_status' in filtered_df.columns and
+            'like_rate' in filtered_df.columns and
+            not filtered_df['like_rate'].isna().all()):
+
+        engagement_data = filtered_df.dropna(subset=['like_rate'])
+        engagement_stats = engagement_data.groupby('verified_status')['like_rate'].agg([
+            'count', 'mean', 'std', 'min', 'max'
+        ])
+
+    return performance_stats, engagement_stats
+
+
+def _grouped_stats_from_aggregate(aggregate):
+    """从聚合结果中读取分组统计，空表返回None"""
+    performance_stats = aggregate.grouped_table('content_category', 'video_view_count_clean')
+    engagement_stats = aggregate.grouped_table('verified_status', 'like_rate')
+    return (performance_stats if not performance_stats.empty else None,
+            engagement_stats if not engagement_stats.empty else None)
+
+
+# 流式模式显示的固定分箱直方图: 列 -> (标题, 横轴标题)
+AGGREGATE_HISTOGRAMS = {
+    'video_view_count_clean': ('Distribution of Video Views', 'View Count'),
+    'video_duration_sec_clean': ('Distribution of Video Duration', 'Duration (seconds)'),
+    'like_rate': ('Distribution of Like Rates', 'Like Rate'),
+    'share_rate': ('Distribution of Share Rates', 'Share Rate'),
+}
+
+
+def show_distributions_from_aggregate(aggregate):
+    """根据流式聚合中逐块累加的固定分箱直方图显示分布，首尾的空分箱不显示"""
+    histograms = {col: aggregate.histogram(col) for col in AGGREGATE_HISTOGRAMS}
+    histograms = {col: hist for col, hist in histograms.items() if hist is not None and hist[1].any()}
+    if not histograms:
+        return
+
+    st.markdown("---")
+    st.header("📊 Distributions")
+    columns = st.columns(2)
+    for i, (col, (edges, counts)) in enumerate(histograms.items()):
+        nonzero = np.flatnonzero(counts)
+        first, last = nonzero[0], nonzero[-1] + 1
+        title, xaxis_title = AGGREGATE_HISTOGRAMS[col]
+        fig = create_binned_histogram(edges[first:last + 1], counts[first:last], title, xaxis_title,
+                                      log_x=CROSSFILTER_DIMENSIONS.get(col) == 'log')
+        with columns[i % 2]:
+            st.plotly_chart(fig, use_container_width=True)
+            _show_payload(fig)
+
+
+def show_advanced_analytics_from_aggregate(aggregate):
+    """根据流式聚合结果显示高级分析"""
+    _show_advanced_analytics_intro()
+    _render_advanced_analytics(*_grouped_stats_from_aggregate(aggregate))
+
+
+def _show_advanced_analytics_intro():
+    """显示高级分析的标题和说明"""
     st.markdown("---")
     st.header("🔬 Advanced Analytics")
     st.markdown("""
@@ -597,7 +880,10 @@ def show_advanced_analytics(filtered_df):
     - Identify variability within groups (standard deviation)
     - Consider sample size when interpreting differences
     """)
-    
+
+
+def _render_advanced_analytics(performance_stats, engagement_stats):
+    """渲染分组统计表，表为None时显示提示"""
     col1, col2 = st.columns(2)
 
     with col1:
@@ -609,15 +895,8 @@ def show_advanced_analytics(filtered_df):
         - **Std**: Variability in performance within category
         """)
         
-        if ('content_category' in filtered_df.columns and
-                'video_view_count_clean' in filtered_df.columns and
-                not filtered_df['video_view_count_clean'].isna().all()):
-
-            performance_data = filtered_df.dropna(subset=['video_view_count_clean'])
-            performance_stats = performance_data.groupby('content_category')['video_view_count_clean'].agg([
-                'count', 'mean', 'std', 'min', 'max'
-            ]).round(2).sort_values('count', ascending=False).head(10)
-
+        if performance_stats is not None:
+            performance_stats = performance_stats.round(2).sort_values('count', ascending=False).head(10)
             st.dataframe(performance_stats, use_container_width=True)
             st.caption("Top 10 categories by video count. Sort by any column for different insights.")
         else:
@@ -632,15 +911,8 @@ def show_advanced_analytics(filtered_df):
         - **Strategic insights**: Inform verification value assessment
         """)
         
-        if ('verified_status' in filtered_df.columns and
-                'like_rate' in filtered_df.columns and
-                not filtered_df['like_rate'].isna().all()):
-
-            engagement_data = filtered_df.dropna(subset=['like_rate'])
-            engagement_stats = engagement_data.groupby('verified_status')['like_rate'].agg([
-                'count', 'mean', 'std', 'min', 'max'
-            ]).round(4).sort_values('count', ascending=False)
-
+        if engagement_stats is not None:
+            engagement_stats = engagement_stats.round(4).sort_values('count', ascending=False)
             st.dataframe(engagement_stats, use_container_width=True)
             st.caption("Engagement rate statistics by verification status")
         else:
@@ -665,7 +937,10 @@ def show_raw_data_section(filtered_df):
     - **Preview limited**: First 1,000 rows shown for performance
     """)
     
-    with st.expander("📊 View Filtered Data", expanded=False):
+    # 展开时才生成预览表格和CSV
+    with _tracked_expander("📊 View Filtered Data", key="raw_data") as section:
+        if not _is_open(section):
+            return
         if not filtered_df.empty:
             st.markdown(f"**Displaying first 1,000 rows of {len(filtered_df):,} total records**")
             st.dataframe(filtered_df.head(1000), use_container_width=True)
@@ -723,8 +998,14 @@ def show_raw_data_section(filtered_df):
             st.warning("⚠️ No data available to display. Try adjusting your filters.")
 
 
-def show_deep_dives(filtered_df):
-    """显示深度分析部分"""
+def show_deep_dives(filtered_df, aggregate=None, crossfilter=None, sketches=None, term_matrix=None, row_ids=None,
+                    correlations=None):
+    """
+    显示深度分析部分；aggregate为当前过滤条件下的立方体汇总（范围过滤生效时为None），
+    crossfilter为联动直方图使用的分箱计数立方体，sketches为各数值列的分位数草图，
+    term_matrix为转录文本的词频矩阵，row_ids为过滤后的行号，
+    correlations为按需计算相关矩阵的函数（只有打开性能指标标签页时才调用）
+    """
     st.header("📈 Video Analysis Center")
     st.markdown("""
     ### Dive deep into your TikTok video data with interactive analysis tools
@@ -732,30 +1013,20 @@ def show_deep_dives(filtered_df):
     Explore different aspects of video performance through specialized tabs:
     """)
     
-    # 创建标签页
-    tab1, tab2, tab3, tab4, tab5 = st.tabs([
-        "🎬 Performance Metrics", 
-        "👥 User Analysis", 
-        "📝 Content Analysis", 
-        "💬 Engagement Analysis", 
-        "📊 Dashboard"
-    ])
-
-    with tab1:
-        show_performance_metrics_tab(filtered_df)
-
-    with tab2:
-        show_user_analysis_tab(filtered_df)
-
-    with tab3:
-        show_content_analysis_tab(filtered_df)
-
-    with tab4:
-        show_engagement_analysis_tab(filtered_df)
-
-    with tab5:
-        show_dashboard_tab(filtered_df)
+    # 标签页登记表: (标题, 渲染函数)；标签页记录当前选中项，只运行选中标签页的内容
+    sections = [
+        ("🎬 Performance Metrics", lambda: show_performance_metrics_tab(filtered_df, crossfilter, correlations)),
+        ("👥 User Analysis", lambda: show_user_analysis_tab(filtered_df, aggregate, sketches)),
+        ("📝 Content Analysis", lambda: show_content_analysis_tab(filtered_df, term_matrix, row_ids)),
+        ("💬 Engagement Analysis", lambda: show_engagement_analysis_tab(filtered_df, crossfilter, sketches)),
+        ("📊 Dashboard", lambda: show_dashboard_tab(filtered_df)),
+    ]
+    tabs = _tracked_tabs([label for label, _ in sections], key="deep_dive_tab")
+    for tab, (_, render) in zip(tabs, sections):
+        if _is_open(tab):
+            with tab:
+                render()
 
     # 高级分析和原始数据
-    show_advanced_analytics(filtered_df)
+    show_advanced_analytics(filtered_df, aggregate)
     show_raw_data_section(filtered_df)
\ No newline at end of file
@@ -1,8 +1,8 @@
 import pandas as pd
 import streamlit as st
 
-def show_kpi_metrics(filtered_df):
-    """显示KPI指标"""
+def show_kpi_metrics(filtered_df, aggregate=None):
+    """显示KPI指标；aggregate为与filtered_df对应的立方体汇总，给定时直接读取统计量而不扫描行"""
     st.markdown("""
     ### 📊 Real-time Performance Indicators
     
@@ -12,17 +12,67 @@ def show_kpi_metrics(filtered_df):
     - **Content characteristics** like average duration
     - **Account verification status** distribution
     """)
+
+    if aggregate is not None:
+        _render_kpi_metrics(*_kpi_values_from_aggregate(aggregate))
+        return
+
+    total_videos = len(filtered_df)
+    avg_views = None
+    if 'video_view_count_clean' in filtered_df.columns and not filtered_df['video_view_count_clean'].isna().all():
+        avg_views = filtered_df['video_view_count_clean'].mean()
+
+    avg_duration = None
+    if 'video_duration_sec_clean' in filtered_df.columns and not filtered_df['video_duration_sec_clean'].isna().all():
+        avg_duration = filtered_df['video_duration_sec_clean'].mean()
+
+    verified_percentage = None
+    if 'verified_status' in filtered_df.columns:
+        verified_count = len(filtered_df[filtered_df['verified_status'] == 'verified'])
+        verified_percentage = (verified_count / len(filtered_df)) * 100 if len(filtered_df) > 0 else 0
+
+    _render_kpi_metrics(total_videos, avg_views, avg_duration, verified_percentage)
+
+
+def show_kpi_metrics_from_aggregate(aggregate):
+    """根据流式聚合结果显示KPI指标"""
+    st.markdown("""
+    ### 📊 Performance Indicators (Streaming Mode)
     
+    Computed chunk by chunk over the full dataset without loading every row into memory.
+    """)
+
+    _render_kpi_metrics(*_kpi_values_from_aggregate(aggregate))
+
+
+def _kpi_values_from_aggregate(aggregate):
+    """从聚合结果取出四个KPI的值: (视频数, 平均播放量, 平均时长, 认证账号百分比)"""
+    view_stats = aggregate.metrics.get('video_view_count_clean')
+    duration_stats = aggregate.metrics.get('video_duration_sec_clean')
+
+    verified_percentage = None
+    if 'verified_status' in aggregate.tallies:
+        verified_count = aggregate.tallies['verified_status'].get('verified', 0)
+        verified_percentage = (verified_count / aggregate.row_count) * 100 if aggregate.row_count > 0 else 0
+
+    return (
+        aggregate.row_count,
+        view_stats.mean if view_stats and view_stats.count else None,
+        duration_stats.mean if duration_stats and duration_stats.count else None,
+        verified_percentage
+    )
+
+
+def _render_kpi_metrics(total_videos, avg_views, avg_duration, verified_percentage):
+    """渲染四个KPI指标，值为None时显示N/A"""
     col1, col2, col3, col4 = st.columns(4)
 
     with col1:
-        total_videos = len(filtered_df)
         st.metric("Total Videos", f"{total_videos:,}")
         st.caption("Number of videos in current selection")
 
     with col2:
-        if 'video_view_count_clean' in filtered_df.columns and not filtered_df['video_view_count_clean'].isna().all():
-            avg_views = filtered_df['video_view_count_clean'].mean()
+        if avg_views is not None:
             st.metric("Average Views", f"{avg_views:,.0f}")
             st.caption("Mean view count across selected videos")
         else:
@@ -30,8 +80,7 @@ def show_kpi_metrics(filtered_df):
             st.caption("View count data not available")
 
     with col3:
-        if 'video_duration_sec_clean' in filtered_df.columns and not filtered_df['video_duration_sec_clean'].isna().all():
-            avg_duration = filtered_df['video_duration_sec_clean'].mean()
+        if avg_duration is not None:
             st.metric("Average Duration", f"{avg_duration:.1f}s")
             st.caption("Mean video length in seconds")
         else:
@@ -39,9 +88,7 @@ def show_kpi_metrics(filtered_df):
             st.caption("Duration data not available")
 
     with col4:
-        if 'verified_status' in filtered_df.columns:
-            verified_count = len(filtered_df[filtered_df['verified_status'] == 'verified'])
-            verified_percentage = (verified_count / len(filtered_df)) * 100 if len(filtered_df) > 0 else 0
+        if verified_percentage is not None:
             st.metric("Verified Accounts", f"{verified_percentage:.1f}%")
             st.caption("Percentage of verified creator accounts")
         else:
@@ -49,6 +96,99 @@ def show_kpi_metrics(filtered_df):
             st.caption("Verification status data not available")
 
 
+QUALITY_COLUMNS = ['video_view_count_clean', 'video_like_count_clean', 'video_share_count_clean',
+                   'video_download_count_clean', 'video_comment_count_clean', 'video_duration_sec_clean']
+
+
+def _render_quality_summary(total_count, non_null_counts, parse_failures=None):
+    """渲染列完整度表格和缺失数据提示，parse_failures为原始列名到解析失败数量的映射"""
+    quality_data = []
+    for col, non_null_count in non_null_counts.items():
+        null_percentage = (total_count - non_null_count) / total_count * 100 if total_count else 0
+        row = {
+            'Column': col.replace('_clean', '').replace('_', ' ').title(),
+            'Total Records': total_count,
+            'Non-Null Records': non_null_count,
+            'Null Percentage': f"{null_percentage:.2f}%",
+            'Data Quality': "✅ Good" if null_percentage < 5 else "⚠️ Moderate" if null_percentage < 20 else "❌ Poor"
+        }
+        if parse_failures is not None:
+            row['Parse Failures'] = parse_failures.get(col.replace('_clean', ''), 0)
+        quality_data.append(row)
+
+    if quality_data:
+        quality_df = pd.DataFrame(quality_data)
+        st.dataframe(quality_df, use_container_width=True)
+
+        # 添加数据质量建议
+        poor_quality_cols = [row['Column'] for row in quality_data if row['Null Percentage'].endswith('%') and float(row['Null Percentage'].replace('%', '')) >= 20]
+        if poor_quality_cols:
+            st.warning(f"**Note**: The following columns have significant missing data: {', '.join(poor_quality_cols)}. Results involving these metrics should be interpreted with caution.")
+
+
+def format_bytes(size):
+    """将字节数格式化为易读的字符串"""
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size < 1024 or unit == 'GB':
+            return f"{size:,.0f} {unit}" if unit == 'B' else f"{size:,.1f} {unit}"
+        size /= 1024
+
+
+def _render_memory_report(memory_report):
+    """渲染紧凑内存模式前后每列占用的字节数"""
+    st.subheader("💾 Memory Footprint")
+    st.markdown("Bytes per column of the processed data before and after compact-memory conversion:")
+
+    before, after = memory_report['before'], memory_report['after']
+    total_before, total_after = sum(before.values()), sum(after.values())
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Before", format_bytes(total_before))
+    with col2:
+        st.metric("After", format_bytes(total_after))
+    with col3:
+        st.metric("Reduction", f"{total_before / total_after:.1f}x" if total_after else "N/A")
+
+    memory_df = pd.DataFrame([
+        {
+            'Column': col,
+            'Before': format_bytes(size),
+            'After': format_bytes(after.get(col, 0)) if after.get(col, 0) else 'dropped',
+            'Saved': f"{(1 - after.get(col, 0) / size) * 100:.0f}%" if size else '0%',
+        }
+        for col, size in sorted(before.items(), key=lambda item: -item[1])
+    ])
+    st.dataframe(memory_df, use_container_width=True)
+
+
+STAGE_LABELS = {
+    'read': 'Read CSV / cache',
+    'clean': 'Clean numeric columns',
+    'categorize': 'Categorize content',
+    'rates': 'Engagement rates',
+    'compact': 'Compact memory',
+}
+
+
+def _render_stage_memory(stage_memory):
+    """渲染预处理各阶段的进程内存（开始、峰值、结束时的RSS）；追加的行没有峰值"""
+    st.subheader("📈 Peak Memory per Stage")
+    st.markdown("Process resident memory (RSS) while each preprocessing stage ran. "
+                "Peaks are measured only on a full load; rows appended later report start and end RSS:")
+    stage_df = pd.DataFrame([
+        {
+            'Stage': STAGE_LABELS.get(stage, stage),
+            'RSS at Start': format_bytes(usage['start']),
+            'Peak RSS': format_bytes(usage['peak']) if 'peak' in usage else '—',
+            'Peak over Start': format_bytes(max(usage['peak'] - usage['start'], 0)) if 'peak' in usage else '—',
+            'RSS at End': format_bytes(usage['end']),
+        }
+        for stage, usage in stage_memory.items()
+    ])
+    st.dataframe(stage_df, use_container_width=True)
+
+
 def show_data_quality_report(df):
     """显示数据质量报告"""
     with st.expander("🔍 Data Quality Report"):
@@ -68,31 +208,42 @@ def show_data_quality_report(df):
         
         st.subheader("📋 Data Quality Summary")
 
-        quality_data = []
-        numeric_columns = ['video_view_count_clean', 'video_like_count_clean', 'video_share_count_clean',
-                           'video_download_count_clean', 'video_comment_count_clean', 'video_duration_sec_clean']
-
-        for col in numeric_columns:
-            if col in df.columns:
-                total_count = len(df)
-                non_null_count = df[col].count()
-                null_percentage = (total_count - non_null_count) / total_count * 100
-                quality_data.append({
-                    'Column': col.replace('_clean', '').replace('_', ' ').title(),
-                    'Total Records': total_count,
-                    'Non-Null Records': non_null_count,
-                    'Null Percentage': f"{null_percentage:.2f}%",
-                    'Data Quality': "✅ Good" if null_percentage < 5 else "⚠️ Moderate" if null_percentage < 20 else "❌ Poor"
-                })
-
-        if quality_data:
-            quality_df = pd.DataFrame(quality_data)
-            st.dataframe(quality_df, use_container_width=True)
-            
-            # 添加数据质量建议
-            poor_quality_cols = [row['Column'] for row in quality_data if row['Null Percentage'].endswith('%') and float(row['Null Percentage'].replace('%', '')) >= 20]
-            if poor_quality_cols:
-                st.warning(f"**Note**: The following columns have significant missing data: {', '.join(poor_quality_cols)}. Results involving these metrics should be interpreted with caution.")
+        non_null_counts = {col: df[col].count() for col in QUALITY_COLUMNS if col in df.columns}
+        _render_quality_summary(len(df), non_null_counts, df.attrs.get('parse_failures'))
+
+        # 显示schema检查结果
+        schema_report = df.attrs.get('schema_report')
+        if schema_report:
+            st.subheader("📐 Schema Check")
+            st.markdown("Rows and values that do not match the expected TikTok dataset schema:")
+
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("Rows Read", f"{schema_report['rows_read']:,}")
+            with col2:
+                st.metric("Malformed Rows Skipped", f"{schema_report['malformed_rows']:,}")
+            with col3:
+                st.metric("Missing Columns", len(schema_report['missing_columns']))
+
+            if schema_report['missing_columns']:
+                st.warning(f"**Missing columns**: {', '.join(schema_report['missing_columns'])}")
+            if schema_report['violations']:
+                violations_df = pd.DataFrame([
+                    {'Column': col, 'Invalid Values': count}
+                    for col, count in schema_report['violations'].items()
+                ])
+                st.dataframe(violations_df, use_container_width=True)
+            else:
+                st.success("All values match the expected column types and status values")
+
+        # 显示紧凑内存模式下每列的内存占用
+        memory_report = df.attrs.get('memory_report')
+        if memory_report:
+            _render_memory_report(memory_report)
+
+        stage_memory = df.attrs.get('stage_memory')
+        if stage_memory:
+            _render_stage_memory(stage_memory)
 
         # 显示数据样本
         st.subheader("👀 Data Sample Preview")
@@ -106,4 +257,25 @@ def show_data_quality_report(df):
         else:
             st.dataframe(df.head(10), use_container_width=True)
             
-        st.caption("This preview helps you understand the data structure and verify filter applications")
\ No newline at end of file
+        st.caption("This preview helps you understand the data structure and verify filter applications")
+
+
+def show_data_quality_report_from_aggregate(aggregate):
+    """根据流式聚合结果显示数据质量报告"""
+    with st.expander("🔍 Data Quality Report"):
+        st.markdown("""
+        ### 📈 Data Quality Assessment (Streaming Mode)
+        
+        Completeness is computed from per-chunk counts over the full dataset.
+        The sample below comes from the first chunk read.
+        """)
+
+        st.subheader("📋 Data Quality Summary")
+        non_null_counts = {col: aggregate.metrics[col].count for col in QUALITY_COLUMNS if col in aggregate.metrics}
+        _render_quality_summary(aggregate.row_count, non_null_counts, aggregate.parse_failures)
+
+        if aggregate.sample is not None:
+            st.subheader("👀 Data Sample Preview")
+            key_columns = [col for col in ['video_id', 'verified_status', 'author_ban_status', 'video_view_count_clean',
+                                          'video_duration_sec_clean', 'content_category'] if col in aggregate.sample.columns]
+            st.dataframe(aggregate.sample[key_columns] if key_columns else aggregate.sample, use_container_width=True)
@@ -0,0 +1,251 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import streamlit as st
+from collections import Counter
+
+from utils.io import DATA_PATH, get_file_fingerprint, iter_csv_chunks
+from utils.prep import preprocess_frame
+from utils.sketch import SKETCH_COLUMNS, QuantileSketch
+
+# 需要统计的数值列
+METRIC_COLUMNS = ['video_view_count_clean', 'video_like_count_clean', 'video_share_count_clean',
+                  'video_download_count_clean', 'video_comment_count_clean', 'video_duration_sec_clean',
+                  'like_rate', 'share_rate', 'comment_rate']
+
+# 需要计数的分类列
+CATEGORY_COLUMNS = ['verified_status', 'author_ban_status', 'claim_status', 'content_category']
+
+# 分组统计: (分组列, 数值列)，对应高级分析中的两张统计表
+GROUPED_METRICS = [('content_category', 'video_view_count_clean'), ('verified_status', 'like_rate')]
+
+# 分组草图: (分组列, 分位数列)，对应用户分析中按账户状态的箱线图
+GROUPED_SKETCHES = [(group_col, col) for group_col in ['verified_status', 'author_ban_status']
+                    for col in ['video_view_count_clean', 'video_like_count_clean', 'video_share_count_clean']]
+
+# 固定的直方图分箱，保证各块结果可以直接相加；计数类指标使用对数分箱（小于1的值归入第一个分箱）
+HISTOGRAM_BINS = {
+    'video_view_count_clean': np.logspace(0, 10, 101),
+    'video_duration_sec_clean': np.arange(0, 605, 5, dtype=float),
+    'like_rate': np.linspace(0, 1, 101),
+    'share_rate': np.linspace(0, 1, 101),
+}
+
+
+class MetricStats:
+    """可合并的数值统计量: count / sum / sum_sq / min / max"""
+
+    def __init__(self, count=0, total=0.0, total_sq=0.0, min_value=np.inf, max_value=-np.inf):
+        self.count = count
+        self.total = total
+        self.total_sq = total_sq
+        self.min_value = min_value
+        self.max_value = max_value
+
+    @classmethod
+    def from_values(cls, values):
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return cls()
+        return cls(int(values.size), float(values.sum()), float(np.square(values).sum()),
+                   float(values.min()), float(values.max()))
+
+    def merge(self, other):
+        """合并另一份统计量（原地修改并返回自身）"""
+        self.count += other.count
+        self.total += other.total
+        self.total_sq += other.total_sq
+        self.min_value = min(self.min_value, other.min_value)
+        self.max_value = max(self.max_value, other.max_value)
+        return self
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else np.nan
+
+    @property
+    def std(self):
+        # 与pandas一致使用样本标准差(ddof=1)
+        if self.count < 2:
+            return np.nan
+        variance = (self.total_sq - self.total ** 2 / self.count) / (self.count - 1)
+        return float(np.sqrt(max(variance, 0.0)))
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'mean': self.mean,
+            'std': self.std,
+            'min': self.min_value if self.count else np.nan,
+            'max': self.max_value if self.count else np.nan,
+        }
+
+
+class DatasetAggregate:
+    """
+    数据集的部分聚合结果，可以逐块累加，也可以两两合并
+
+    包含行数、各数值列的统计量、分位数草图、分类列计数、固定分箱直方图、分组统计、分组草图以及解析失败计数，
+    足以渲染KPI、数据质量报告、分布直方图和高级分析，而无需保留原始行。
+    """
+
+    def __init__(self):
+        self.row_count = 0
+        self.metrics = {}
+        self.sketches = {}
+        self.tallies = {}
+        self.histograms = {}
+        self.grouped = {}
+        self.grouped_sketches = {}
+        self.parse_failures = Counter()
+        self.sample = None
+
+    @classmethod
+    def from_frame(cls, df):
+        """从一个已预处理的数据块计算部分聚合"""
+        aggregate = cls()
+        aggregate.row_count = len(df)
+        aggregate.sample = df.head(10)
+        aggregate.parse_failures.update(df.attrs.get('parse_failures', {}))
+
+        for col in METRIC_COLUMNS:
+            if col in df.columns:
+                aggregate.metrics[col] = MetricStats.from_values(df[col])
+
+        for col in SKETCH_COLUMNS:
+            if col in df.columns:
+                aggregate.sketches[col] = QuantileSketch.from_values(df[col].to_numpy(dtype=float, na_value=np.nan))
+
+        for col in CATEGORY_COLUMNS:
+            if col in df.columns:
+                aggregate.tallies[col] = Counter(df[col].value_counts().to_dict())
+
+        for col, edges in HISTOGRAM_BINS.items():
+            if col in df.columns:
+                values = df[col].dropna().to_numpy(dtype=float)
+                # 超出范围的值归入首尾分箱，保证总数不丢失
+                values = np.clip(values, edges[0], edges[-1])
+                aggregate.histograms[col] = np.histogram(values, bins=edges)[0]
+
+        for group_col, metric in GROUPED_METRICS:
+            if group_col in df.columns and metric in df.columns:
+                aggregate.grouped[(group_col, metric)] = {
+                    value: MetricStats.from_values(values)
+                    for value, values in df.groupby(group_col)[metric]
+                }
+
+        for group_col, col in GROUPED_SKETCHES:
+            if group_col in df.columns and col in df.columns:
+                aggregate.grouped_sketches[(group_col, col)] = {
+                    value: QuantileSketch.from_values(values.to_numpy(dtype=float, na_value=np.nan))
+                    for value, values in df.groupby(group_col, observed=True)[col]
+                }
+
+        return aggregate
+
+    def merge(self, other):
+        """合并另一份部分聚合（原地修改并返回自身）"""
+        self.row_count += other.row_count
+        self.parse_failures.update(other.parse_failures)
+        if self.sample is None:
+            self.sample = other.sample
+
+        for col, stats in other.metrics.items():
+            self.metrics.setdefault(col, MetricStats()).merge(stats)
+
+        for col, sketch in other.sketches.items():
+            self.sketches.setdefault(col, QuantileSketch()).merge(sketch)
+
+        for col, counts in other.tallies.items():
+            self.tallies.setdefault(col, Counter()).update(counts)
+
+        for col, counts in other.histograms.items():
+            if col in self.histograms:
+                self.histograms[col] = self.histograms[col] + counts
+            else:
+                self.histograms[col] = counts.copy()
+
+        for key, groups in other.grouped.items():
+            target = self.grouped.setdefault(key, {})
+            for value, stats in groups.items():
+                target.setdefault(value, MetricStats()).merge(stats)
+
+        for key, groups in other.grouped_sketches.items():
+            target = self.grouped_sketches.setdefault(key, {})
+            for value, sketch in groups.items():
+                target.setdefault(value, QuantileSketch()).merge(sketch)
+
+        return self
+
+    def grouped_table(self, group_col, metric):
+        """返回与groupby().agg(['count', 'mean', 'std', 'min', 'max'])相同结构的表"""
+        groups = self.grouped.get((group_col, metric), {})
+        table = pd.DataFrame.from_dict(
+            {value: stats.to_dict() for value, stats in groups.items() if stats.count},
+            orient='index',
+            columns=['count', 'mean', 'std', 'min', 'max']
+        )
+        table.index.name = group_col
+        return table
+
+    def quantile(self, col, q):
+        """由分位数草图估计分位数，该列没有草图时返回NaN"""
+        sketch = self.sketches.get(col)
+        return sketch.quantile(q) if sketch is not None else np.nan
+
+    def value_counts(self, col):
+        """返回与Series.value_counts()相同结构的计数（降序）"""
+        counts = pd.Series(dict(self.tallies.get(col, Counter()).most_common()), dtype='int64')
+        counts.index.name = col
+        return counts.rename('count')
+
+    def histogram(self, col):
+        """返回(分箱边界, 计数)，该列没有直方图时返回None"""
+        if col not in self.histograms:
+            return None
+        return HISTOGRAM_BINS[col], self.histograms[col]
+
+
+def iter_processed_chunks(chunks):
+    """对每个数据块做预处理的生成器"""
+    for chunk in chunks:
+        yield preprocess_frame(chunk)
+
+
+def fold_aggregate(chunks):
+    """将数据块逐个折叠为一份DatasetAggregate"""
+    aggregate = DatasetAggregate()
+    for chunk in chunks:
+        aggregate.merge(DatasetAggregate.from_frame(chunk))
+    return aggregate
+
+
+def build_streaming_aggregate(path=DATA_PATH):
+    """流式读取、预处理并聚合整个数据集，内存占用只与块大小有关"""
+    try:
+        return fold_aggregate(iter_processed_chunks(iter_csv_chunks(path)))
+    except pa.ArrowInvalid:
+        # 数值列中含有非数字文本，按字符串重新读取并交由清洗逻辑处理
+        return fold_aggregate(iter_processed_chunks(iter_csv_chunks(path, string_numeric=True)))
+
+
+def load_streaming_aggregate(path=DATA_PATH):
+    """加载流式聚合结果（按文件指纹缓存）"""
+    try:
+        fingerprint = get_file_fingerprint(path)
+    except OSError as e:
+        st.error(f"Error loading data: {e}")
+        return None
+
+    return _load_streaming_aggregate_cached(path, fingerprint['size'], fingerprint['mtime_ns'])
+
+
+@st.cache_data
+def _load_streaming_aggregate_cached(path, size, mtime_ns):
+    """size和mtime_ns仅作为缓存键"""
+    try:
+        return build_streaming_aggregate(path)
+    except Exception as e:
+        st.error(f"Error loading data: {e}")
+        return None
@@ -0,0 +1,153 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# 每块参与矩阵乘法的行数，限制标准化中间数组的内存
+CORRELATION_CHUNK_ROWS = 1 << 16
+
+# 标准化后方差低于该值（按行数归一）的列视为常数列，相关系数为NaN
+_MIN_VARIANCE = 1e-12
+
+
+def correlation_columns(df):
+    """参与相关分析的列: 所有数值型的_clean列和互动率列"""
+    return [col for col in df.columns
+            if (col.endswith('_clean') or col.endswith('_rate')) and pd.api.types.is_numeric_dtype(df[col])]
+
+
+def correlation_from_sums(products, sums, squared, pairs):
+    """
+    由列对的乘积和、和、平方和与有效行数计算Pearson相关系数
+
+    sums[i, j]为i列在i、j两列都有效的行上的和，squared同理为平方和；
+    与DataFrame.corr相同，每对列只使用两列都不缺失的行，常数列的相关系数为NaN
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        covariance = products - sums * sums.T / pairs
+        variance = squared - sums ** 2 / pairs
+        correlation = covariance / np.sqrt(variance * variance.T)
+    constant = (variance <= _MIN_VARIANCE * pairs) | (variance.T <= _MIN_VARIANCE * pairs)
+    correlation[(pairs < 2) | constant] = np.nan
+    np.clip(correlation, -1, 1, out=correlation)
+    diagonal = np.diag_indices(len(correlation))
+    correlation[diagonal] = np.where(np.isnan(correlation[diagonal]), np.nan, 1.0)
+    return correlation
+
+
+def _standardize(points, counts):
+    """按给定取值的出现次数标准化取值（用于查表），末尾追加0供缺失值（编号-1）查询"""
+    total = counts.sum()
+    center = counts @ points / max(total, 1)
+    scale = np.sqrt(counts @ (points - center) ** 2 / max(total, 1)) or 1.0
+    return np.append((points - center) / scale, 0.0)
+
+
+class CorrelationColumns:
+    """
+    每个数据版本计算一次的相关分析列: 每列的取值编号（按值排序，缺失为-1）和去重后的取值
+
+    任意行子集的平均秩（并列取平均）只需对编号计数一次再累加，不需要重新排序；
+    标准化后的取值和秩都由编号查表得到，Pearson和Spearman相关矩阵由同一次矩阵乘法算出。
+    缺失行不同的列对，Spearman系数在两列都有效的行上重新计秩，与DataFrame.corr一致。
+    """
+
+    def __init__(self, columns, codes, uniques):
+        self.columns = columns
+        self.codes = codes
+        self.uniques = uniques
+
+    @classmethod
+    def from_frame(cls, df):
+        columns = correlation_columns(df)
+        codes, uniques = {}, {}
+        for col in columns:
+            values = df[col].to_numpy(dtype=float, na_value=np.nan)
+            valid = ~np.isnan(values)
+            uniques[col], inverse = np.unique(values[valid], return_inverse=True)
+            codes[col] = np.full(len(values), -1, dtype=np.int32)
+            codes[col][valid] = inverse
+        return cls(columns, codes, uniques)
+
+    def lookup_tables(self, codes, col):
+        """
+        给定行上col列每个取值编号对应的标准化取值和标准化平均秩（从1开始，并列取平均）；
+        秩只需对编号计数一次再累加
+        """
+        counts = np.bincount(codes[codes >= 0], minlength=len(self.uniques[col])).astype(float)
+        ranks = np.cumsum(counts) - counts + (counts + 1) / 2
+        return _standardize(self.uniques[col], counts), _standardize(ranks, counts)
+
+    def matrices(self, row_ids=None, chunk_rows=CORRELATION_CHUNK_ROWS):
+        """
+        给定行（默认全部行）上的Pearson和Spearman相关矩阵 {'pearson': DataFrame, 'spearman': DataFrame}
+
+        按行分块构造 [标准化取值, 标准化秩, 两者的平方, 有效标记]，累加其转置与自身的乘积，
+        一次得到所有列对的乘积和、和、平方和与有效行数；中间数组的大小与总行数无关。
+        秩按每列自身的有效行计算，只对两列缺失行不同的列对重新计秩（见pairwise_spearman）
+        """
+        k = len(self.columns)
+        codes = [self.codes[col] if row_ids is None else self.codes[col][row_ids] for col in self.columns]
+        tables = [self.lookup_tables(column_codes, col) for column_codes, col in zip(codes, self.columns)]
+        row_count = len(codes[0]) if codes else 0
+
+        gram = np.zeros((5 * k, 5 * k))
+        for start in range(0, row_count, chunk_rows):
+            stop = min(start + chunk_rows, row_count)
+            block = np.empty((stop - start, 5 * k), order='F')
+            for j, (column_codes, (values, ranks)) in enumerate(zip(codes, tables)):
+                chunk = column_codes[start:stop]
+                block[:, j] = values[chunk]
+                block[:, k + j] = ranks[chunk]
+                block[:, 4 * k + j] = chunk >= 0
+            np.square(block[:, :2 * k], out=block[:, 2 * k:4 * k])
+            gram += block.T @ block
+
+        result = {}
+        pairs = gram[4 * k:, 4 * k:]
+        for method, offset in [('pearson', 0), ('spearman', k)]:
+            matrix = correlation_from_sums(
+                gram[offset:offset + k, offset:offset + k],
+                gram[offset:offset + k, 4 * k:],
+                gram[2 * k + offset:2 * k + offset + k, 4 * k:],
+                pairs
+            )
+            if method == 'spearman':
+                valid = np.diag(pairs)
+                for i, j in zip(*np.triu_indices(k, 1)):
+                    if pairs[i, j] < max(valid[i], valid[j]):
+                        matrix[i, j] = matrix[j, i] = self.pairwise_spearman(
+                            codes[i], codes[j], self.columns[i], self.columns[j])
+            result[method] = pd.DataFrame(matrix, index=self.columns, columns=self.columns)
+        return result
+
+    def pairwise_spearman(self, codes_a, codes_b, col_a, col_b):
+        """在两列都有效的行上重新计秩的Spearman系数（两列缺失行不同时使用）"""
+        both = (codes_a >= 0) & (codes_b >= 0)
+        codes_a, codes_b = codes_a[both], codes_b[both]
+        pairs = float(len(codes_a))
+        ranks_a = self.lookup_tables(codes_a, col_a)[1][codes_a]
+        ranks_b = self.lookup_tables(codes_b, col_b)[1][codes_b]
+        correlation = correlation_from_sums(
+            np.array([[ranks_a @ ranks_a, ranks_a @ ranks_b], [ranks_b @ ranks_a, ranks_b @ ranks_b]]),
+            np.array([[ranks_a.sum()] * 2, [ranks_b.sum()] * 2]),
+            np.array([[ranks_a @ ranks_a] * 2, [ranks_b @ ranks_b] * 2]),
+            np.full((2, 2), pairs)
+        )
+        return correlation[0, 1]
+
+
+def correlation_matrices(df):
+    """df上所有相关分析列的Pearson和Spearman相关矩阵（不缓存）"""
+    return CorrelationColumns.from_frame(df).matrices()
+
+
+@st.cache_resource(max_entries=4)
+def load_correlation_columns(data_key, _df):
+    """每个数据版本只计算一次取值编号；data_key标识数据版本，_df不参与缓存键"""
+    return CorrelationColumns.from_frame(_df)
+
+
+@st.cache_resource(max_entries=8)
+def load_filter_correlations(data_key, state_hash, _df, _row_ids):
+    """每个过滤条件只计算一次相关矩阵；state_hash为过滤条件哈希"""
+    return load_correlation_columns(data_key, _df).matrices(_row_ids)
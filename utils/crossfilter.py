@@ -0,0 +1,116 @@
+import numpy as np
+import streamlit as st
+
+from utils.viz import log_bin_edges, linear_bin_edges
+
+# 联动直方图的维度: 数据列 -> 分箱方式（播放量长尾分布使用对数分箱）
+CROSSFILTER_DIMENSIONS = {
+    'video_view_count_clean': 'log',
+    'video_duration_sec_clean': 'linear',
+    'like_rate': 'linear',
+    'share_rate': 'linear',
+}
+
+# 每个维度的最大分箱数；另有一个分箱存放缺失值
+CROSSFILTER_BINS = 32
+
+# 比率列的分箱上界取该分位数，更大的值归入最后一个分箱
+RATE_UPPER_QUANTILE = 0.99
+
+
+class BinnedColumns:
+    """
+    每行在各联动维度上的分箱编号，合并为一个扁平单元格编号（每个数据版本计算一次）
+
+    edges[col]为该维度的分箱边界；编号等于分箱数的分箱存放缺失值。
+    """
+
+    def __init__(self, dimensions, edges, cells):
+        self.dimensions = dimensions
+        self.edges = edges
+        self.cells = cells
+        self.shape = tuple(len(edges[col]) for col in dimensions)
+
+    @classmethod
+    def from_frame(cls, df):
+        dimensions = [col for col in CROSSFILTER_DIMENSIONS if col in df.columns and df[col].notna().any()]
+        edges, codes = {}, []
+        for col in dimensions:
+            values = df[col].to_numpy(dtype=float, na_value=np.nan)
+            present = values[~np.isnan(values)]
+            if CROSSFILTER_DIMENSIONS[col] == 'log':
+                col_edges = log_bin_edges(present, CROSSFILTER_BINS)
+            elif col.endswith('_rate'):
+                col_edges = linear_bin_edges(present, CROSSFILTER_BINS, float(np.quantile(present, RATE_UPPER_QUANTILE)))
+            else:
+                col_edges = linear_bin_edges(present, CROSSFILTER_BINS)
+            bins = len(col_edges) - 1
+
+            # 超出范围的值归入首尾分箱
+            col_codes = np.clip(np.searchsorted(col_edges, values, side='right') - 1, 0, bins - 1)
+            col_codes[np.isnan(values)] = bins
+            edges[col] = col_edges
+            codes.append(col_codes)
+
+        shape = tuple(len(edges[col]) for col in dimensions)
+        cells = np.ravel_multi_index(codes, shape).astype(np.int32) if dimensions else np.zeros(len(df), np.int32)
+        return cls(dimensions, edges, cells)
+
+
+class Crossfilter:
+    """
+    一个过滤条件下的多维分箱计数立方体
+
+    刷选（brush）为 {列: (起始分箱, 结束分箱)}。某一维度的直方图受其他维度刷选的约束、
+    不受自身刷选的约束；所有计算都是在立方体上切片求和，不需要访问原始行。
+    """
+
+    def __init__(self, dimensions, edges, counts):
+        self.dimensions = dimensions
+        self.edges = edges
+        self.counts = counts
+
+    @classmethod
+    def from_rows(cls, binned, row_ids):
+        counts = np.bincount(binned.cells[row_ids], minlength=int(np.prod(binned.shape)))
+        counts = counts.astype(np.int32).reshape(binned.shape)
+        counts.flags.writeable = False
+        return cls(binned.dimensions, binned.edges, counts)
+
+    def _slices(self, brushes, skip=None):
+        # 没有刷选的维度包含缺失值分箱；有刷选时只保留选中的分箱
+        slices = []
+        for col in self.dimensions:
+            brush = brushes.get(col)
+            if col == skip or brush is None:
+                slices.append(slice(None))
+            else:
+                slices.append(slice(brush[0], brush[1] + 1))
+        return tuple(slices)
+
+    def histogram(self, col, brushes):
+        """col维度每个分箱的计数（不含缺失值），受其他维度刷选的约束"""
+        axis = self.dimensions.index(col)
+        other_axes = tuple(i for i in range(len(self.dimensions)) if i != axis)
+        return self.counts[self._slices(brushes, skip=col)].sum(axis=other_axes)[:-1]
+
+    def match_count(self, brushes):
+        """满足全部刷选的行数"""
+        return int(self.counts[self._slices(brushes)].sum())
+
+    def brush_range(self, col, brush):
+        """刷选对应的取值范围(下界, 上界)"""
+        edges = self.edges[col]
+        return float(edges[brush[0]]), float(edges[brush[1] + 1])
+
+
+@st.cache_resource(max_entries=4)
+def load_binned_columns(data_key, _df):
+    """每个数据版本只计算一次分箱编号；data_key标识数据版本，_df不参与缓存键"""
+    return BinnedColumns.from_frame(_df)
+
+
+@st.cache_resource(max_entries=8)
+def load_crossfilter(data_key, state_hash, _binned, _row_ids):
+    """每个过滤条件只构建一次计数立方体；state_hash为过滤条件哈希"""
+    return Crossfilter.from_rows(_binned, _row_ids)
@@ -0,0 +1,242 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+from collections import Counter
+
+from utils.agg import METRIC_COLUMNS, CATEGORY_COLUMNS, GROUPED_METRICS, GROUPED_SKETCHES, MetricStats, DatasetAggregate
+from utils.filters import CATEGORICAL_FILTERS, RANGE_FILTERS, KEYWORD_FILTER
+from utils.sketch import QuantileSketch, SketchColumns
+
+# 结论部分按认证状态比较平均播放量，与高级分析的两张表一起在汇总时计算
+CUBE_GROUPED_METRICS = GROUPED_METRICS + [('verified_status', 'video_view_count_clean')]
+
+
+class CategoryCube:
+    """
+    分类维度立方体: verified × ban × claim × category，每个单元格保存行数和各数值列的
+    count / sum / sum_sq / min / max（与MetricStats相同的可合并统计量）
+
+    每个维度的最后一个取值为None（缺失值）。每个范围过滤列（时长、播放量）另有一个大小为4的区段轴:
+    缺失 / 低于默认下界 / 默认范围内 / 高于默认上界，范围过滤器总会去掉缺失的行。
+    当每个范围过滤条件都完整包含或完全排除各个区段时（例如滑块处于默认位置或全范围），
+    汇总单元格即可得到与过滤后数据相同的统计结果，不需要访问原始行。
+
+    非空单元格另外保存分位数列的草图桶计数，汇总后得到过滤结果的分位数草图。
+    """
+
+    def __init__(self, dimensions, values, row_counts, metrics, stats, range_columns, sketches, band_bounds=None):
+        self.dimensions = dimensions
+        self.values = values
+        self.row_counts = row_counts
+        self.metrics = metrics
+        self.stats = stats
+        self.range_columns = range_columns
+        self.sketches = sketches
+        # {范围列: (各区段的最小值, 各区段的最大值)}，空区段为NaN
+        self.band_bounds = band_bounds or {}
+        self.occupied = np.flatnonzero(row_counts.ravel())
+
+    @classmethod
+    def from_frame(cls, df, sketch_columns=None, band_ranges=None):
+        """
+        sketch_columns为该数据的SketchColumns，未给定时重新计算；
+        band_ranges为划分范围区段的 {范围列: (下界, 上界)}（即滑块默认值），未给定的列只区分是否缺失
+        """
+        dimensions = [col for col in CATEGORY_COLUMNS if col in df.columns]
+        values = {}
+        codes = []
+        for col in dimensions:
+            col_codes, uniques = pd.factorize(df[col])
+            values[col] = uniques.tolist() + [None]
+            codes.append(np.where(col_codes < 0, len(uniques), col_codes))
+
+        range_columns = [col for col in RANGE_FILTERS if col in df.columns]
+        band_bounds = {}
+        for col in range_columns:
+            col_values = df[col].to_numpy(dtype=float, na_value=np.nan)
+            low, high = (band_ranges or {}).get(col, (-np.inf, np.inf))
+            bands = np.where(np.isnan(col_values), 0,
+                             np.where(col_values < low, 1, np.where(col_values > high, 3, 2)))
+            extremes = pd.Series(col_values).groupby(bands).agg(['min', 'max']).reindex(range(4))
+            band_bounds[col] = (extremes['min'].to_numpy(), extremes['max'].to_numpy())
+            codes.append(bands)
+
+        shape = tuple(len(values[col]) for col in dimensions) + (4,) * len(range_columns)
+        cells = np.ravel_multi_index(codes, shape) if len(df) else np.zeros(0, dtype=np.intp)
+        size = int(np.prod(shape))
+        row_counts = np.bincount(cells, minlength=size).reshape(shape)
+
+        metrics = [metric for metric in METRIC_COLUMNS if metric in df.columns]
+        stats = {
+            'count': np.zeros((len(metrics), size)),
+            'total': np.zeros((len(metrics), size)),
+            'total_sq': np.zeros((len(metrics), size)),
+            'min': np.full((len(metrics), size), np.inf),
+            'max': np.full((len(metrics), size), -np.inf),
+        }
+        for i, metric in enumerate(metrics):
+            metric_values = df[metric].to_numpy(dtype=float, na_value=np.nan)
+            valid = ~np.isnan(metric_values)
+            metric_cells, metric_values = cells[valid], metric_values[valid]
+            if not metric_values.size:
+                continue
+            stats['count'][i] = np.bincount(metric_cells, minlength=size)
+            stats['total'][i] = np.bincount(metric_cells, weights=metric_values, minlength=size)
+            stats['total_sq'][i] = np.bincount(metric_cells, weights=np.square(metric_values), minlength=size)
+            extremes = pd.Series(metric_values).groupby(metric_cells).agg(['min', 'max'])
+            stats['min'][i, extremes.index] = extremes['min']
+            stats['max'][i, extremes.index] = extremes['max']
+        # 所有数值列的统计量堆叠为 (数值列, *维度) 数组，汇总时一次处理全部数值列
+        stats = {name: array.reshape((len(metrics),) + shape) for name, array in stats.items()}
+
+        # 草图桶计数只为非空单元格保存: {列: (offset, (非空单元格, 零桶 + 各桶) 计数)}
+        if sketch_columns is None:
+            sketch_columns = SketchColumns.from_frame(df)
+        occupied = np.flatnonzero(row_counts.ravel())
+        positions = np.searchsorted(occupied, cells)
+        sketches = {}
+        for col, codes in sketch_columns.codes.items():
+            size = sketch_columns.sizes[col]
+            valid = codes >= 0
+            counts = np.bincount(positions[valid] * size + codes[valid], minlength=len(occupied) * size)
+            sketches[col] = (sketch_columns.offsets[col], counts.astype(np.int32).reshape(len(occupied), size))
+
+        return cls(dimensions, values, row_counts, metrics, stats, range_columns, sketches, band_bounds)
+
+    def _selected_bands(self, col, filters):
+        """
+        范围过滤条件选中的区段 (长度4的布尔数组，缺失区段不选)；
+        某个非空区段只有一部分落在范围内时返回None（立方体无法回答）
+        """
+        selected = np.array([False, True, True, True])
+        low_key, high_key = RANGE_FILTERS[col]
+        if low_key not in filters or high_key not in filters:
+            return selected
+        low, high = filters[low_key], filters[high_key]
+        mins, maxs = self.band_bounds[col]
+        for band in range(1, 4):
+            if np.isnan(mins[band]):
+                selected[band] = False
+            elif low <= mins[band] and maxs[band] <= high:
+                selected[band] = True
+            elif maxs[band] < low or mins[band] > high:
+                selected[band] = False
+            else:
+                return None
+        return selected
+
+    def covers(self, filters):
+        """
+        立方体能否回答过滤条件: 没有关键词查询，且每个范围条件都完整包含或完全排除各个区段
+        （滑块处于默认位置或覆盖全部取值时成立）
+        """
+        if (filters.get(KEYWORD_FILTER) or '').strip():
+            return False
+        return all(self._selected_bands(col, filters) is not None for col in self.range_columns)
+
+    def cell_mask(self, filters=None):
+        """满足过滤条件的单元格；filters为None时选中全部单元格（不经过范围过滤）"""
+        mask = np.ones(self.row_counts.shape, dtype=bool)
+        if filters is None:
+            return mask
+
+        for axis, col in enumerate(self.dimensions):
+            key = next(key for key, column in CATEGORICAL_FILTERS.items() if column == col)
+            selected = filters.get(key)
+            # 与过滤索引一致: 空列表不过滤
+            if selected is None or not len(selected):
+                continue
+            selected = {None if pd.isna(value) else value for value in selected}
+            axis_shape = [1] * mask.ndim
+            axis_shape[axis] = -1
+            mask &= np.array([value in selected for value in self.values[col]]).reshape(axis_shape)
+
+        # 范围过滤器会去掉范围列为空的行，并只保留范围内的区段
+        for i, col in enumerate(self.range_columns):
+            axis_shape = [1] * mask.ndim
+            axis_shape[len(self.dimensions) + i] = -1
+            mask &= self._selected_bands(col, filters).reshape(axis_shape)
+        return mask
+
+    def _reduce(self, mask, axis=None, metrics=None):
+        """
+        汇总选中单元格的统计量，返回 {数值列: MetricStats}；
+        给定axis时保留该维度，返回 {数值列: [该维度每个取值的MetricStats]}
+        """
+        rows = slice(None) if metrics is None else [self.metrics.index(metric) for metric in metrics]
+        # 第0轴是数值列
+        reduce_axes = tuple(i + 1 for i in range(mask.ndim) if i != axis)
+        reduced = np.stack([
+            reducer(np.where(mask, self.stats[name][rows], fill), axis=reduce_axes)
+            for name, fill, reducer in [('count', 0.0, np.sum), ('total', 0.0, np.sum), ('total_sq', 0.0, np.sum),
+                                        ('min', np.inf, np.min), ('max', -np.inf, np.max)]
+        ])
+
+        result = {}
+        for i, metric in enumerate(metrics or self.metrics):
+            # 每行为一个取值的 (count, total, total_sq, min, max)
+            stats = [MetricStats(int(count), total, total_sq, minimum, maximum)
+                     for count, total, total_sq, minimum, maximum in reduced[:, i].reshape(5, -1).T.tolist()]
+            result[metric] = stats[0] if axis is None else stats
+        return result
+
+    def rollup(self, filters=None, grouped=CUBE_GROUPED_METRICS, grouped_sketches=GROUPED_SKETCHES):
+        """
+        将满足过滤条件的单元格汇总为DatasetAggregate（行数、数值统计、草图、分类计数、分组统计、分组草图）
+
+        filters为None时汇总全部数据；范围过滤器生效时无法回答，返回None。
+        """
+        if filters is not None and not self.covers(filters):
+            return None
+
+        mask = self.cell_mask(filters)
+        aggregate = DatasetAggregate()
+        aggregate.row_count = int(self.row_counts[mask].sum())
+        aggregate.metrics = self._reduce(mask)
+
+        selected = mask.ravel()[self.occupied]
+        for col, (offset, counts) in self.sketches.items():
+            bucket_counts = counts[selected].sum(axis=0, dtype=np.int64)
+            aggregate.sketches[col] = QuantileSketch(offset, bucket_counts[1:], int(bucket_counts[0]))
+
+        # 按分组列把选中单元格的桶计数相加，得到每个分组的草图
+        cell_codes = np.unravel_index(self.occupied[selected], self.row_counts.shape)
+        for group_col, col in grouped_sketches:
+            if group_col in self.dimensions and col in self.sketches:
+                offset, counts = self.sketches[col]
+                counts = counts[selected]
+                codes = cell_codes[self.dimensions.index(group_col)]
+                groups = {}
+                for code, value in enumerate(self.values[group_col]):
+                    in_group = codes == code
+                    if value is None or not in_group.any():
+                        continue
+                    bucket_counts = counts[in_group].sum(axis=0, dtype=np.int64)
+                    groups[value] = QuantileSketch(offset, bucket_counts[1:], int(bucket_counts[0]))
+                aggregate.grouped_sketches[(group_col, col)] = groups
+
+        row_counts = np.where(mask, self.row_counts, 0)
+        for axis, col in enumerate(self.dimensions):
+            counts = row_counts.sum(axis=tuple(i for i in range(mask.ndim) if i != axis)).tolist()
+            aggregate.tallies[col] = Counter({value: int(count) for value, count in zip(self.values[col], counts)
+                                              if value is not None and count > 0})
+
+        for group_col, metric in grouped:
+            if group_col in self.dimensions and metric in self.metrics:
+                axis = self.dimensions.index(group_col)
+                groups = self._reduce(mask, axis, [metric])[metric]
+                aggregate.grouped[(group_col, metric)] = {
+                    value: stats for value, stats in zip(self.values[group_col], groups)
+                    if value is not None and aggregate.tallies[group_col].get(value)
+                }
+
+        return aggregate
+
+
+@st.cache_resource(max_entries=4)
+def load_category_cube(data_key, _df, _sketch_columns=None, _band_ranges=None):
+    """
+    每个数据版本只构建一次立方体；data_key标识数据版本，_df、_sketch_columns和
+    _band_ranges（由同一数据版本的维度目录得到）不参与缓存键
+    """
+    return CategoryCube.from_frame(_df, _sketch_columns, _band_ranges)
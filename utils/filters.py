@@ -0,0 +1,403 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.sketch import QuantileSketch
+
+# 多选过滤器: setup_main_filters返回的键 -> 数据列
+CATEGORICAL_FILTERS = {
+    'verified_options': 'verified_status',
+    'ban_options': 'author_ban_status',
+    'claim_options': 'claim_status',
+    'category_options': 'content_category',
+}
+
+# 范围过滤器: 数据列 -> (下界键, 上界键)
+RANGE_FILTERS = {
+    'video_duration_sec_clean': ('min_duration', 'max_duration'),
+    'video_view_count_clean': ('min_views', 'max_views'),
+}
+
+# 转录文本关键词查询的键（由倒排索引回答）
+KEYWORD_FILTER = 'keyword_query'
+
+# 范围命中的行数少于 总行数/此值 时只处理命中的行号；否则直接扫描列生成布尔掩码
+SORT_PATH_RATIO = 16
+
+# 过滤结果（行号数组）缓存的内存上限，所有会话共享
+FILTER_CACHE_BYTES = 256 << 20
+
+# 维度目录中为数值列预先计算的分位数
+CATALOG_QUANTILES = [0.05, 0.25, 0.5, 0.75, 0.95]
+
+
+class BitmapIndex:
+    """
+    分类列的位图索引: 每列的每个取值对应一个打包位集（每行一位，np.packbits小端位序）
+
+    过滤时同一列内按位或、不同列之间按位与，只操作 行数/8 字节的数组，
+    不需要在原始列上逐行执行isin。缺失值对应的键为None。
+    """
+
+    def __init__(self, row_count):
+        self.row_count = row_count
+        self.byte_count = (row_count + 7) // 8
+        self.bitmaps = {}
+
+    @classmethod
+    def from_frame(cls, df, columns=CATEGORICAL_FILTERS.values()):
+        index = cls(len(df))
+        for col in columns:
+            if col not in df.columns:
+                continue
+            codes, uniques = pd.factorize(df[col])
+            bitmaps = {value: np.packbits(codes == code, bitorder='little') for code, value in enumerate(uniques)}
+            if (codes < 0).any():
+                bitmaps[None] = np.packbits(codes < 0, bitorder='little')
+            index.bitmaps[col] = bitmaps
+        return index
+
+    def match(self, col, values):
+        """取值属于values的行（同一列内按位或）"""
+        bits = np.zeros(self.byte_count, dtype=np.uint8)
+        for value in values:
+            bitmap = self.bitmaps[col].get(None if pd.isna(value) else value)
+            if bitmap is not None:
+                np.bitwise_or(bits, bitmap, out=bits)
+        return bits
+
+    def select(self, selections):
+        """
+        selections为 {列: 选中的取值列表}，返回满足全部条件的打包位集（不同列之间按位与）
+
+        与原过滤逻辑一致，空列表或索引中不存在的列不参与过滤。
+        """
+        bits = np.full(self.byte_count, 0xFF, dtype=np.uint8)
+        for col, values in selections.items():
+            if len(values) and col in self.bitmaps:
+                np.bitwise_and(bits, self.match(col, values), out=bits)
+        return bits
+
+    def to_mask(self, bits):
+        """将打包位集展开为布尔数组"""
+        return np.unpackbits(bits, count=self.row_count, bitorder='little').view(bool)
+
+    @staticmethod
+    def contains(bits, row_ids):
+        """只检查给定行号在位集中是否为1，耗时与行号数量成正比"""
+        return ((bits[row_ids >> 3] >> (row_ids & 7).astype(np.uint8)) & 1).astype(bool)
+
+    @staticmethod
+    def pack_ids(row_ids, row_count):
+        """将行号转为打包位集"""
+        mask = np.zeros(row_count, dtype=bool)
+        mask[row_ids] = True
+        return np.packbits(mask, bitorder='little')
+
+
+class SortedColumnIndex:
+    """
+    数值列的排序索引: 行号按列值升序排列（缺失值排在最后）
+
+    范围查询只需两次searchsorted，结果是order的一个切片（不复制）。
+    """
+
+    def __init__(self, series):
+        # 非空数值列零拷贝；可空类型转为带NaN的float64
+        self.values = series.to_numpy(dtype=float, na_value=np.nan) if series.hasnans else series.to_numpy()
+        order = np.argsort(self.values)
+        self.order = order.astype(np.min_scalar_type(max(len(order) - 1, 0)))
+        self.sorted_values = self.values[order].astype(float)
+
+    def range_ids(self, low, high):
+        """low <= 值 <= high 的行号（按值排序），缺失值不在任何范围内"""
+        start = np.searchsorted(self.sorted_values, low, side='left')
+        end = np.searchsorted(self.sorted_values, high, side='right')
+        return self.order[start:max(start, end)]
+
+    def in_range(self, row_ids, low, high):
+        """给定行号的值是否在范围内"""
+        values = self.values[row_ids]
+        return (values >= low) & (values <= high)
+
+    def range_mask(self, low, high):
+        """所有行的值是否在范围内（直接在原始dtype的列上比较，范围很宽时比散列写入行号更快）"""
+        return (self.values >= low) & (self.values <= high)
+
+
+def sorted_contains(sorted_ids, row_ids):
+    """给定行号是否在升序行号数组中（二分查找，不展开为全表掩码）"""
+    positions = np.minimum(np.searchsorted(sorted_ids, row_ids), max(len(sorted_ids) - 1, 0))
+    return sorted_ids[positions] == row_ids if len(sorted_ids) else np.zeros(len(row_ids), dtype=bool)
+
+
+class FilterIndex:
+    """过滤索引: 分类列的位图索引 + 范围过滤列的排序索引 + 转录文本的倒排索引（可选）"""
+
+    def __init__(self, bitmaps, ranges, keywords=None):
+        self.bitmaps = bitmaps
+        self.ranges = ranges
+        self.keywords = keywords
+
+    @classmethod
+    def from_frame(cls, df, keywords=None):
+        ranges = {col: SortedColumnIndex(df[col]) for col in RANGE_FILTERS if col in df.columns}
+        return cls(BitmapIndex.from_frame(df), ranges, keywords)
+
+    def match_keywords(self, filters):
+        """
+        关键词查询的匹配结果: ('ids', 升序行号) 或 ('bits', 打包位集)；
+        没有查询、查询中没有可用的词或没有倒排索引时返回None
+        """
+        query = filters.get(KEYWORD_FILTER)
+        if not query or self.keywords is None:
+            return None
+        return self.keywords.search(query)[0]
+
+    def candidate_count(self, filters):
+        """不用缓存时需要逐行检查的行数: 最窄范围条件或关键词命中的行数，都没有时为总行数"""
+        counts = [len(self.ranges[col].range_ids(filters[low_key], filters[high_key]))
+                  for col, (low_key, high_key) in RANGE_FILTERS.items() if col in self.ranges]
+        keywords = self.match_keywords(filters)
+        if keywords is not None and keywords[0] == 'ids':
+            counts.append(len(keywords[1]))
+        return min(counts, default=self.bitmaps.row_count)
+
+    def select_rows(self, filters, candidates=None):
+        """
+        返回满足过滤条件的行号（升序）
+
+        分类条件合并为一个位集；每个范围条件是排序索引上的一个切片，
+        取最小的切片作为候选行，再用位集和其余范围条件筛选候选行。
+        关键词查询命中较多行时结果为位集，与分类条件的位集按位与；
+        命中较少行时结果为升序行号，与范围切片一样可以作为候选行。
+        给定candidates（升序行号，通常是一个更宽条件的缓存结果）时只在这些行上检查条件。
+        """
+        selections = {col: filters[key] for key, col in CATEGORICAL_FILTERS.items() if key in filters}
+        bits = self.bitmaps.select(selections)
+
+        keyword_ids = None
+        keywords = self.match_keywords(filters)
+        if keywords is not None:
+            kind, matches = keywords
+            if kind == 'bits':
+                np.bitwise_and(bits, matches, out=bits)
+            else:
+                keyword_ids = matches
+
+        ranges = [(self.ranges[col], filters[low_key], filters[high_key])
+                  for col, (low_key, high_key) in RANGE_FILTERS.items() if col in self.ranges]
+        if candidates is not None:
+            keep = self.bitmaps.contains(bits, candidates)
+            for index, low, high in ranges:
+                keep &= index.in_range(candidates, low, high)
+            if keyword_ids is not None:
+                keep &= sorted_contains(keyword_ids, candidates)
+            return candidates[keep]
+
+        if keyword_ids is not None:
+            # 关键词命中的行号已经升序，只需检查其余条件
+            keep = self.bitmaps.contains(bits, keyword_ids)
+            for index, low, high in ranges:
+                keep &= index.in_range(keyword_ids, low, high)
+            return keyword_ids[keep]
+
+        if not ranges:
+            return np.flatnonzero(self.bitmaps.to_mask(bits))
+
+        slices = [index.range_ids(low, high) for index, low, high in ranges]
+        smallest = min(range(len(slices)), key=lambda i: len(slices[i]))
+        candidates = slices[smallest]
+        others = [bounds for i, bounds in enumerate(ranges) if i != smallest]
+
+        if len(candidates) * SORT_PATH_RATIO < self.bitmaps.row_count:
+            # 命中行较少: 只在候选行上检查其余条件，再恢复原始行顺序
+            keep = self.bitmaps.contains(bits, candidates)
+            for index, low, high in others:
+                keep &= index.in_range(candidates, low, high)
+            return np.sort(candidates[keep])
+
+        # 每个范围都命中大量行: 顺序扫描列比排序或随机写入大量行号更快
+        mask = self.bitmaps.to_mask(bits)
+        for index, low, high in ranges:
+            mask &= index.range_mask(low, high)
+        return np.flatnonzero(mask)
+
+
+@st.cache_resource(max_entries=4)
+def load_filter_index(data_key, _df, _keywords=None):
+    """每个数据版本只构建一次过滤索引；data_key标识数据版本，_df和_keywords（倒排索引）不参与缓存键"""
+    return FilterIndex.from_frame(_df, _keywords)
+
+
+def build_dimension_catalog(df):
+    """
+    可过滤列的维度目录: 分类列的取值（按首次出现顺序）及行数、缺失数；
+    数值列的最小值、最大值、分位数（由分位数草图估计，不排序）和缺失数。过滤控件只读取目录，不再扫描全表。
+    """
+    catalog = {'row_count': len(df), 'categorical': {}, 'numeric': {}}
+
+    for col in CATEGORICAL_FILTERS.values():
+        if col in df.columns:
+            values = df[col].dropna()
+            counts = values.value_counts()
+            catalog['categorical'][col] = {
+                'values': [(value, int(counts[value])) for value in values.unique().tolist() if counts[value] > 0],
+                'null_count': int(len(df) - len(values)),
+            }
+
+    for col in RANGE_FILTERS:
+        if col in df.columns:
+            values = df[col].to_numpy(dtype=float, na_value=np.nan)
+            values = values[~np.isnan(values)]
+            present = values.size > 0
+            quantiles = QuantileSketch.from_values(values).quantiles(CATALOG_QUANTILES)
+            catalog['numeric'][col] = {
+                'min': float(values.min()) if present else None,
+                'max': float(values.max()) if present else None,
+                'quantiles': dict(zip(CATALOG_QUANTILES, quantiles)) if present else {},
+                'null_count': int(len(df) - len(values)),
+            }
+
+    return catalog
+
+
+def default_ranges(catalog):
+    """
+    范围滑块的默认取值 {列: (下界, 上界)}: 时长最多60秒，播放量截到95%分位数；
+    立方体按这些边界划分范围区段，默认滑块位置也能由立方体回答
+    """
+    numeric = catalog['numeric']
+    ranges = {}
+    duration = numeric.get('video_duration_sec_clean')
+    if duration is not None and duration['min'] is not None:
+        ranges['video_duration_sec_clean'] = (0.0, min(duration['max'], 60.0))
+    views = numeric.get('video_view_count_clean')
+    if views is not None and views['min'] is not None:
+        ranges['video_view_count_clean'] = (0.0, min(views['max'], views['quantiles'][0.95]))
+    return ranges
+
+
+@st.cache_data(max_entries=4)
+def load_dimension_catalog(data_key, _df):
+    """每个数据版本只构建一次维度目录；data_key标识数据版本，_df不参与缓存键"""
+    return build_dimension_catalog(_df)
+
+
+def normalize_filters(filters):
+    """
+    将过滤条件转为规范形式: {键: frozenset(取值) 或 None（不过滤）}、{键: (下界, 上界)}
+    以及关键词查询（多余空白合并，空查询为None）
+
+    多选的顺序不影响结果，缺失值统一为None。
+    """
+    state = {}
+    for key in CATEGORICAL_FILTERS:
+        values = filters.get(key)
+        state[key] = frozenset(None if pd.isna(value) else value for value in values) if values is not None and len(values) else None
+    for low_key, high_key in RANGE_FILTERS.values():
+        if low_key in filters and high_key in filters:
+            state[low_key, high_key] = (float(filters[low_key]), float(filters[high_key]))
+    if KEYWORD_FILTER in filters:
+        state[KEYWORD_FILTER] = ' '.join(str(filters[KEYWORD_FILTER] or '').split()) or None
+    return state
+
+
+def filter_state_hash(state):
+    """规范过滤条件的稳定哈希"""
+    parts = []
+    for key in sorted(state, key=str):
+        value = state[key]
+        if isinstance(value, frozenset):
+            value = sorted(value, key=lambda item: (item is None, str(item)))
+        parts.append(f"{key}={value!r}")
+    return hashlib.blake2b(';'.join(parts).encode('utf-8'), digest_size=16).hexdigest()
+
+
+def is_narrower(state, wider):
+    """state的结果是否一定是wider结果的子集（None表示该项不过滤）"""
+    for key in set(state) | set(wider):
+        value, wider_value = state.get(key), wider.get(key)
+        if wider_value is None:
+            continue
+        if value is None:
+            return False
+        if isinstance(key, tuple):
+            if value[0] < wider_value[0] or value[1] > wider_value[1]:
+                return False
+        elif isinstance(value, frozenset):
+            if not value <= wider_value:
+                return False
+        elif value != wider_value:
+            # 关键词查询只有相同时才能确定包含关系
+            return False
+    return True
+
+
+class FilterResultCache:
+    """
+    过滤结果的LRU缓存: (数据版本, 过滤条件哈希) -> 升序行号数组
+
+    总内存超过max_bytes时淘汰最久未使用的结果。未命中时，如果已缓存某个更宽的条件，
+    就只在它的结果上计算新条件（细化），而不是扫描全表。
+    """
+
+    def __init__(self, max_bytes=FILTER_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _find_wider(self, data_key, state):
+        """已缓存结果中包含state的、行数最少的一个"""
+        best = None
+        for (key_data, _), (cached_state, row_ids) in self._entries.items():
+            if key_data == data_key and is_narrower(state, cached_state):
+                if best is None or len(row_ids) < len(best):
+                    best = row_ids
+        return best
+
+    def _store(self, key, state, row_ids):
+        if row_ids.nbytes > self.max_bytes:
+            return
+        self._entries[key] = (state, row_ids)
+        self.total_bytes += row_ids.nbytes
+        while self.total_bytes > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.total_bytes -= evicted.nbytes
+
+    def select_rows(self, data_key, filters, index):
+        """返回(行号数组, 来源)，来源为 'cache' / 'refined' / 'computed'；返回的数组只读"""
+        state = normalize_filters(filters)
+        key = (data_key, filter_state_hash(state))
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key][1], 'cache'
+            wider = self._find_wider(data_key, state)
+
+        # 只有缓存的宽结果比索引本身的候选行更少时才值得细化
+        if wider is not None and len(wider) < index.candidate_count(filters):
+            row_ids, source = index.select_rows(filters, candidates=wider), 'refined'
+        else:
+            row_ids, source = index.select_rows(filters), 'computed'
+        row_ids = row_ids.astype(np.min_scalar_type(max(index.bitmaps.row_count - 1, 0)), copy=False)
+        row_ids.flags.writeable = False
+
+        with self._lock:
+            if key not in self._entries:
+                self._store(key, state, row_ids)
+        return row_ids, source
+
+
+_filter_cache = FilterResultCache()
+
+
+def cached_select_rows(data_key, filters, index):
+    """通过进程内共享的结果缓存执行过滤，返回(行号数组, 来源)"""
+    return _filter_cache.select_rows(data_key, filters, index)
@@ -0,0 +1,211 @@
+import threading
+import time
+from collections import Counter
+
+import pandas as pd
+import streamlit as st
+
+from utils.io import DATA_PATH, get_file_fingerprint, compute_content_hash, read_dataset, read_csv_range
+from utils.prep import preprocess_frame, concat_processed
+from utils.memory import track_peak_rss, track_rss
+
+# 后台监视线程检查数据文件的间隔（秒），页面也按此间隔检查是否有新版本
+DATA_WATCH_INTERVAL = 5
+
+# 每个(数据文件, 是否紧凑模式)已加载的状态: 上次检查时文件的大小和修改时间、已处理的字节数（offset）、
+# 行数、前缀哈希、已预处理的数据和版本号。最后一行未写完时offset小于文件大小
+# 不同会话可以分别使用紧凑和完整模式，两种模式各自增量刷新，互不替换
+_state_lock = threading.Lock()
+_loaded = {}
+
+
+def _ends_with_newline(path, size):
+    if size == 0:
+        return True
+    with open(path, 'rb') as f:
+        f.seek(size - 1)
+        return f.read(1) == b'\n'
+
+
+def _add_counts(old_counts, new_counts):
+    # Counter的+会丢掉计数为0的项，这里保留所有键
+    total = Counter(old_counts or {})
+    total.update(new_counts or {})
+    return dict(total)
+
+
+def _merge_attrs(old_attrs, new_attrs):
+    """合并两段数据的schema报告和解析失败计数"""
+    merged = {}
+    old_failures = old_attrs.get('parse_failures')
+    new_failures = new_attrs.get('parse_failures')
+    if old_failures is not None or new_failures is not None:
+        merged['parse_failures'] = _add_counts(old_failures, new_failures)
+
+    old_report = old_attrs.get('schema_report')
+    new_report = new_attrs.get('schema_report')
+    if old_report is not None and new_report is not None:
+        merged['schema_report'] = {
+            'rows_read': old_report['rows_read'] + new_report['rows_read'],
+            'malformed_rows': old_report['malformed_rows'] + new_report['malformed_rows'],
+            'missing_columns': old_report['missing_columns'],
+            'violations': _add_counts(old_report['violations'], new_report['violations']),
+        }
+
+    # 各阶段内存只反映最近一次处理（追加时即新增部分）
+    if 'stage_memory' in new_attrs:
+        merged['stage_memory'] = new_attrs['stage_memory']
+
+    old_memory = old_attrs.get('memory_report')
+    new_memory = new_attrs.get('memory_report')
+    if old_memory is not None and new_memory is not None:
+        merged['memory_report'] = {
+            'before': _add_counts(old_memory['before'], new_memory['before']),
+            'after': _add_counts(old_memory['after'], new_memory['after']),
+        }
+    return merged
+
+
+def _full_load(path, fingerprint, compact):
+    """全量读取并预处理，记录文件的大小和修改时间、已处理的字节位置和前缀哈希"""
+    read_memory = {}
+    with track_peak_rss('read', read_memory):
+        raw = read_dataset(path)
+    df = preprocess_frame(raw, compact, track_peak=True)
+    df.attrs['stage_memory'] = {**read_memory, **df.attrs['stage_memory']}
+    return {
+        'size': fingerprint['size'],
+        'mtime_ns': fingerprint['mtime_ns'],
+        'offset': fingerprint['size'],
+        'row_count': len(df),
+        'prefix_hash': compute_content_hash(path, length=fingerprint['size']),
+        'ends_with_newline': _ends_with_newline(path, fingerprint['size']),
+        'data': df,
+        'last_refresh': ('full', len(df)),
+    }
+
+
+def is_append_only(path, state, fingerprint):
+    """文件只在上次加载的末尾之后追加了内容: 变大、原内容以换行结束、且原有字节的哈希不变"""
+    return (fingerprint['size'] >= state['offset']
+            and state['ends_with_newline']
+            and compute_content_hash(path, length=state['offset']) == state['prefix_hash'])
+
+
+def _append_tail(path, state, fingerprint, compact):
+    """只读取并预处理新追加的完整行，拼接到已处理的数据后面"""
+    with open(path, 'rb') as f:
+        f.seek(state['offset'])
+        tail_bytes = f.read(fingerprint['size'] - state['offset'])
+    # 写入方可能还没写完最后一行，只处理到最后一个换行符为止，剩余部分下次再读；
+    # 记录本次看到的大小和修改时间，文件不再变化时不必重新计算哈希
+    end = state['offset'] + tail_bytes.rfind(b'\n') + 1
+    new_state = dict(state, size=fingerprint['size'], mtime_ns=fingerprint['mtime_ns'])
+    if end <= state['offset']:
+        return new_state
+
+    read_memory = {}
+    # 追加在后台线程中随时发生，只记录RSS变化，不重置其他阶段正在测量的进程峰值
+    with track_rss('read', read_memory):
+        raw_tail = read_csv_range(path, state['offset'], end)
+    tail = preprocess_frame(raw_tail, compact)
+    tail.attrs['stage_memory'] = {**read_memory, **tail.attrs['stage_memory']}
+    tail.index = pd.RangeIndex(state['row_count'], state['row_count'] + len(tail))
+    attrs = _merge_attrs(state['data'].attrs, tail.attrs)
+    data = concat_processed([state['data'], tail])
+    data.attrs = attrs
+
+    new_state.update(
+        offset=end,
+        row_count=len(data),
+        prefix_hash=compute_content_hash(path, length=end),
+        ends_with_newline=True,
+        data=data,
+        last_refresh=('append', len(tail)),
+    )
+    return new_state
+
+
+def refresh_processed_data(path=DATA_PATH, compact=False):
+    """
+    使已处理的数据与文件保持一致并返回当前状态
+
+    文件未变化时直接返回；只在末尾追加了行时只预处理新增部分；
+    其他任何修改（截断、改写已有行）都全量重新加载。紧凑和完整模式分别保存和刷新。
+    """
+    fingerprint = get_file_fingerprint(path)
+    key = (path, compact)
+    with _state_lock:
+        state = _loaded.get(key)
+        if state is not None and (fingerprint['size'], fingerprint['mtime_ns']) == (state['size'], state['mtime_ns']):
+            return state
+
+        version = state['version'] if state else 0
+        if state is not None and is_append_only(path, state, fingerprint):
+            new_state = _append_tail(path, state, fingerprint, compact)
+            changed = new_state['data'] is not state['data']
+        else:
+            # 全量加载前先丢弃旧数据的引用，不同时持有新旧两份数据
+            _loaded.pop(key, None)
+            state = None
+            new_state = _full_load(path, fingerprint, compact)
+            changed = True
+
+        new_state['version'] = version + (1 if changed else 0)
+        _loaded[key] = new_state
+        return new_state
+
+
+def get_data_version(path=DATA_PATH, compact=False):
+    """返回该模式已加载数据的版本号（每次数据变化加1）；尚未加载时返回0"""
+    state = _loaded.get((path, compact))
+    return state['version'] if state else 0
+
+
+def load_processed_data(path=DATA_PATH, compact=False):
+    """加载已预处理的数据，文件追加新行后只处理新增部分；版本号记录在df.attrs['data_version']"""
+    try:
+        state = refresh_processed_data(path, compact)
+    except Exception as e:
+        st.error(f"Error loading data: {e}")
+        return pd.DataFrame()
+
+    df = state['data']
+    df.attrs['data_version'] = state['version']
+    df.attrs['last_refresh'] = state['last_refresh']
+    return df
+
+
+def _watch_data_file(path, interval):
+    """轮询数据文件，发现变化后在后台完成刷新，页面下次检查时即可直接使用"""
+    failed_fingerprints = {}
+    while True:
+        time.sleep(interval)
+        try:
+            fingerprint = get_file_fingerprint(path)
+        except OSError:
+            continue
+        # 刷新已加载的每种模式
+        for compact in (False, True):
+            state = _loaded.get((path, compact))
+            if state is None:
+                continue
+            if (fingerprint['size'], fingerprint['mtime_ns']) == (state['size'], state['mtime_ns']):
+                continue
+            # 同一个失败的文件版本不反复重试，等文件再次变化
+            if failed_fingerprints.get(compact) == fingerprint:
+                continue
+            try:
+                refresh_processed_data(path, compact)
+                failed_fingerprints.pop(compact, None)
+            except Exception:
+                failed_fingerprints[compact] = fingerprint
+
+
+@st.cache_resource
+def start_data_watcher(path=DATA_PATH, interval=DATA_WATCH_INTERVAL):
+    """启动数据文件监视线程（每个服务进程只启动一次）"""
+    thread = threading.Thread(target=_watch_data_file, args=(path, interval), daemon=True,
+                              name='data-file-watcher')
+    thread.start()
+    return thread
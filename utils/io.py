@@ -1,19 +1,306 @@
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.feather as feather
 import streamlit as st
 import os
+import csv
+import json
+import hashlib
+from io import BytesIO
 from datetime import datetime
 import base64
 
+DATA_PATH = 'tiktok_dataset.csv'
 
-@st.cache_data
-def load_data():
-    """加载数据"""
+# 列式缓存写在源文件旁边: tiktok_dataset.csv.cache.feather / tiktok_dataset.csv.cache.json
+CACHE_SUFFIX = '.cache.feather'
+CACHE_META_SUFFIX = '.cache.json'
+# 转录文本的词频矩阵和倒排索引与列式缓存保存在一起: tiktok_dataset.csv.cache.text.npz
+TEXT_INDEX_SUFFIX = '.cache.text.npz'
+# 缓存内容格式变化时递增，使旧缓存失效
+CACHE_FORMAT_VERSION = 2
+
+# 数据集列约定: 列名 -> Arrow类型，只读取这些列
+DATASET_SCHEMA = {
+    'video_id': pa.int64(),
+    'claim_status': pa.string(),
+    'verified_status': pa.string(),
+    'author_ban_status': pa.string(),
+    'video_duration_sec': pa.float64(),
+    'video_view_count': pa.float64(),
+    'video_like_count': pa.float64(),
+    'video_share_count': pa.float64(),
+    'video_download_count': pa.float64(),
+    'video_comment_count': pa.float64(),
+    'video_transcription_text': pa.string(),
+}
+
+# 流式模式每块读取的字节数（pandas回退路径按行数分块）
+STREAM_BLOCK_SIZE = 64 << 20
+STREAM_CHUNK_ROWS = 500_000
+# 源文件超过此大小时默认启用流式模式
+STREAMING_AUTO_BYTES = 2 << 30
+
+# 状态列的合法取值，超出范围的值计入schema报告（不会被删除）
+STATUS_DOMAINS = {
+    'claim_status': {'claim', 'opinion'},
+    'verified_status': {'verified', 'not verified'},
+    'author_ban_status': {'active', 'under review', 'banned'},
+}
+
+
+def get_file_fingerprint(path):
+    """获取文件指纹（大小和修改时间）"""
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def compute_content_hash(path, length=None, block_size=1 << 20):
+    """分块计算文件内容哈希，指定length时只计算前length字节"""
+    digest = hashlib.blake2b(digest_size=16)
+    remaining = length
+    with open(path, 'rb') as f:
+        while remaining is None or remaining > 0:
+            block = f.read(block_size if remaining is None else min(block_size, remaining))
+            if not block:
+                break
+            digest.update(block)
+            if remaining is not None:
+                remaining -= len(block)
+    return digest.hexdigest()
+
+
+def get_cache_paths(path):
+    """返回列式缓存文件和元数据文件路径"""
+    return path + CACHE_SUFFIX, path + CACHE_META_SUFFIX
+
+
+def _read_cache_meta(meta_path):
     try:
-        df = pd.read_csv('tiktok_dataset.csv')
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_cache_meta(meta_path, meta):
+    tmp_path = meta_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, meta_path)
+
+
+def read_columnar_cache(path):
+    """
+    指纹匹配时从列式缓存读取数据，否则返回None
+
+    大小不同直接失效；大小相同但修改时间变化时（如重新拷贝文件），
+    再用内容哈希确认文件是否真的改变，避免不必要的重新解析。
+    """
+    cache_path, meta_path = get_cache_paths(path)
+    meta = _read_cache_meta(meta_path)
+    if meta is None or meta.get('format') != CACHE_FORMAT_VERSION or not os.path.exists(cache_path):
+        return None
+
+    fingerprint = get_file_fingerprint(path)
+    if fingerprint['size'] != meta.get('size'):
+        return None
+    if fingerprint['mtime_ns'] != meta.get('mtime_ns'):
+        if compute_content_hash(path) != meta.get('content_hash'):
+            return None
+        meta.update(fingerprint)
+        _write_cache_meta(meta_path, meta)
+
+    # 未压缩的Arrow IPC文件可直接内存映射，数值列无需再次解析
+    table = feather.read_table(cache_path, memory_map=True)
+    df = table.to_pandas(split_blocks=True)
+    if meta.get('schema_report') is not None:
+        df.attrs['schema_report'] = meta['schema_report']
+    return df
+
+
+def current_cache_hash(path):
+    """列式缓存仍与源文件一致（大小和修改时间都匹配）时返回缓存记录的内容哈希，否则返回None"""
+    _, meta_path = get_cache_paths(path)
+    meta = _read_cache_meta(meta_path)
+    if meta is None or meta.get('format') != CACHE_FORMAT_VERSION:
+        return None
+    try:
+        fingerprint = get_file_fingerprint(path)
+    except OSError:
+        return None
+    if (fingerprint['size'], fingerprint['mtime_ns']) != (meta.get('size'), meta.get('mtime_ns')):
+        return None
+    return meta.get('content_hash')
+
+
+def write_columnar_cache(df, path):
+    """将解析结果写入列式缓存，并记录源文件指纹"""
+    cache_path, meta_path = get_cache_paths(path)
+    fingerprint = get_file_fingerprint(path)
+    meta = {
+        'format': CACHE_FORMAT_VERSION,
+        'size': fingerprint['size'],
+        'mtime_ns': fingerprint['mtime_ns'],
+        'content_hash': compute_content_hash(path),
+        'schema_report': df.attrs.get('schema_report'),
+    }
+
+    # 先写临时文件再替换，避免并发读取到写了一半的缓存
+    tmp_path = cache_path + '.tmp'
+    feather.write_feather(df, tmp_path, compression='uncompressed')
+    os.replace(tmp_path, cache_path)
+    _write_cache_meta(meta_path, meta)
+
+
+def read_csv_header(source):
+    """只读取CSV表头（source为文件路径或CSV字节内容）"""
+    if isinstance(source, bytes):
+        first_line = source.split(b'\n', 1)[0].decode('utf-8')
+        return next(csv.reader([first_line]), [])
+    with open(source, 'r', encoding='utf-8', newline='') as f:
+        return next(csv.reader(f), [])
+
+
+def _arrow_csv_options(column_types, on_invalid_row, block_size=None):
+    """构造pyarrow CSV读取参数"""
+    read_options = pa_csv.ReadOptions(use_threads=True)
+    if block_size:
+        read_options.block_size = block_size
+    parse_options = pa_csv.ParseOptions(invalid_row_handler=on_invalid_row)
+    convert_options = pa_csv.ConvertOptions(
+        column_types=column_types,
+        include_columns=list(column_types),
+        strings_can_be_null=True
+    )
+    return read_options, parse_options, convert_options
+
+
+def _schema_column_types(source, schema, string_numeric=False):
+    """返回文件中存在的schema列及其读取类型"""
+    header = read_csv_header(source)
+    column_types = {col: dtype for col, dtype in schema.items() if col in header}
+    if string_numeric:
+        column_types = {col: pa.string() for col in column_types}
+    return column_types
+
+
+def _read_arrow_csv(source, column_types):
+    """用多线程pyarrow引擎读取指定列，格式错误的行被跳过并计数"""
+    malformed_rows = []
+
+    def skip_invalid_row(row):
+        malformed_rows.append(row.number)
+        return 'skip'
+
+    if isinstance(source, bytes):
+        source = pa.BufferReader(source)
+    table = pa_csv.read_csv(source, *_arrow_csv_options(column_types, skip_invalid_row))
+    # self_destruct在转换过程中释放Arrow内存，降低峰值内存
+    df = table.to_pandas(split_blocks=True, self_destruct=True)
+    return df, len(malformed_rows)
+
+
+def _with_string_columns(column_types, columns):
+    """把给定列的读取类型改为字符串"""
+    return {col: pa.string() if col in columns else dtype for col, dtype in column_types.items()}
+
+
+def read_csv_with_schema(source, schema=DATASET_SCHEMA):
+    """
+    按schema读取CSV，返回DataFrame并在df.attrs['schema_report']中记录违反约定的情况
+
+    source为文件路径或CSV字节内容（含表头）。数值列中出现无法解析的值（如"1.2K"）时，
+    该列退回按字符串读取，由预处理阶段负责清洗，并统计违规数量。
+    """
+    column_types = _schema_column_types(source, schema)
+    if not column_types:
+        # 不是约定格式的数据集，按原方式读取
+        return pd.read_csv(BytesIO(source) if isinstance(source, bytes) else source)
+
+    try:
+        df, malformed_count = _read_arrow_csv(source, column_types)
+        fallback_columns, id_columns = [], []
+    except pa.ArrowInvalid:
+        # 只有数值指标列退回字符串，编号列保持int64
+        fallback_columns = [col for col, dtype in column_types.items() if pa.types.is_floating(dtype)]
+        id_columns = []
+        try:
+            df, malformed_count = _read_arrow_csv(source, _with_string_columns(column_types, fallback_columns))
+        except pa.ArrowInvalid:
+            # 编号列本身也有无法解析的值: 按字符串读取后转为可空整数，无法解析的编号为缺失
+            id_columns = [col for col, dtype in column_types.items() if pa.types.is_integer(dtype)]
+            df, malformed_count = _read_arrow_csv(
+                source, _with_string_columns(column_types, fallback_columns + id_columns))
+
+    violations = {}
+    for col in fallback_columns + id_columns:
+        values = df[col]
+        numeric = pd.to_numeric(values, errors='coerce')
+        if col in id_columns:
+            numeric = numeric.where(numeric == numeric.round())
+            df[col] = numeric.astype('Int64')
+        invalid = values.notna() & numeric.isna()
+        if invalid.any():
+            violations[col] = int(invalid.sum())
+
+    for col, allowed in STATUS_DOMAINS.items():
+        if col in df.columns:
+            invalid = df[col].notna() & ~df[col].isin(allowed)
+            if invalid.any():
+                violations[col] = int(invalid.sum())
+
+    df.attrs['schema_report'] = {
+        'rows_read': len(df),
+        'malformed_rows': malformed_count,
+        'missing_columns': [col for col in schema if col not in column_types],
+        'violations': violations,
+    }
+    return df
+
+
+def read_csv_range(path, start, end, schema=DATASET_SCHEMA):
+    """按schema读取CSV中[start, end)字节范围内的行（start须位于行首），自动带上文件表头"""
+    with open(path, 'rb') as f:
+        header = f.readline()
+        f.seek(start)
+        body = f.read(end - start)
+    return read_csv_with_schema(header + body, schema)
+
+
+def iter_csv_chunks(path=DATA_PATH, schema=DATASET_SCHEMA, block_size=STREAM_BLOCK_SIZE, string_numeric=False):
+    """
+    按块流式读取CSV，逐块产出DataFrame，内存占用与块大小而不是文件大小相关
+
+    参数:
+        block_size: 每块读取的字节数
+        string_numeric: 数值列按字符串读取（数据中含有"1.2K"等格式时使用）
+    """
+    column_types = _schema_column_types(path, schema, string_numeric)
+    if not column_types:
+        for chunk in pd.read_csv(path, chunksize=STREAM_CHUNK_ROWS):
+            yield chunk
+        return
+
+    reader = pa_csv.open_csv(path, *_arrow_csv_options(column_types, lambda row: 'skip', block_size))
+    for batch in reader:
+        if batch.num_rows:
+            yield batch.to_pandas()
+
+
+def read_dataset(path=DATA_PATH):
+    """读取数据集: 优先使用列式缓存，否则解析CSV并写入缓存"""
+    df = read_columnar_cache(path)
+    if df is not None:
         return df
+
+    df = read_csv_with_schema(path)
+    try:
+        write_columnar_cache(df, path)
     except Exception as e:
-        st.error(f"Error loading data: {e}")
-        return pd.DataFrame()
+        st.warning(f"Could not write data cache: {e}")
+    return df
 
 
 def get_license_text():
@@ -0,0 +1,68 @@
+from contextlib import contextmanager
+
+# Linux下通过/proc读取当前常驻内存(VmRSS)和峰值(VmHWM)，向clear_refs写入5可以重置峰值
+_STATUS_PATH = '/proc/self/status'
+_CLEAR_REFS_PATH = '/proc/self/clear_refs'
+
+
+def read_rss():
+    """返回(当前RSS, 峰值RSS)字节数，不支持的平台返回None"""
+    try:
+        with open(_STATUS_PATH, 'r') as f:
+            fields = dict(line.split(':', 1) for line in f if line.startswith(('VmRSS', 'VmHWM')))
+    except OSError:
+        return None
+    if 'VmRSS' not in fields or 'VmHWM' not in fields:
+        return None
+    # 数值单位为kB
+    return int(fields['VmRSS'].split()[0]) * 1024, int(fields['VmHWM'].split()[0]) * 1024
+
+
+def _reset_peak_rss():
+    try:
+        with open(_CLEAR_REFS_PATH, 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+@contextmanager
+def track_peak_rss(stage, report):
+    """
+    记录一个处理阶段的内存: report[stage] = {'start', 'peak', 'end'}（字节）
+
+    重置峰值会影响整个进程，只用于一次性的全量加载和预处理；
+    每次请求都会运行的阶段（过滤、后台追加）使用track_rss。
+    峰值是整个进程的峰值，多个会话同时计算时只能作为近似值；
+    无法读取或重置峰值的平台上不记录。
+    """
+    if not _reset_peak_rss() or read_rss() is None:
+        yield
+        return
+
+    start = read_rss()[0]
+    try:
+        yield
+    finally:
+        end, peak = read_rss()
+        report[stage] = {'start': start, 'peak': peak, 'end': end}
+
+
+@contextmanager
+def track_rss(stage, report):
+    """
+    记录一个处理阶段开始和结束时的RSS: report[stage] = {'start', 'end'}（字节）
+
+    不重置进程峰值，不影响其他会话或阶段的测量；无法读取RSS的平台上不记录。
+    """
+    usage = read_rss()
+    if usage is None:
+        yield
+        return
+
+    start = usage[0]
+    try:
+        yield
+    finally:
+        report[stage] = {'start': start, 'end': read_rss()[0]}
@@ -1,10 +1,47 @@
 import pandas as pd
 import numpy as np
+import os
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+import pyarrow as pa
+import pyarrow.compute as pc
 from textblob import TextBlob
 import streamlit as st  # 添加这行导入
 
+from utils.memory import track_peak_rss, track_rss
+
+NUMERIC_COLUMNS = ['video_view_count', 'video_like_count', 'video_share_count',
+                   'video_download_count', 'video_comment_count', 'video_duration_sec']
+
+# 抓取导出数据中的数量后缀，如 1.2K / 3.4M / 1B
+SUFFIX_MULTIPLIERS = {'K': 1e3, 'M': 1e6, 'B': 1e9}
+# 与float()一致，也接受inf / infinity / nan
+_NUMBER_PATTERN = r'(?i)^[-+]?((\d+\.?\d*|\.\d+)(e[-+]?\d+)?\s*[kmb]?|inf|infinity|nan)$'
+# 带千位分隔符的数: 逗号只能出现在每三位数字之间（"1,234,567"），"1,2,3"之类按解析失败处理
+_GROUPED_PATTERN = r'(?i)^[-+]?\d{1,3}(,\d{3})+(\.\d*)?\s*[kmb]?$'
+_SUFFIXES = pa.array(list(SUFFIX_MULTIPLIERS) + [suffix.lower() for suffix in SUFFIX_MULTIPLIERS])
+_SUFFIX_VALUES = np.tile(list(SUFFIX_MULTIPLIERS.values()), 2)
+
+
+# 内容分类体系配置，格式为 {类别: [关键词, ...]}
+CATEGORY_CONFIG_PATH = 'config/categories.json'
+DEFAULT_CATEGORY = 'Other'
+# 分类时每批处理的行数，限制切词产生的中间数组大小
+CATEGORY_BATCH_ROWS = 1 << 20
+CATEGORY_WORKERS = min(4, os.cpu_count() or 1)
+
+# 紧凑内存模式: 状态/分类列转为category，计数列转为uint32，比率和时长转为float32，
+# 转录文本转为Arrow字符串（省去每个Python字符串对象的开销）
+TEXT_COLUMNS = ['video_transcription_text']
+CATEGORICAL_COLUMNS = ['verified_status', 'author_ban_status', 'claim_status', 'content_category']
+COUNT_COLUMNS = ['video_view_count_clean', 'video_like_count_clean', 'video_share_count_clean',
+                 'video_download_count_clean', 'video_comment_count_clean']
+FLOAT32_COLUMNS = ['video_duration_sec_clean', 'like_rate', 'share_rate', 'comment_rate']
+
+
 def clean_numeric_data(value):
-    """清洗数值数据"""
+    """清洗单个数值（逐值实现，仅保留用于基准对比）"""
     if pd.isna(value):
         return np.nan
     try:
@@ -12,22 +49,182 @@ def clean_numeric_data(value):
     except:
         return np.nan
 
+
+def clean_numeric_series(series):
+    """
+    向量化清洗数值列，返回(float64序列, 无法解析的值数量)
+
+    数值类型的列直接转换；其余列用Arrow字符串内核批量处理（避免pd.to_numeric在
+    无法解析的值上逐个抛异常）: 去除空白和千位分隔符，并识别K/M/B后缀。
+    布尔值、数字和inf/nan字符串与原逐值实现的float(value)一致。
+    """
+    if pd.api.types.is_bool_dtype(series):
+        return pd.Series(series.to_numpy(dtype=float, na_value=np.nan), index=series.index), 0
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype('float64'), 0
+
+    try:
+        text = pa.array(series, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return _clean_mixed_series(series)
+
+    if (pa.types.is_integer(text.type) or pa.types.is_floating(text.type) or pa.types.is_boolean(text.type)
+            or pa.types.is_null(text.type)):
+        # 全部是数字（或布尔值）的object列
+        return pd.Series(text.cast(pa.float64()).to_numpy(zero_copy_only=False), index=series.index), 0
+    if pa.types.is_large_string(text.type):
+        text = text.cast(pa.string())
+    numbers, failed = _parse_numeric_text(text)
+    return pd.Series(numbers, index=series.index), failed
+
+
+def _clean_mixed_series(series):
+    """字符串和其他值混合的object列: 只有字符串走Arrow解析，布尔值和数字等直接用float()转换"""
+    is_text = series.map(lambda value: isinstance(value, str)).to_numpy(dtype=bool)
+    numbers = np.full(len(series), np.nan)
+    failed = 0
+    if is_text.any():
+        numbers[is_text], failed = _parse_numeric_text(pa.array(series[is_text], type=pa.string()))
+
+    others = np.flatnonzero(~is_text & series.notna().to_numpy())
+    if others.size:
+        converted = series.iloc[others].map(clean_numeric_data).to_numpy(dtype=float)
+        numbers[others] = converted
+        failed += int(np.isnan(converted).sum())
+    return pd.Series(numbers, index=series.index), failed
+
+
+def _parse_numeric_text(text):
+    """解析Arrow字符串数组，返回(float64数组, 无法解析的值数量)"""
+    # 只去掉合法的千位分隔符，其他含逗号的值保留逗号，之后计为解析失败
+    text = pc.ascii_trim_whitespace(text)
+    text = pc.if_else(pc.match_substring_regex(text, _GROUPED_PATTERN), pc.replace_substring(text, ',', ''), text)
+    valid = pc.match_substring_regex(text, _NUMBER_PATTERN)
+
+    suffix_index = pc.index_in(pc.utf8_slice_codeunits(text, -1), value_set=_SUFFIXES)
+    has_suffix = pc.is_valid(suffix_index)
+    digits = pc.if_else(has_suffix, pc.ascii_rtrim_whitespace(pc.utf8_slice_codeunits(text, 0, -1)), text)
+    digits = pc.if_else(valid, digits, pa.scalar(None, pa.string()))
+
+    base = pc.cast(digits, pa.float64()).to_numpy(zero_copy_only=False)
+    multiplier = np.where(has_suffix.to_numpy(zero_copy_only=False),
+                          _SUFFIX_VALUES[pc.fill_null(suffix_index, 0).to_numpy()], 1.0)
+    numbers = base * multiplier
+
+    # 空字符串视为缺失，不计入解析失败
+    failed = pc.and_(pc.invert(valid), pc.not_equal(text, ''))
+    return numbers, int(pc.sum(failed).as_py() or 0)
+
+
+@st.cache_data
+def load_category_taxonomy(path=CATEGORY_CONFIG_PATH):
+    """从配置文件加载内容分类体系，按文件中的顺序决定主分类的优先级"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _to_string_array(texts):
+    """文本转为Arrow字符串数组；与原逐条实现的str(text)一致，非字符串值按str()处理，缺失值保持为空"""
+    if not pd.api.types.is_string_dtype(texts.dtype) or texts.dtype == object:
+        values = pd.Series(texts, dtype=object)
+        texts = values.where(values.isna() | values.map(lambda text: isinstance(text, str)), values.astype(str))
+    array = pa.array(texts, type=pa.string(), from_pandas=True)
+    if isinstance(array, pa.ChunkedArray):
+        array = array.combine_chunks()
+    return array
+
+
+def _score_batch(texts, taxonomy):
+    """
+    对一批文本一次性计算各类别得分，返回[(行号数组, 得分数组)]，每个类别一项
+
+    文本只做一次小写和按空白切词；不含空格的关键词必然落在某个词内部，
+    因此只需在去重后的词表上做子串匹配，再按词映射回行。含空格的短语单独计数。
+    """
+    lowered = pc.utf8_lower(texts)
+    # 关键词不含空白，按ASCII空白切分不会影响子串匹配结果
+    tokens = pc.ascii_split_whitespace(lowered)
+    encoded = tokens.flatten().dictionary_encode()
+    vocabulary = encoded.dictionary
+
+    # 词表上每个词的类别位掩码（每64个类别一列），再一次性映射到所有词，只保留命中的词
+    mask_words = max((len(taxonomy) + 63) // 64, 1)
+    mask_dtype = np.min_scalar_type((1 << min(len(taxonomy), 64)) - 1)
+    vocab_mask = np.zeros((len(vocabulary), mask_words), dtype=mask_dtype)
+    for category_id, keywords in enumerate(taxonomy.values()):
+        words = [re.escape(keyword) for keyword in keywords if ' ' not in keyword]
+        if words and len(vocabulary):
+            vocab_hit = pc.match_substring_regex(vocabulary, '|'.join(words)).to_numpy(zero_copy_only=False)
+            vocab_mask[vocab_hit, category_id // 64] |= mask_dtype.type(1 << (category_id % 64))
+
+    token_mask = vocab_mask[encoded.indices.to_numpy()]
+    hit_tokens = np.flatnonzero(token_mask.any(axis=1))
+    hit_rows = pc.list_parent_indices(tokens).to_numpy()[hit_tokens]
+    hit_mask = token_mask[hit_tokens]
+
+    results = []
+    for category_id, keywords in enumerate(taxonomy.values()):
+        in_category = (hit_mask[:, category_id // 64] & mask_dtype.type(1 << (category_id % 64))) != 0
+        scores = np.bincount(hit_rows[in_category], minlength=len(texts))
+        for phrase in (keyword for keyword in keywords if ' ' in keyword):
+            scores = scores + pc.fill_null(pc.count_substring(lowered, phrase), 0).to_numpy()
+
+        rows = np.flatnonzero(scores)
+        results.append((rows, scores[rows]))
+    return results
+
+
+def score_categories(texts, taxonomy=None, batch_rows=CATEGORY_BATCH_ROWS):
+    """
+    计算每条文本的类别得分（命中关键词的词数），返回(主分类序列, 稀疏得分表)
+
+    稀疏得分表为长格式DataFrame: row(原索引) / category / score，只包含得分大于0的项，
+    可直接用于多标签分析。主分类与原实现一致: 按分类体系顺序取第一个命中的类别。
+    """
+    if taxonomy is None:
+        taxonomy = load_category_taxonomy()
+    labels = list(taxonomy) + [DEFAULT_CATEGORY]
+    array = _to_string_array(texts)
+
+    primary = np.full(len(array), len(taxonomy), dtype=np.int64)
+    score_parts = []
+    starts = range(0, len(array), batch_rows)
+    # Arrow和NumPy内核会释放GIL，多个批次可以在线程池中并行
+    with ThreadPoolExecutor(max_workers=CATEGORY_WORKERS) as executor:
+        all_results = executor.map(lambda start: _score_batch(array.slice(start, batch_rows), taxonomy), starts)
+        for start, batch_results in zip(starts, all_results):
+            # 倒序赋值，使顺序靠前的类别覆盖靠后的类别
+            for category_id in reversed(range(len(taxonomy))):
+                rows, counts = batch_results[category_id]
+                primary[rows + start] = category_id
+                score_parts.append((rows + start, np.full(len(rows), category_id), counts))
+
+    if score_parts:
+        rows, category_ids, counts = (np.concatenate(part) for part in zip(*score_parts))
+        order = np.lexsort((category_ids, rows))
+        rows, category_ids, counts = rows[order], category_ids[order], counts[order]
+    else:
+        rows = category_ids = counts = np.array([], dtype=np.int64)
+
+    scores = pd.DataFrame({
+        'row': texts.index[rows],
+        'category': pd.Categorical.from_codes(category_ids, categories=labels),
+        'score': counts.astype(np.int32),
+    })
+
+    primary_labels = pd.Series(np.array(labels, dtype=object)[primary], index=texts.index)
+    return primary_labels, scores
+
+
+def categorize_texts(texts, taxonomy=None):
+    """批量内容分类，返回每条文本的主分类"""
+    return score_categories(texts, taxonomy)[0]
+
+
 def categorize_text(text):
-    """内容分类函数"""
-    text = str(text).lower()
-    categories = {
-        'Technology': ['drone', 'mobile', 'internet', 'data', 'computer', 'phone', 'web', 'tech', 'software'],
-        'Animals': ['dog', 'cat', 'animal', 'elephant', 'panda', 'snail', 'whale', 'bird', 'pet'],
-        'History': ['history', 'ancient', 'century', 'year ago', 'discovered', 'historical'],
-        'Sports': ['sport', 'basketball', 'olympics', 'game', 'player', 'match', 'football'],
-        'Science': ['science', 'research', 'discover', 'study', 'scientist', 'experiment'],
-        'Geography': ['earth', 'world', 'country', 'city', 'island', 'mountain', 'travel']
-    }
+    """内容分类函数（单条文本）"""
+    return categorize_texts(pd.Series([text], dtype=object)).iloc[0]
 
-    for category, keywords in categories.items():
-        if any(keyword in text for keyword in keywords):
-            return category
-    return 'Other'
 
 def analyze_sentiment(text):
     """情感分析"""
@@ -36,32 +233,102 @@ def analyze_sentiment(text):
     analysis = TextBlob(str(text))
     return analysis.sentiment.polarity
 
-@st.cache_data
-def preprocess_data(df):
-    """数据预处理"""
-    df_processed = df.copy()
+def _downcast_counts(series):
+    """计数列转为uint32；含缺失值时用可空的UInt32，含小数、负数或超出范围时保持不变"""
+    values = series.to_numpy(dtype=float, na_value=np.nan)
+    present = values[~np.isnan(values)]
+    if present.size and (present.min() < 0 or present.max() > np.iinfo(np.uint32).max
+                         or not np.array_equal(present, np.floor(present))):
+        return series
+    return series.astype('UInt32' if present.size < len(values) else np.uint32)
+
+
+def compact_frame(df):
+    """
+    原地压缩预处理结果的内存占用，并在df.attrs['memory_report']中记录每列压缩前后的字节数
+
+    已清洗的原始数值列会被删除（保留对应的_clean列）。
+    """
+    before = df.memory_usage(deep=True, index=False)
+
+    df.drop(columns=[col for col in NUMERIC_COLUMNS if f'{col}_clean' in df.columns], inplace=True)
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns:
+            # 类别统一为字符串，混合类型的类别无法转换为Arrow表格显示
+            values = df[col]
+            df[col] = values.where(values.isna(), values.astype(str)).astype('category')
+    for col in COUNT_COLUMNS:
+        if col in df.columns:
+            df[col] = _downcast_counts(df[col])
+    for col in FLOAT32_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype(np.float32)
+    for col in TEXT_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('string[pyarrow]')
+
+    after = df.memory_usage(deep=True, index=False)
+    df.attrs['memory_report'] = {
+        'before': {col: int(size) for col, size in before.items()},
+        'after': {col: int(after.get(col, 0)) for col in before.index},
+    }
+    return df
 
-    # 清洗数值列
-    numeric_columns = ['video_view_count', 'video_like_count', 'video_share_count',
-                       'video_download_count', 'video_comment_count', 'video_duration_sec']
 
-    for col in numeric_columns:
-        if col in df_processed.columns:
-            df_processed[f'{col}_clean'] = df_processed[col].apply(clean_numeric_data)
+def concat_processed(frames):
+    """拼接多段预处理结果，category列先合并类别，保证拼接后仍为category类型"""
+    for col in CATEGORICAL_COLUMNS:
+        if all(col in frame.columns and isinstance(frame[col].dtype, pd.CategoricalDtype) for frame in frames):
+            categories = frames[0][col].cat.categories
+            for frame in frames[1:]:
+                categories = categories.append(frame[col].cat.categories.difference(categories))
+            frames = [frame.assign(**{col: frame[col].cat.set_categories(categories)}) for frame in frames]
+    return pd.concat(frames)
+
+
+def compute_rate(numerator, denominator):
+    """计算互动率，分母为0或缺失时为NaN（只在新数组上原地处理inf，不复制整个表）"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rate = numerator.to_numpy(dtype=float, na_value=np.nan) / denominator.to_numpy(dtype=float, na_value=np.nan)
+    rate[~np.isfinite(rate)] = np.nan
+    return rate
+
+
+def preprocess_frame(df, compact=False, track_peak=False):
+    """
+    清洗、分类并计算互动率（不带缓存，流式模式下逐块调用）；compact为True时压缩内存占用
+
+    只对输入做浅拷贝并新增列，不修改输入本身；缺失值保留为NaN而不是填0。
+    每个阶段的进程内存记录在df.attrs['stage_memory']中；track_peak为True时（只用于全量加载）
+    同时记录进程峰值，否则只记录开始和结束时的RSS，不重置进程峰值。
+    """
+    df_processed = df.copy(deep=False)
+    stage_memory = {}
+    track_memory = track_peak_rss if track_peak else track_rss
+
+    # 清洗数值列，并记录每列无法解析的值数量
+    parse_failures = {}
+    with track_memory('clean', stage_memory):
+        for col in NUMERIC_COLUMNS:
+            if col in df_processed.columns:
+                df_processed[f'{col}_clean'], parse_failures[col] = clean_numeric_series(df_processed[col])
 
     # 内容分类
     if 'video_transcription_text' in df_processed.columns:
-        df_processed['content_category'] = df_processed['video_transcription_text'].apply(categorize_text)
+        with track_memory('categorize', stage_memory):
+            df_processed['content_category'] = categorize_texts(df_processed['video_transcription_text'])
 
     # 计算互动率
     if 'video_view_count_clean' in df_processed.columns:
-        view_col = 'video_view_count_clean'
-        df_processed['like_rate'] = df_processed['video_like_count_clean'] / df_processed[view_col]
-        df_processed['share_rate'] = df_processed['video_share_count_clean'] / df_processed[view_col]
-        df_processed['comment_rate'] = df_processed['video_comment_count_clean'] / df_processed[view_col]
-
-        # 处理无穷大和NaN值
-        df_processed = df_processed.replace([np.inf, -np.inf], np.nan)
-        df_processed = df_processed.fillna(0)
+        with track_memory('rates', stage_memory):
+            views = df_processed['video_view_count_clean']
+            for name in ['like', 'share', 'comment']:
+                if f'video_{name}_count_clean' in df_processed.columns:
+                    df_processed[f'{name}_rate'] = compute_rate(df_processed[f'video_{name}_count_clean'], views)
 
-    return df_processed
\ No newline at end of file
+    df_processed.attrs['parse_failures'] = parse_failures
+    if compact:
+        with track_memory('compact', stage_memory):
+            compact_frame(df_processed)
+    df_processed.attrs['stage_memory'] = stage_memory
+    return df_processed
@@ -0,0 +1,354 @@
+import os
+import re
+import sqlite3
+import threading
+import warnings
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from utils.prep import analyze_sentiment
+
+# 情感得分持久化存储，按 (video_id, 文本哈希) 记录，每条文本只计算一次
+SENTIMENT_STORE_PATH = 'data/sentiment_scores.sqlite'
+# 每个进程任务处理的文本条数
+SENTIMENT_BATCH_SIZE = 2000
+# 待计算条数少于此值时直接在当前进程计算，避免进程池启动开销
+SENTIMENT_POOL_MIN_ROWS = 5000
+SENTIMENT_WORKERS = os.cpu_count() or 1
+
+# 情感标签阈值: >0.1 为正面，<-0.1 为负面，其余为中性
+POSITIVE_THRESHOLD = 0.1
+NEGATIVE_THRESHOLD = -0.1
+
+_store_lock = threading.Lock()
+_store_cache = {}
+
+
+def score_texts_textblob(texts):
+    """用TextBlob计算一批文本的情感极性（进程池任务，需为模块级函数）"""
+    return [analyze_sentiment(text) for text in texts]
+
+
+@lru_cache(maxsize=1)
+def compile_polarity_lexicon():
+    """
+    将TextBlob自带的pattern情感词典和分词规则预编译: 词、极性、强度、是否为修饰词，
+    以及否定词、表情符号、标点和缩写
+
+    只在首次使用时编译一次，之后的打分只做数组查找。
+    """
+    from textblob.en import sentiment as pattern_lexicon
+    from textblob._text import ABBREVIATIONS, EMOTICONS, PUNCTUATION, RE_ABBR1, RE_ABBR2, RE_ABBR3, replacements
+
+    words, polarity, intensity, is_modifier = [], [], [], []
+    for word, assessments in pattern_lexicon.items():
+        if None not in assessments:
+            continue
+        words.append(word)
+        polarity.append(assessments[None][0])
+        intensity.append(assessments[None][2])
+        is_modifier.append(any(pos in pattern_lexicon.modifiers for pos in assessments if pos))
+
+    # 表情符号按原样匹配空白分隔的词（整体保留，不拆分标点），小写后查极性；
+    # 与pattern相同，字母组成、超过5个字符或属于标点的不作为表情符号
+    emoticons = {emoticon: score for (_, score), group in EMOTICONS.items() for emoticon in group}
+    emoticon_polarity = {emoticon.lower(): score for emoticon, score in emoticons.items()
+                         if not emoticon.lower().isalpha() and len(emoticon) <= 5 and emoticon not in PUNCTUATION}
+    punctuation = ''.join('\\' + char for char in dict.fromkeys(PUNCTUATION.replace('.', '')))
+
+    return {
+        'words': pa.array(words, type=pa.string()),
+        'polarity': np.array(polarity, dtype=float),
+        'intensity': np.array(intensity, dtype=float),
+        'is_modifier': np.array(is_modifier, dtype=bool),
+        'negations': pa.array(list(pattern_lexicon.negations), type=pa.string()),
+        'emoticon_tokens': pa.array(list(emoticons) + ['(!)'], type=pa.string()),
+        'emoticons': pa.array(list(emoticon_polarity), type=pa.string()),
+        'emoticon_polarity': np.array(list(emoticon_polarity.values()), dtype=float),
+        'contractions': '(' + '|'.join(re.escape(key) for key in replacements) + ')',
+        'abbreviations': pa.array(sorted(ABBREVIATIONS), type=pa.string()),
+        'abbreviation_patterns': [RE_ABBR1.pattern, RE_ABBR2.pattern, RE_ABBR3.pattern],
+        # 空白分隔的词 = 开头的标点 + 正文 + 末尾的标点和句点（与find_tokens的拆分顺序一致）
+        'split_pattern': f'^(?P<lead>[{punctuation}]*)(?P<core>.*?)(?P<trail>[{punctuation}.]*)$',
+        'edge_pattern': f'^[{punctuation}]|[{punctuation}.]$',
+    }
+
+
+def _split_whitespace(array, rows):
+    """按空白切分，返回(展平后的词, 每个词所在的行, 每个词来自的输入位置)"""
+    pieces = pc.utf8_split_whitespace(array)
+    parents = pc.list_parent_indices(pieces).to_numpy()
+    return pieces.flatten(), rows[parents], parents
+
+
+def tokenize_like_pattern(array):
+    """
+    与pattern的find_tokens相同的分词（向量化），返回(小写的词, 行号):
+    缩写词尾（n't、's等）和引号单独成词，词首词尾的标点逐个拆开，连续三个以上的句点为一个"..."，
+    缩写（e.g.、Mr.等）保留句点；单独出现的表情符号和"(!)"整体保留。
+    不处理与其他字符相连或中间有空格的表情符号，以及跨多个句点的缩写。
+    """
+    lexicon = compile_polarity_lexicon()
+    flat, rows, _ = _split_whitespace(array, np.arange(len(array)))
+    emoticon = pc.is_in(flat, value_set=lexicon['emoticon_tokens'])
+
+    spaced = pc.replace_substring_regex(flat, lexicon['contractions'], r' \1')
+    spaced = pc.replace_substring_regex(spaced, '(["\'“”‘’])', r' \1 ')
+    flat, rows, parents = _split_whitespace(pc.if_else(emoticon, flat, spaced), rows)
+    emoticon = emoticon.take(pa.array(parents))
+
+    # 只有首尾带标点的词需要拆分
+    punctuated = pc.and_not(pc.match_substring_regex(flat, lexicon['edge_pattern']), emoticon)
+    parts = pc.extract_regex(flat.filter(punctuated), lexicon['split_pattern'])
+    lead, core, trail = (parts.field(name) for name in ('lead', 'core', 'trail'))
+    # 缩写（包括正文加一个句点）保留句点，不拆成单独的词
+    dotted = pc.binary_join_element_wise(core, '.', '')
+    abbreviation = pc.is_in(dotted, value_set=lexicon['abbreviations'])
+    for pattern in lexicon['abbreviation_patterns']:
+        abbreviation = pc.or_(abbreviation, pc.match_substring_regex(dotted, pattern))
+    abbreviation = pc.and_(abbreviation, pc.match_substring_regex(trail, r'^\.{1,2}([^.]|$)'))
+    core = pc.if_else(abbreviation, dotted, core)
+    trail = pc.if_else(abbreviation, pc.utf8_slice_codeunits(trail, 1), trail)
+
+    lead = pc.replace_substring_regex(lead, '(.)', r'\1 ')
+    trail = pc.replace_substring_regex(trail, r'\.{3,}', '…')
+    trail = pc.replace_substring(pc.replace_substring_regex(trail, '(.)', r' \1'), '…', '...')
+    split = pc.binary_join_element_wise(lead, core, trail, '')
+    flat, rows, _ = _split_whitespace(pc.replace_with_mask(flat, punctuated, split), rows)
+    return pc.utf8_lower(flat), rows
+
+
+def _assess(features, start, stop):
+    """
+    一行文本（features中第start到stop个词）的pattern情感评估（Sentiment.assessments的规则），返回平均极性
+
+    命中词的极性取平均；前面有修饰词（very、really等）时与修饰词合并，极性乘以修饰词的强度；
+    前面有否定词时该评估的强度取倒数并在最后乘以-0.5，因此"not very good"中否定作用在被修饰的词上；
+    否定词和修饰词可以跨过很短的词；感叹号使前一个评估的极性乘以1.25；表情符号和"(!)"单独计为一个评估。
+    """
+    known, polarity, intensity, modifier, ends_ly, negation, long_word, resets_modifier, exclamation, extra = features
+    scores, weights, negated = [], [], []
+    pending_modifier = None
+    pending_negation = False
+    for t in range(start, stop):
+        if known[t]:
+            if pending_modifier is None:
+                scores.append(polarity[t])
+                weights.append(intensity[t])
+                negated.append(False)
+            else:
+                scores[-1] = max(-1.0, min(polarity[t] * weights[-1], 1.0))
+                weights[-1] = intensity[t]
+            if pending_negation:
+                weights[-1] = 1.0 / weights[-1]
+                negated[-1] = True
+            pending_modifier = ends_ly[t] if modifier[t] else None
+            pending_negation = negation[t]
+            continue
+
+        if negation[t]:
+            pending_negation = True
+        elif pending_negation and long_word[t]:
+            pending_negation = False
+        if pending_negation and pending_modifier:
+            # 修饰词后面的否定词（"really not good"）
+            negated[-1] = True
+            pending_negation = False
+        elif pending_modifier is not None and resets_modifier[t]:
+            pending_modifier = None
+        if exclamation[t] and scores:
+            scores[-1] = max(-1.0, min(scores[-1] * 1.25, 1.0))
+        if extra[t] == extra[t]:
+            scores.append(extra[t])
+            weights.append(1.0)
+            negated.append(False)
+
+    if not scores:
+        return 0.0
+    return sum(score * -0.5 if flag else score for score, flag in zip(scores, negated)) / len(scores)
+
+
+def score_texts_lexicon(texts):
+    """
+    基于预编译词典的情感打分，分词和评估规则与TextBlob的PatternAnalyzer相同:
+    分词和查表向量化完成，每行只在Python中按词顺序执行一遍pattern的评估规则（见_assess），
+    不创建TextBlob等逐文本对象。分词的已知差异见tokenize_like_pattern。
+    """
+    lexicon = compile_polarity_lexicon()
+    # 与analyze_sentiment一致，非字符串值按str()处理
+    values = pd.Series(list(texts), dtype=object)
+    values = values.where(values.isna() | values.map(lambda text: isinstance(text, str)), values.astype(str))
+    array = pa.array(values, type=pa.string(), from_pandas=True)
+    if len(array) == 0:
+        return np.array([], dtype=float)
+
+    tokens, rows = tokenize_like_pattern(array)
+    word_ids = pc.index_in(tokens, value_set=lexicon['words'])
+    known = pc.is_valid(word_ids).to_numpy(zero_copy_only=False)
+    word_ids = pc.fill_null(word_ids, 0).to_numpy()
+    emoticon_ids = pc.index_in(tokens, value_set=lexicon['emoticons'])
+    length = pc.utf8_length(tokens).to_numpy()
+
+    features = [
+        known,
+        np.where(known, lexicon['polarity'][word_ids], 0.0),
+        np.where(known, lexicon['intensity'][word_ids], 1.0),
+        known & lexicon['is_modifier'][word_ids],
+        pc.ends_with(tokens, 'ly').to_numpy(zero_copy_only=False),
+        pc.is_in(tokens, value_set=lexicon['negations']).to_numpy(zero_copy_only=False),
+        pc.utf8_length(pc.utf8_trim(tokens, "'")).to_numpy() > 1,
+        length > 2,
+        pc.equal(tokens, '!').to_numpy(zero_copy_only=False),
+        # 表情符号的极性，"(!)"为0，其他词为NaN
+        np.where(pc.equal(tokens, '(!)').to_numpy(zero_copy_only=False), 0.0,
+                 np.append(lexicon['emoticon_polarity'], np.nan)[
+                     pc.fill_null(emoticon_ids, len(lexicon['emoticon_polarity'])).to_numpy()]),
+    ]
+    features = [feature.tolist() for feature in features]
+    bounds = np.searchsorted(rows, np.arange(len(array) + 1)).tolist()
+
+    scores = np.zeros(len(array))
+    for row in np.flatnonzero(np.diff(bounds)).tolist():
+        scores[row] = _assess(features, bounds[row], bounds[row + 1])
+    return scores
+
+
+# 情感分析后端: 名称 -> (批量打分函数, 是否使用进程池)
+# 打分函数接收文本列表，返回等长的[-1, 1]极性数组；进程池中运行的函数必须是模块级函数
+SENTIMENT_BACKENDS = {
+    'textblob': (score_texts_textblob, True),
+    'lexicon': (score_texts_lexicon, False),
+}
+
+# 部署时通过环境变量选择后端；未知的名称回退到textblob，避免到打分时才报KeyError
+DEFAULT_SENTIMENT_BACKEND = 'textblob'
+SENTIMENT_BACKEND = (os.environ.get('SENTIMENT_BACKEND') or DEFAULT_SENTIMENT_BACKEND).strip().lower()
+if SENTIMENT_BACKEND not in SENTIMENT_BACKENDS:
+    warnings.warn(f"Unknown SENTIMENT_BACKEND {SENTIMENT_BACKEND!r} (expected one of "
+                  f"{', '.join(SENTIMENT_BACKENDS)}); falling back to {DEFAULT_SENTIMENT_BACKEND!r}",
+                  RuntimeWarning)
+    SENTIMENT_BACKEND = DEFAULT_SENTIMENT_BACKEND
+
+
+def text_hashes(texts):
+    """向量化计算文本哈希（int64）"""
+    return pd.util.hash_pandas_object(texts, index=False).to_numpy().view(np.int64)
+
+
+def label_sentiment(scores):
+    """将情感得分向量化地转换为 Positive / Neutral / Negative 标签"""
+    values = np.asarray(scores, dtype=float)
+    labels = np.select(
+        [values > POSITIVE_THRESHOLD, values < NEGATIVE_THRESHOLD],
+        ['Positive', 'Negative'],
+        default='Neutral'
+    )
+    return pd.Series(labels, index=getattr(scores, 'index', None))
+
+
+def score_texts_parallel(texts, scorer=score_texts_textblob, batch_size=SENTIMENT_BATCH_SIZE,
+                         workers=SENTIMENT_WORKERS, parallel=True):
+    """分批（可选在进程池中）计算情感得分，返回与texts顺序一致的数组"""
+    texts = list(texts)
+    if not texts:
+        return np.array([], dtype=float)
+
+    batches = [texts[start:start + batch_size] for start in range(0, len(texts), batch_size)]
+    if not parallel or len(texts) < SENTIMENT_POOL_MIN_ROWS or workers <= 1:
+        results = [scorer(batch) for batch in batches]
+    else:
+        # spawn避免在多线程的Streamlit进程中fork
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            results = list(executor.map(scorer, batches))
+
+    return np.concatenate([np.asarray(result, dtype=float) for result in results])
+
+
+def _connect(store_path):
+    directory = os.path.dirname(store_path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    conn = sqlite3.connect(store_path)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sentiment_scores (
+            backend TEXT NOT NULL,
+            video_id INTEGER NOT NULL,
+            text_hash INTEGER NOT NULL,
+            score REAL NOT NULL,
+            PRIMARY KEY (backend, video_id, text_hash)
+        )
+    """)
+    return conn
+
+
+def load_store(backend, store_path=SENTIMENT_STORE_PATH):
+    """读取某个后端的全部已存储得分（进程内缓存），索引为 (video_id, text_hash)"""
+    key = (store_path, backend)
+    with _store_lock:
+        if key not in _store_cache:
+            conn = _connect(store_path)
+            try:
+                stored = pd.read_sql_query(
+                    "SELECT video_id, text_hash, score FROM sentiment_scores WHERE backend = ?",
+                    conn, params=(backend,)
+                )
+            finally:
+                conn.close()
+            _store_cache[key] = stored.set_index(['video_id', 'text_hash'])['score']
+        return _store_cache[key]
+
+
+def save_scores(backend, keys, scores, store_path=SENTIMENT_STORE_PATH):
+    """写入新计算的得分，并同步更新进程内缓存"""
+    new_scores = pd.Series(np.asarray(scores, dtype=float), index=keys)
+    rows = [(backend, int(video_id), int(text_hash), float(score))
+            for (video_id, text_hash), score in new_scores.items()]
+
+    with _store_lock:
+        conn = _connect(store_path)
+        try:
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO sentiment_scores VALUES (?, ?, ?, ?)", rows)
+        finally:
+            conn.close()
+
+        key = (store_path, backend)
+        if key in _store_cache:
+            cached = _store_cache[key]
+            _store_cache[key] = pd.concat([cached, new_scores[~new_scores.index.isin(cached.index)]])
+
+
+def get_sentiment_scores(df, text_column='video_transcription_text', id_column='video_id',
+                         backend=SENTIMENT_BACKEND, store_path=SENTIMENT_STORE_PATH):
+    """
+    返回与df索引对齐的情感得分
+
+    已存储的 (video_id, 文本哈希) 直接查表；未计算过的文本去重后计算并写回存储，
+    因此同一条文本在不同会话和重启之间只计算一次。不同后端的得分分开存储。
+    """
+    scorer, parallel = SENTIMENT_BACKENDS[backend]
+    texts = df[text_column]
+    video_ids = df[id_column].fillna(-1).astype(np.int64) if id_column in df.columns else pd.Series(-1, index=df.index)
+    keys = pd.MultiIndex.from_arrays([video_ids.to_numpy(), text_hashes(texts)], names=['video_id', 'text_hash'])
+
+    stored = load_store(backend, store_path)
+    missing = ~keys.isin(stored.index)
+    if missing.any():
+        missing_keys = keys[missing]
+        unique_positions = ~missing_keys.duplicated()
+        new_keys = missing_keys[unique_positions]
+        new_texts = texts[missing][unique_positions]
+        # 向量化后端一次处理全部文本，逐条打分的后端分批放入进程池
+        batch_size = SENTIMENT_BATCH_SIZE if parallel else max(len(new_texts), 1)
+        new_scores = score_texts_parallel(new_texts, scorer, batch_size=batch_size, parallel=parallel)
+        save_scores(backend, new_keys, new_scores, store_path)
+        stored = load_store(backend, store_path)
+
+    return pd.Series(stored.reindex(keys).to_numpy(), index=df.index, name='transcription_sentiment')
@@ -0,0 +1,164 @@
+import numpy as np
+import streamlit as st
+
+# 需要分位数的数值列（箱线图、互动率截尾、高互动阈值、滑块默认值）
+SKETCH_COLUMNS = ['video_view_count_clean', 'video_like_count_clean', 'video_share_count_clean',
+                  'video_duration_sec_clean', 'like_rate', 'share_rate']
+
+# 分位数估计的相对误差上限
+RELATIVE_ACCURACY = 0.01
+
+_GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+_LOG_GAMMA = np.log(_GAMMA)
+
+# 小于该值的正数归入最低的桶，避免极小的值使桶的范围过大
+_MIN_POSITIVE = 1e-9
+_MIN_INDEX = int(np.ceil(np.log(_MIN_POSITIVE) / _LOG_GAMMA))
+
+
+def bucket_indices(values):
+    """正值所在的对数桶编号: 桶i覆盖(gamma^(i-1), gamma^i]"""
+    values = np.maximum(np.asarray(values, dtype=float), _MIN_POSITIVE)
+    return np.maximum(np.ceil(np.log(values) / _LOG_GAMMA).astype(np.int64), _MIN_INDEX)
+
+
+class QuantileSketch:
+    """
+    可合并的分位数草图（DDSketch）: 正值按对数分桶，非正值计入零桶
+
+    估计的分位数与真实值的相对误差不超过RELATIVE_ACCURACY。合并只需把桶计数相加，
+    因此可以逐块累加，也可以按立方体单元格汇总；查询只需一次累加和，与行数无关。
+    """
+
+    def __init__(self, offset=0, counts=None, zero_count=0):
+        self.offset = offset
+        self.counts = np.zeros(0, dtype=np.int64) if counts is None else counts
+        self.zero_count = zero_count
+
+    @classmethod
+    def from_values(cls, values):
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        positive = values[values > 0]
+        if positive.size == 0:
+            return cls(zero_count=int(values.size))
+        indices = bucket_indices(positive)
+        offset = int(indices.min())
+        return cls(offset, np.bincount(indices - offset), int(values.size - positive.size))
+
+    def merge(self, other):
+        """合并另一份草图（原地修改并返回自身）"""
+        self.zero_count += other.zero_count
+        if not other.counts.size:
+            return self
+        if not self.counts.size:
+            self.offset, self.counts = other.offset, other.counts.copy()
+            return self
+
+        offset = min(self.offset, other.offset)
+        end = max(self.offset + len(self.counts), other.offset + len(other.counts))
+        counts = np.zeros(end - offset, dtype=np.int64)
+        counts[self.offset - offset:self.offset - offset + len(self.counts)] += self.counts
+        counts[other.offset - offset:other.offset - offset + len(other.counts)] += other.counts
+        self.offset, self.counts = offset, counts
+        return self
+
+    @property
+    def count(self):
+        return int(self.zero_count + self.counts.sum())
+
+    def truncated(self, upper):
+        """只保留不大于upper的值（upper所在的桶整体保留）"""
+        if upper <= 0 or not self.counts.size:
+            return QuantileSketch(zero_count=self.zero_count)
+        end = int(bucket_indices([upper])[0]) - self.offset + 1
+        return QuantileSketch(self.offset, self.counts[:max(end, 0)].copy(), self.zero_count)
+
+    def bucket_values(self):
+        """非空桶的 (代表值, 计数)，零桶在最前"""
+        values = 2 * _GAMMA ** (self.offset + np.arange(len(self.counts))) / (_GAMMA + 1)
+        values = np.concatenate([[0.0], values])
+        counts = np.concatenate([[self.zero_count], self.counts])
+        return values[counts > 0], counts[counts > 0]
+
+    def quantiles(self, qs):
+        """估计多个分位数，空草图返回NaN"""
+        total = self.count
+        if total == 0:
+            return [np.nan for _ in qs]
+
+        cumulative = np.cumsum(self.counts)
+
+        def item_value(k):
+            # 第k小（从0开始）的值所在桶的代表值
+            if k < self.zero_count:
+                return 0.0
+            bucket = min(int(np.searchsorted(cumulative, k - self.zero_count, side='right')), len(cumulative) - 1)
+            return 2 * _GAMMA ** (self.offset + bucket) / (_GAMMA + 1)
+
+        result = []
+        for q in qs:
+            # 与pandas的默认方式一致，在相邻两个秩之间线性插值
+            rank = q * (total - 1)
+            lower, upper = item_value(int(np.floor(rank))), item_value(int(np.ceil(rank)))
+            result.append(float(lower + (rank - np.floor(rank)) * (upper - lower)))
+        return result
+
+    def quantile(self, q):
+        return self.quantiles([q])[0]
+
+
+class SketchColumns:
+    """
+    每行在各分位数列上的桶编号（每个数据版本计算一次）
+
+    codes[col]中0表示零桶、-1表示缺失值，其余为 桶编号 - offsets[col] + 1。
+    任意一组行的草图只需对这些编号做一次bincount。
+    """
+
+    def __init__(self, codes, offsets, sizes):
+        self.codes = codes
+        self.offsets = offsets
+        self.sizes = sizes
+
+    @classmethod
+    def from_frame(cls, df):
+        codes, offsets, sizes = {}, {}, {}
+        for col in SKETCH_COLUMNS:
+            if col not in df.columns:
+                continue
+            values = df[col].to_numpy(dtype=float, na_value=np.nan)
+            positive = values > 0
+            indices = bucket_indices(values[positive])
+            offset = int(indices.min()) if indices.size else 0
+
+            col_codes = np.where(np.isnan(values), -1, 0).astype(np.int32)
+            col_codes[positive] = indices - offset + 1
+            codes[col] = col_codes
+            offsets[col] = offset
+            sizes[col] = int(indices.max() - offset + 2) if indices.size else 1
+        return cls(codes, offsets, sizes)
+
+    def bucket_counts(self, col, row_ids=None):
+        """给定行的 (零桶 + 各桶) 计数"""
+        codes = self.codes[col] if row_ids is None else self.codes[col][row_ids]
+        return np.bincount(codes[codes >= 0], minlength=self.sizes[col])
+
+    def sketch_from_counts(self, col, counts):
+        return QuantileSketch(self.offsets[col], counts[1:].astype(np.int64), int(counts[0]))
+
+    def sketches(self, row_ids=None):
+        """给定行（默认全部行）上每个分位数列的草图"""
+        return {col: self.sketch_from_counts(col, self.bucket_counts(col, row_ids)) for col in self.codes}
+
+
+@st.cache_resource(max_entries=4)
+def load_sketch_columns(data_key, _df):
+    """每个数据版本只计算一次桶编号；data_key标识数据版本，_df不参与缓存键"""
+    return SketchColumns.from_frame(_df)
+
+
+@st.cache_resource(max_entries=8)
+def load_filter_sketches(data_key, state_hash, _columns, _row_ids):
+    """每个过滤条件只构建一次草图；state_hash为过滤条件哈希"""
+    return _columns.sketches(_row_ids)
@@ -0,0 +1,466 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from wordcloud import STOPWORDS
+
+from utils.filters import BitmapIndex
+from utils.io import DATA_PATH, TEXT_INDEX_SUFFIX, current_cache_hash
+
+TEXT_COLUMN = 'video_transcription_text'
+
+# 文本索引文件格式变化时递增，使旧文件失效
+TEXT_INDEX_FORMAT_VERSION = 2
+
+# 出现在至少 总行数/此值 行中的词用打包位集保存（此时位集比逐个编码行号更小）
+DENSE_POSTING_RATIO = 8
+
+# 与WordCloud默认的分词规则一致
+TOKEN_PATTERN = r"\w[\w']*"
+
+# 词云显示的最大词数；只有出现次数最多的这些词会影响渲染结果
+WORDCLOUD_MAX_WORDS = 100
+
+# 二元词组得分超过该值时作为词组显示（与WordCloud的collocation_threshold默认值一致）
+COLLOCATION_THRESHOLD = 30
+
+# 每个倒排索引保留最近几次关键词查询的结果
+SEARCH_CACHE_SIZE = 8
+
+
+def tokenize_sequence(texts):
+    """
+    将文本分词为按原顺序排列的 (行号, 词, 是否为停用词) 三个数组，规则与WordCloud.process_text一致:
+    统一小写、去掉末尾的's、去掉纯数字；停用词保留在序列中，用于判断二元词组是否相邻
+    """
+    texts = pd.Series(texts).reset_index(drop=True).astype('string')
+    tokens = texts.str.lower().str.findall(TOKEN_PATTERN).explode().dropna()
+    tokens = tokens.astype(str).str.replace(r"'s$", '', regex=True)
+    tokens = tokens[(tokens.str.len() > 0) & ~tokens.str.isdigit()]
+    return tokens.index.to_numpy(), tokens.to_numpy(), tokens.isin(list(STOPWORDS)).to_numpy()
+
+
+def tokenize_texts(texts):
+    """将文本分词为 (行号, 词) 两个数组，去掉停用词"""
+    rows, tokens, stopword = tokenize_sequence(texts)
+    return rows[~stopword], tokens[~stopword]
+
+
+def collocation_scores(pair_counts, first_counts, second_counts, word_count):
+    """二元词组的Dunning似然比得分，与wordcloud.tokenization.score相同（向量化）"""
+    def log_likelihood(k, n, x):
+        return np.log(np.maximum(x, 1e-10)) * k + np.log(np.maximum(1 - x, 1e-10)) * (n - k)
+
+    c12, c1, c2 = (np.asarray(counts, dtype=float) for counts in (pair_counts, first_counts, second_counts))
+    n = float(word_count)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p, p1, p2 = c2 / n, c12 / c1, (c2 - c12) / (n - c1)
+        score = (log_likelihood(c12, c1, p) + log_likelihood(c2 - c12, n - c1, p)
+                 - log_likelihood(c12, c1, p1) - log_likelihood(c2 - c12, n - c1, p2))
+    # 只有一个词出现在全部文本中时得分为0
+    return np.where((n <= c1) | (n <= c2), 0.0, -2 * score)
+
+
+def tokenize_query_word(word):
+    """按与索引相同的规则切分一个查询词，返回(保留的词, 被忽略的停用词和数字)"""
+    kept, ignored = [], []
+    for token in re.findall(TOKEN_PATTERN, word.lower()):
+        token = token[:-2] if token.endswith("'s") else token
+        if token and (token.isdigit() or token in STOPWORDS):
+            ignored.append(token)
+        elif token:
+            kept.append(token)
+    return kept, ignored
+
+
+def parse_query(query):
+    """
+    关键词查询 -> [(必须包含的词, 必须不包含的词), ...]，各项之间为"或"
+
+    空格分隔的词需要同时出现，OR（大写）分隔多个候选条件，词前加'-'表示排除该词。
+    同时返回被忽略的停用词和数字（它们不在索引中）。
+    """
+    alternatives, ignored = [], []
+    for part in re.split(r'\s+OR\s+', query.strip()):
+        include, exclude = [], []
+        for word in part.split():
+            excluded = word.startswith('-') and len(word) > 1
+            kept, dropped = tokenize_query_word(word[1:] if excluded else word)
+            (exclude if excluded else include).extend(kept)
+            ignored.extend(dropped)
+        if include or exclude:
+            alternatives.append((include, exclude))
+    return alternatives, ignored
+
+
+def varint_sizes(values):
+    """每个非负整数变长编码后的字节数"""
+    values = np.asarray(values, dtype=np.uint64)
+    sizes = np.ones(len(values), dtype=np.int64)
+    for k in range(1, 10):
+        sizes += values >= np.uint64(1 << (7 * k))
+    return sizes
+
+
+def encode_varints(values):
+    """非负整数的变长编码（每字节7位，最高位表示后面还有字节）"""
+    values = np.asarray(values, dtype=np.uint64)
+    sizes = varint_sizes(values)
+    starts = np.cumsum(sizes) - sizes
+    data = np.empty(int(sizes.sum()), dtype=np.uint8)
+    for k in range(int(sizes.max(initial=0))):
+        has_byte = sizes > k
+        byte = (values[has_byte] >> np.uint64(7 * k)) & np.uint64(0x7F)
+        more = (sizes[has_byte] > k + 1).astype(np.uint64) << np.uint64(7)
+        data[starts[has_byte] + k] = byte | more
+    return data
+
+
+def decode_varints(data):
+    """encode_varints的逆运算（向量化，不逐个值循环）"""
+    if not data.size:
+        return np.zeros(0, dtype=np.int64)
+    last = data < 0x80
+    starts = np.flatnonzero(np.concatenate([[True], last[:-1]]))
+    value_ids = np.cumsum(last) - last
+    shifts = (7 * (np.arange(len(data)) - starts[value_ids])).astype(np.uint64)
+    payload = (data & 0x7F).astype(np.uint64) << shifts
+    return np.add.reduceat(payload, starts).astype(np.int64)
+
+
+def normalize_plurals(vocabulary):
+    """复数词映射到词表中已有的单数词（与WordCloud的normalize_plurals一致），返回每个词的目标编号"""
+    vocabulary = pd.Index(vocabulary)
+    singular = vocabulary.str[:-1]
+    plural = vocabulary.str.endswith('s') & ~vocabulary.str.endswith('ss') & singular.isin(vocabulary)
+    mapping = np.arange(len(vocabulary))
+    mapping[plural] = vocabulary.get_indexer(singular[plural])
+    return mapping
+
+
+def _factorize_terms(tokens):
+    """词编号和词表；复数词合并到单数词，去掉合并后不再使用的词"""
+    term_codes, vocabulary = pd.factorize(tokens)
+    term_codes = normalize_plurals(vocabulary)[term_codes]
+    used, term_codes = np.unique(term_codes, return_inverse=True)
+    return term_codes, np.asarray(vocabulary, dtype=object)[used]
+
+
+class TermMatrix:
+    """
+    转录文本的文档-词项稀疏矩阵（CSR格式，每个数据版本构建一次）
+
+    第i行的词为 vocabulary[indices[indptr[i]:indptr[i + 1]]]，出现次数在counts中。
+    词表的前unigram_count项为单个词，其后为二元词组（行内相邻、都不是停用词的两个词，以空格连接）；
+    任意一组行的词频只需把这些行的非零项相加，不需要重新分词。
+    """
+
+    def __init__(self, vocabulary, indptr, indices, counts, unigram_count):
+        self.vocabulary = vocabulary
+        self.indptr = indptr
+        self.indices = indices
+        self.counts = counts
+        self.unigram_count = unigram_count
+        # 二元词组中两个词的编号；词组中的复数词在单个词中已合并为单数时使用单数
+        unigrams = pd.Index(vocabulary[:unigram_count])
+        words = pd.Series(vocabulary[unigram_count:], dtype=object).str.split(' ', n=1)
+        self.bigram_words = np.zeros((len(words), 2), dtype=np.int64)
+        for position in range(2):
+            part = words.str[position]
+            ids = unigrams.get_indexer(part)
+            missing = ids < 0
+            ids[missing] = unigrams.get_indexer(part[missing].str[:-1])
+            self.bigram_words[:, position] = ids
+
+    @property
+    def row_count(self):
+        return len(self.indptr) - 1
+
+    @classmethod
+    def from_texts(cls, texts):
+        row_count = len(texts)
+        rows, tokens, stopword = tokenize_sequence(texts)
+        unigram_codes, unigrams = _factorize_terms(tokens[~stopword])
+
+        # 二元词组与WordCloud一致: 在去掉停用词之前取相邻的词，任一个是停用词时不组成词组
+        pair = (rows[1:] == rows[:-1]) & ~stopword[1:] & ~stopword[:-1]
+        bigram_codes, bigrams = _factorize_terms(tokens[:-1][pair] + ' ' + tokens[1:][pair])
+
+        rows = np.concatenate([rows[~stopword], rows[1:][pair]])
+        term_codes = np.concatenate([unigram_codes, bigram_codes + len(unigrams)])
+        vocabulary = np.concatenate([unigrams, bigrams])
+
+        # 按 (行, 词) 计数，结果按行排序
+        keys, counts = np.unique(rows.astype(np.int64) * len(vocabulary) + term_codes, return_counts=True)
+        entry_rows = keys // max(len(vocabulary), 1)
+        indptr = np.concatenate([[0], np.cumsum(np.bincount(entry_rows, minlength=row_count))]).astype(np.int64)
+        indices = (keys % max(len(vocabulary), 1)).astype(np.int32)
+        return cls(vocabulary, indptr, indices, counts.astype(np.int32), len(unigrams))
+
+    @property
+    def nbytes(self):
+        return int(self.indptr.nbytes + self.indices.nbytes + self.counts.nbytes)
+
+    def frequencies(self, row_ids=None):
+        """给定行（默认全部行）中每个词的出现次数: 对这些行的非零项按列求和"""
+        if row_ids is None:
+            return np.bincount(self.indices, weights=self.counts, minlength=len(self.vocabulary)).astype(np.int64)
+
+        row_ids = np.asarray(row_ids)
+        starts = self.indptr[row_ids]
+        lengths = self.indptr[row_ids + 1] - starts
+        # 所选行的非零项位置: 每行从starts开始的lengths个连续位置
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        return np.bincount(self.indices[positions], weights=self.counts[positions],
+                           minlength=len(self.vocabulary)).astype(np.int64)
+
+    def collocated_frequencies(self, frequencies):
+        """
+        与WordCloud.generate相同的词组处理: 得分超过阈值的二元词组作为一项显示，
+        并从组成它的两个词中扣除词组的次数；其余词组不显示
+        """
+        unigram_counts = frequencies[:self.unigram_count]
+        bigram_counts = frequencies[self.unigram_count:]
+        present = np.flatnonzero(bigram_counts)
+        first, second = self.bigram_words[present].T
+        scores = collocation_scores(bigram_counts[present], unigram_counts[first], unigram_counts[second],
+                                    unigram_counts.sum())
+        collocated = present[scores > COLLOCATION_THRESHOLD]
+
+        result = np.zeros_like(frequencies)
+        result[:self.unigram_count] = unigram_counts
+        for position in range(2):
+            np.subtract.at(result, self.bigram_words[collocated, position], bigram_counts[collocated])
+        result[self.unigram_count + collocated] = bigram_counts[collocated]
+        return np.maximum(result, 0)
+
+    def top_terms(self, frequencies, limit=WORDCLOUD_MAX_WORDS):
+        """词云中出现次数最多的limit个词或词组 {词: 次数}，次数相同时按词排序，保证结果稳定"""
+        frequencies = self.collocated_frequencies(frequencies)
+        present = np.flatnonzero(frequencies)
+        order = np.lexsort((self.vocabulary[present], -frequencies[present]))[:limit]
+        return {str(self.vocabulary[i]): int(frequencies[i]) for i in present[order]}
+
+
+def frequency_hash(frequencies):
+    """词频 {词: 次数} 的哈希，作为词云图片的缓存键"""
+    return hashlib.sha1(repr(sorted(frequencies.items())).encode('utf-8')).hexdigest()
+
+
+class InvertedIndex:
+    """
+    倒排索引: 词 -> 包含该词的行号（压缩保存，由词频矩阵中单个词的部分转置得到，每个数据版本构建一次）
+
+    每个词的行号按升序做差分后变长编码；出现在很多行中的词改为打包位集。
+    所有词的数据拼接在blob中，第t个词占 blob[offsets[t]:offsets[t + 1]]，dense[t]表示是否为位集。
+    查询只解码用到的词，耗时与这些词的行数成正比，与总行数无关。
+    最近的查询结果按查询字符串缓存，同一次运行中的候选行计数、过滤和忽略词提示只求一次交集。
+    """
+
+    def __init__(self, vocabulary, row_count, offsets, dense, blob):
+        self.vocabulary = vocabulary
+        self.row_count = row_count
+        self.offsets = offsets
+        self.dense = dense
+        self.blob = blob
+        self.term_ids = {term: i for i, term in enumerate(vocabulary)}
+        self._searches = OrderedDict()
+        self._search_lock = threading.Lock()
+
+    @classmethod
+    def from_term_matrix(cls, term_matrix):
+        row_count, term_count = term_matrix.row_count, term_matrix.unigram_count
+        # 矩阵按行排序，按词稳定排序后每个词的行号仍为升序；二元词组不参与关键词查询
+        entry_rows = np.repeat(np.arange(row_count, dtype=np.int64), np.diff(term_matrix.indptr))
+        unigram = term_matrix.indices < term_count
+        order = np.argsort(term_matrix.indices[unigram], kind='stable')
+        terms, rows = term_matrix.indices[unigram][order], entry_rows[unigram][order]
+        term_starts = np.searchsorted(terms, np.arange(term_count + 1))
+        dense = np.diff(term_starts) * DENSE_POSTING_RATIO >= row_count
+
+        # 稀疏词: 每个词内部的行号差分（第一个行号相对0）后变长编码
+        first = np.ones(len(terms), dtype=bool)
+        first[1:] = terms[1:] != terms[:-1]
+        deltas = rows - np.where(first, 0, np.concatenate([[0], rows[:-1]]))
+        sparse = ~dense[terms]
+        sizes = varint_sizes(deltas[sparse])
+        term_bytes = np.bincount(terms[sparse], weights=sizes, minlength=term_count).astype(np.int64)
+        term_bytes[dense] = (row_count + 7) // 8
+
+        offsets = np.concatenate([[0], np.cumsum(term_bytes)]).astype(np.int64)
+        blob = np.zeros(int(offsets[-1]), dtype=np.uint8)
+        # 稀疏词的编码按词连续排列，写到各自的偏移处
+        byte_terms = np.repeat(terms[sparse], sizes)
+        sparse_starts = np.concatenate([[0], np.cumsum(term_bytes * ~dense)])[:-1]
+        positions = offsets[byte_terms] + np.arange(len(byte_terms)) - sparse_starts[byte_terms]
+        blob[positions] = encode_varints(deltas[sparse])
+
+        for term in np.flatnonzero(dense):
+            blob[offsets[term]:offsets[term + 1]] = BitmapIndex.pack_ids(
+                rows[term_starts[term]:term_starts[term + 1]], row_count)
+        return cls(term_matrix.vocabulary[:term_count], row_count, offsets, dense, blob)
+
+    @property
+    def nbytes(self):
+        return int(self.offsets.nbytes + self.dense.nbytes + self.blob.nbytes)
+
+    def lookup_term(self, token):
+        """查询词对应的词编号；复数词在索引中已合并为单数时使用单数，不在索引中时返回None"""
+        if token in self.term_ids:
+            return self.term_ids[token]
+        if token.endswith('s') and not token.endswith('ss'):
+            return self.term_ids.get(token[:-1])
+        return None
+
+    def postings(self, term):
+        """一个词的匹配结果: ('ids', 升序行号) 或 ('bits', 打包位集)"""
+        data = self.blob[self.offsets[term]:self.offsets[term + 1]]
+        if self.dense[term]:
+            return 'bits', data
+        return 'ids', np.cumsum(decode_varints(data))
+
+    def _bits(self, match):
+        kind, data = match
+        return data if kind == 'bits' else BitmapIndex.pack_ids(data, self.row_count)
+
+    def _intersect(self, left, right, negate=False):
+        """left 与 right（negate为True时为left 去掉 right）；有行号时结果仍为行号，代价与行号数量成正比"""
+        (left_kind, left_data), (right_kind, right_data) = left, right
+        if left_kind == 'ids':
+            if right_kind == 'ids':
+                keep = np.isin(left_data, right_data, assume_unique=True)
+            else:
+                keep = BitmapIndex.contains(right_data, left_data)
+            return 'ids', left_data[keep != negate]
+        if right_kind == 'ids' and not negate:
+            return self._intersect(right, left)
+        right_bits = self._bits(right)
+        return 'bits', left_data & (~right_bits if negate else right_bits)
+
+    def _union(self, left, right):
+        if left[0] == 'ids' and right[0] == 'ids':
+            # 两个升序数组合并后去重（排序比哈希去重更快）
+            merged = np.sort(np.concatenate([left[1], right[1]]))
+            return 'ids', merged[np.concatenate([[True], merged[1:] != merged[:-1]])]
+        return 'bits', self._bits(left) | self._bits(right)
+
+    def search(self, query):
+        """
+        执行关键词查询，返回(匹配结果, 被忽略的词)；匹配结果为 ('ids', 升序行号) 或 ('bits', 打包位集)，
+        查询中没有可用的词时为None。索引中不存在的词不匹配任何行。结果被缓存共享，数组只读
+        """
+        with self._search_lock:
+            if query in self._searches:
+                self._searches.move_to_end(query)
+                return self._searches[query]
+
+        result = self._search(query)
+        if result[0] is not None:
+            result[0][1].flags.writeable = False
+
+        with self._search_lock:
+            self._searches[query] = result
+            while len(self._searches) > SEARCH_CACHE_SIZE:
+                self._searches.popitem(last=False)
+        return result
+
+    def _search(self, query):
+        alternatives, ignored = parse_query(query)
+        if not alternatives:
+            return None, ignored
+
+        nothing = ('ids', np.zeros(0, dtype=np.int64))
+        result = None
+        for include, exclude in alternatives:
+            include_terms = [self.lookup_term(token) for token in include]
+            if any(term is None for term in include_terms):
+                match = nothing
+            else:
+                # 从最短的列表开始求交集
+                matches = sorted((self.postings(term) for term in include_terms),
+                                 key=lambda item: len(item[1]) * (8 if item[0] == 'bits' else 1))
+                match = matches[0] if matches else ('bits', np.full((self.row_count + 7) // 8, 0xFF, dtype=np.uint8))
+                for other in matches[1:]:
+                    match = self._intersect(match, other)
+            for term in (self.lookup_term(token) for token in exclude):
+                if term is not None:
+                    match = self._intersect(match, self.postings(term), negate=True)
+            result = match if result is None else self._union(result, match)
+        return result, ignored
+
+
+def _text_index_path(path):
+    return path + TEXT_INDEX_SUFFIX
+
+
+def read_text_index(path, row_count):
+    """
+    从数据集缓存旁的文件读取(词频矩阵, 倒排索引)；文件不存在、格式不同、
+    列式缓存已失效或行数不一致时返回None
+    """
+    index_path = _text_index_path(path)
+    content_hash = current_cache_hash(path)
+    if content_hash is None or not os.path.exists(index_path):
+        return None
+    try:
+        with np.load(index_path) as data:
+            meta = json.loads(str(data['meta']))
+            if (meta.get('format') != TEXT_INDEX_FORMAT_VERSION or meta.get('content_hash') != content_hash
+                    or meta.get('row_count') != row_count):
+                return None
+            vocabulary = np.array(bytes(data['vocabulary']).decode('utf-8').split('\n'), dtype=object)
+            vocabulary = vocabulary[:meta['term_count']]
+            term_matrix = TermMatrix(vocabulary, data['indptr'], data['indices'], data['counts'], meta['unigram_count'])
+            inverted_index = InvertedIndex(vocabulary[:meta['unigram_count']], row_count,
+                                           data['offsets'], data['dense'], data['blob'])
+    except (OSError, ValueError, KeyError):
+        return None
+    return term_matrix, inverted_index
+
+
+def write_text_index(path, term_matrix, inverted_index):
+    """
+    将(词频矩阵, 倒排索引)写在数据集缓存旁，记录列式缓存对应的源文件哈希；
+    数据含有缓存之后追加的行（缓存已失效）时不写
+    """
+    content_hash = current_cache_hash(path)
+    if content_hash is None:
+        return
+    meta = {'format': TEXT_INDEX_FORMAT_VERSION, 'content_hash': content_hash, 'row_count': term_matrix.row_count,
+            'term_count': len(term_matrix.vocabulary), 'unigram_count': term_matrix.unigram_count}
+    # 词中不含换行符，词表按换行拼接保存，读取时不需要pickle
+    vocabulary = np.frombuffer('\n'.join(term_matrix.vocabulary).encode('utf-8'), dtype=np.uint8)
+    index_path = _text_index_path(path)
+    tmp_path = index_path + '.tmp.npz'
+    np.savez(tmp_path, meta=np.array(json.dumps(meta)), vocabulary=vocabulary,
+             indptr=term_matrix.indptr, indices=term_matrix.indices, counts=term_matrix.counts,
+             offsets=inverted_index.offsets, dense=inverted_index.dense, blob=inverted_index.blob)
+    os.replace(tmp_path, index_path)
+
+
+@st.cache_resource(max_entries=4)
+def load_text_index(data_key, _df, path=DATA_PATH):
+    """
+    转录文本的(词频矩阵, 倒排索引)，每个数据版本只构建一次并与数据集缓存一起保存到磁盘；
+    data_key标识数据版本，_df不参与缓存键。没有转录文本列时返回(None, None)
+    """
+    if TEXT_COLUMN not in _df.columns:
+        return None, None
+
+    cached = read_text_index(path, len(_df))
+    if cached is not None:
+        return cached
+
+    term_matrix = TermMatrix.from_texts(_df[TEXT_COLUMN])
+    inverted_index = InvertedIndex.from_term_matrix(term_matrix)
+    try:
+        write_text_index(path, term_matrix, inverted_index)
+    except OSError as e:
+        st.warning(f"Could not write text index: {e}")
+    return term_matrix, inverted_index
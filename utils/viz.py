@@ -1,24 +1,104 @@
+import io
+
+import numpy as np
+import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
+from plotly.colors import sample_colorscale
 from plotly.subplots import make_subplots
-import matplotlib.pyplot as plt
 from wordcloud import WordCloud
 import streamlit as st  # 确保这行存在
 
+# 散点图点数超过该值时改为服务器端密度栅格
+SCATTER_RASTER_THRESHOLD = 5000
+
+# 密度栅格每个坐标轴的分箱数
+SCATTER_RASTER_BINS = 80
+
+# 栅格中行数不超过该值的单元格视为稀疏区域，其中的点按原样绘制
+SCATTER_SPARSE_CELL_COUNT = 2
+
+# 稀疏点的数量上限，超过时按固定种子抽样，保证每次重新运行结果相同
+SCATTER_MAX_SPARSE_POINTS = 1000
+SCATTER_SEED = 0
+
+# 箱线图每组最多绘制的离群点数（保留离中位数最远的点）
+BOX_MAX_OUTLIERS = 200
+BOX_COLOR = '#636efa'
+
+
+def log_bin_edges(values, bins):
+    """从1到最大值的对数分箱边界（适合播放量等长尾分布），小于1的值归入第一个分箱"""
+    upper = max(float(np.max(values)), 10.0)
+    return np.logspace(0, np.log10(upper), bins + 1)
+
+
+def linear_bin_edges(values, bins, upper=None):
+    """等宽分箱边界；整数列按整数步长分箱，避免相邻分箱包含的整数个数不同"""
+    lower = float(np.min(values))
+    upper = max(float(np.max(values)) if upper is None else upper, lower)
+    if np.all(np.mod(values, 1) == 0):
+        step = max(1, int(np.ceil((upper - lower + 1) / bins)))
+        count = int(np.ceil((upper - lower + 1) / step))
+        return lower - 0.5 + step * np.arange(count + 1)
+    if upper == lower:
+        upper = lower + 1.0
+    return np.linspace(lower, upper, bins + 1)
 
-def create_histogram(df, column, title, xaxis_title, nbins=30):
-    """创建直方图"""
+
+def bin_values(values, edges):
+    """在服务器端统计每个分箱的计数，超出范围的值归入首尾分箱"""
+    codes = np.clip(np.searchsorted(edges, values, side='right') - 1, 0, len(edges) - 2)
+    return np.bincount(codes, minlength=len(edges) - 1)
+
+
+def figure_size(fig):
+    """图表序列化后发送到浏览器的字节数"""
+    return len(fig.to_json().encode('utf-8'))
+
+
+def create_histogram(df, column, title, xaxis_title, nbins=30, log_bins=False):
+    """
+    创建直方图: 在服务器端分箱，只把分箱计数发送到浏览器，图表大小与行数无关
+
+    log_bins为True时使用对数分箱和对数坐标轴（适合播放量等长尾分布）。
+    """
     if column not in df.columns or df[column].isna().all():
         st.info(f"{title} data not available")
         return None
 
-    fig = px.histogram(
-        df,
-        x=column,
-        title=title,
-        nbins=nbins
+    values = df[column].to_numpy(dtype=float, na_value=np.nan)
+    values = values[~np.isnan(values)]
+    edges = log_bin_edges(values, nbins) if log_bins else linear_bin_edges(values, nbins)
+    return create_binned_histogram(edges, bin_values(values, edges), title, xaxis_title, log_x=log_bins)
+
+
+def binned_bar_trace(edges, counts, name=None):
+    """分箱计数对应的柱状轨迹: 每根柱子覆盖一个分箱 [左边界, 右边界)"""
+    edges = np.asarray(edges, dtype=float)
+    return go.Bar(
+        x=edges[:-1],
+        y=counts,
+        width=np.diff(edges),
+        offset=0,
+        name=name,
+        customdata=np.column_stack([edges[:-1], edges[1:]]),
+        hovertemplate='%{customdata[0]:,.4g} – %{customdata[1]:,.4g}<br>Count: %{y:,}<extra></extra>'
     )
-    fig.update_layout(xaxis_title=xaxis_title, yaxis_title='Count')
+
+
+def create_binned_histogram(edges, counts, title, xaxis_title, log_x=False, selected=None):
+    """
+    根据服务器端分好的箱绘制直方图（每个分箱一根柱子），只传输分箱计数而不是原始值
+
+    selected为选中的分箱区间(起始, 结束)，其余分箱显示为半透明。
+    """
+    fig = go.Figure(binned_bar_trace(edges, counts))
+    if selected:
+        fig.update_traces(selectedpoints=list(range(selected[0], selected[1] + 1)))
+    fig.update_layout(title=title, xaxis_title=xaxis_title, yaxis_title='Count', bargap=0)
+    if log_x:
+        fig.update_xaxes(type='log')
     return fig
 
 
@@ -44,67 +124,261 @@ def create_bar_chart(x, y, title, xaxis_title="Category", yaxis_title="Count"):
     return fig
 
 
-def create_scatter_plot(df, x, y, title, opacity=0.6):
-    """创建散点图"""
-    scatter_data = df.dropna(subset=[x, y])
-    if scatter_data.empty:
+def create_correlation_heatmap(matrix, title):
+    """相关矩阵热力图；matrix为行列同名的DataFrame，颜色范围固定为[-1, 1]"""
+    labels = [col.replace('_clean', '').replace('_', ' ').title() for col in matrix.columns]
+    fig = go.Figure(go.Heatmap(
+        z=matrix.to_numpy().round(3),
+        x=labels,
+        y=labels,
+        zmin=-1,
+        zmax=1,
+        colorscale='RdBu_r',
+        texttemplate='%{z:.2f}',
+        hovertemplate='%{y} / %{x}: %{z:.3f}<extra></extra>'
+    ))
+    fig.update_layout(title=title, yaxis_autorange='reversed', height=550)
+    return fig
+
+
+def density_scatter_traces(x_values, y_values, log_x=False, log_y=False, opacity=0.6,
+                           raster_threshold=SCATTER_RASTER_THRESHOLD, showscale=True):
+    """
+    散点图轨迹: 点数不超过raster_threshold时用WebGL(scattergl)绘制全部点；
+    否则用histogram2d在服务器端统计密度栅格（对数坐标轴按对数分箱），
+    并把落在稀疏单元格中的点按原样叠加，尾部的视频不会因为抽样而消失
+
+    对数坐标轴上小于1的值按1绘制。
+    """
+    x_values = np.maximum(x_values, 1) if log_x else x_values
+    y_values = np.maximum(y_values, 1) if log_y else y_values
+
+    if len(x_values) <= raster_threshold:
+        return [go.Scattergl(x=x_values, y=y_values, mode='markers', marker=dict(opacity=opacity), name='Videos')]
+
+    x_edges = log_bin_edges(x_values, SCATTER_RASTER_BINS) if log_x else linear_bin_edges(x_values, SCATTER_RASTER_BINS)
+    y_edges = log_bin_edges(y_values, SCATTER_RASTER_BINS) if log_y else linear_bin_edges(y_values, SCATTER_RASTER_BINS)
+
+    # 二维直方图: 每个点所在的单元格只计算一次，同时用于计数和挑选稀疏点
+    x_codes = np.clip(np.searchsorted(x_edges, x_values, side='right') - 1, 0, len(x_edges) - 2)
+    y_codes = np.clip(np.searchsorted(y_edges, y_values, side='right') - 1, 0, len(y_edges) - 2)
+    shape = (len(x_edges) - 1, len(y_edges) - 1)
+    counts = np.bincount(x_codes * shape[1] + y_codes, minlength=shape[0] * shape[1]).reshape(shape)
+
+    # 稀疏单元格中的点作为真实的点绘制
+    sparse = np.flatnonzero(counts[x_codes, y_codes] <= SCATTER_SPARSE_CELL_COUNT)
+    if len(sparse) > SCATTER_MAX_SPARSE_POINTS:
+        rng = np.random.default_rng(SCATTER_SEED)
+        sparse = np.sort(rng.choice(sparse, SCATTER_MAX_SPARSE_POINTS, replace=False))
+
+    # z为每个单元格的视频数（空单元格透明）；色阶的节点按对数分布，
+    # 避免少数密集单元格占满整个色阶
+    max_count = int(counts.max())
+    levels = np.linspace(0, 1, 11)
+    stops = np.logspace(0, np.log10(max(max_count, 2)), len(levels)) / max(max_count, 2)
+    stops[-1] = 1.0
+    colorscale = [[0.0, sample_colorscale('Viridis', [0.0])[0]]]
+    colorscale += [[float(stop), color] for stop, color in zip(stops, sample_colorscale('Viridis', levels))]
+    density = go.Heatmap(
+        x=x_edges,
+        y=y_edges,
+        z=np.where(counts > 0, counts, np.nan).astype(np.float32).T,
+        zmin=0,
+        zmax=max_count,
+        colorscale=colorscale,
+        showscale=showscale,
+        colorbar=dict(title='Videos'),
+        hovertemplate='x: %{x:,.4g}<br>y: %{y:,.4g}<br>Videos: %{z:,}<extra></extra>',
+        name='Density'
+    )
+    points = go.Scattergl(
+        x=x_values[sparse],
+        y=y_values[sparse],
+        mode='markers',
+        marker=dict(size=4, color='crimson', opacity=opacity),
+        name='Sparse videos'
+    )
+    return [density, points]
+
+
+def create_scatter_plot(df, x, y, title, opacity=0.6, log_x=False, log_y=False,
+                        raster_threshold=SCATTER_RASTER_THRESHOLD):
+    """
+    创建散点图: 显示全部有效的行而不是随机抽样
+
+    点数较少时用WebGL绘制每个点，较多时绘制服务器端密度栅格并叠加稀疏区域的点，
+    发送到浏览器的数据量有上限。
+    """
+    x_values = df[x].to_numpy(dtype=float, na_value=np.nan)
+    y_values = df[y].to_numpy(dtype=float, na_value=np.nan)
+    valid = ~(np.isnan(x_values) | np.isnan(y_values))
+    if not valid.any():
         st.info("No valid data available for scatter plot")
         return None
 
-    # 对大数据集进行采样
-    scatter_sample = scatter_data.sample(min(1000, len(scatter_data)))
-    fig = px.scatter(
-        scatter_sample,
-        x=x,
-        y=y,
-        title=title,
-        opacity=opacity
-    )
+    fig = go.Figure(density_scatter_traces(x_values[valid], y_values[valid], log_x, log_y, opacity, raster_threshold))
+    fig.update_layout(title=title, xaxis_title=x, yaxis_title=y, showlegend=False)
+    if log_x:
+        fig.update_xaxes(type='log')
+    if log_y:
+        fig.update_yaxes(type='log')
     return fig
 
 
-def create_box_plot(df, x, y, title):
-    """创建箱线图"""
-    data = df.dropna(subset=[y, x])
-    if data.empty:
-        st.info("No data available for box plot")
-        return None
+def _box_data(df, x, y, upper=None):
+    """箱线图使用的 (分组, 数值) 行: 去除缺失值和大于upper的极端值"""
+    data = df[[x, y]].dropna()
+    return data if upper is None else data[data[y] <= upper]
 
-    # 去除极端值以便更好显示箱线图
-    q95 = data[y].quantile(0.95)
-    data_filtered = data[data[y] <= q95]
 
-    if data_filtered.empty:
-        st.info("No data available after filtering extremes")
-        return None
+def box_statistics(df, x, y, upper=None):
+    """
+    按x分组计算y的箱线图统计量: q1 / median / q3，以及须的端点lowerfence / upperfence
+    （1.5倍四分位距以内最远的值）。分位数和须都由向量化的groupby一次算出。
 
-    fig = px.box(
-        data_filtered,
-        x=x,
-        y=y,
-        title=title
-    )
-    return fig
+    返回以分组为索引的DataFrame；upper为去除极端值的上限。
+    """
+    data = _box_data(df, x, y, upper)
+    stats = data.groupby(x, observed=True)[y].quantile([0.25, 0.5, 0.75]).unstack()
+    stats.columns = ['q1', 'median', 'q3']
+    if stats.empty:
+        return stats
+
+    codes = pd.Categorical(data[x], categories=stats.index).codes
+    values = data[y].to_numpy(dtype=float)
+    iqr = stats['q3'] - stats['q1']
+    low = (stats['q1'] - 1.5 * iqr).to_numpy()[codes]
+    high = (stats['q3'] + 1.5 * iqr).to_numpy()[codes]
+    inside = (values >= low) & (values <= high)
+    # 每组的中位数都在须之内，因此每组至少有一个值
+    fences = pd.Series(values[inside]).groupby(codes[inside]).agg(['min', 'max'])
+    stats['lowerfence'] = fences['min'].to_numpy()
+    stats['upperfence'] = fences['max'].to_numpy()
+    return stats
+
+
+def box_statistics_from_sketches(sketches, upper=None):
+    """
+    由每个分组的分位数草图估计箱线图统计量（结构与box_statistics相同），不需要访问原始行
 
+    须的端点取1.5倍四分位距以内最远的非空桶的代表值，相对误差与草图相同。
+    """
+    rows = {}
+    for value, sketch in sketches.items():
+        if upper is not None:
+            sketch = sketch.truncated(upper)
+        if not sketch.count:
+            continue
+        q1, median, q3 = sketch.quantiles([0.25, 0.5, 0.75])
+        bucket_values, _ = sketch.bucket_values()
+        iqr = q3 - q1
+        inside = bucket_values[(bucket_values >= q1 - 1.5 * iqr) & (bucket_values <= q3 + 1.5 * iqr)]
+        rows[value] = {
+            'q1': q1,
+            'median': median,
+            'q3': q3,
+            'lowerfence': min(float(inside.min()), q1) if inside.size else q1,
+            'upperfence': max(float(inside.max()), q3) if inside.size else q3,
+        }
+    return pd.DataFrame.from_dict(rows, orient='index', columns=['q1', 'median', 'q3', 'lowerfence', 'upperfence'])
 
-def create_wordcloud(text):
-    """创建词云"""
-    if not text.strip():
-        st.info("No text available for word cloud generation")
+
+def box_outliers_from_sketches(sketches, x, y, stats, upper=None, max_outliers=BOX_MAX_OUTLIERS):
+    """
+    由分组草图得到须之外的点（结构与box_outliers相同），不需要扫描原始行:
+    每个须之外的非空桶取一个代表值，每组只保留离中位数最远的max_outliers个桶
+    """
+    groups, values = [], []
+    for value in stats.index:
+        sketch = sketches[value] if upper is None else sketches[value].truncated(upper)
+        bucket_values, _ = sketch.bucket_values()
+        row = stats.loc[value]
+        outside = bucket_values[(bucket_values < row['lowerfence']) | (bucket_values > row['upperfence'])]
+        if upper is not None:
+            # upper所在的桶整体保留，代表值不超过upper
+            outside = np.minimum(outside, upper)
+        outside = outside[np.argsort(-np.abs(outside - row['median']), kind='stable')[:max_outliers]]
+        groups.extend([value] * len(outside))
+        values.extend(outside.tolist())
+    return pd.DataFrame({x: groups, y: values})
+
+
+def box_outliers(df, x, y, stats, upper=None, max_outliers=BOX_MAX_OUTLIERS):
+    """须之外的点；每组只保留离中位数最远的max_outliers个，发送到浏览器的点数有上限"""
+    data = _box_data(df, x, y, upper)
+    codes = pd.Categorical(data[x], categories=stats.index).codes
+    known = codes >= 0
+    codes, values = codes[known], data[y].to_numpy(dtype=float)[known]
+
+    outside = (values < stats['lowerfence'].to_numpy()[codes]) | (values > stats['upperfence'].to_numpy()[codes])
+    outliers = pd.DataFrame({
+        'group': codes[outside],
+        'value': values[outside],
+        'distance': np.abs(values[outside] - stats['median'].to_numpy()[codes[outside]]),
+    })
+    outliers = outliers.sort_values('distance', ascending=False, kind='stable').groupby('group').head(max_outliers)
+    return pd.DataFrame({x: stats.index.to_numpy()[outliers['group']], y: outliers['value'].to_numpy()})
+
+
+def create_box_plot(df, x, y, title, upper=None, stats=None, outliers=None, max_outliers=BOX_MAX_OUTLIERS):
+    """
+    创建箱线图: 只把每组预先算好的统计量和有上限的离群点发送到浏览器，而不是全部数据点
+
+    upper为去除极端值的上限（默认为y列的95%分位数）；stats和outliers为预先算好的统计量和离群点
+    （例如由分组草图估计），默认分别由box_statistics和box_outliers在df上计算。
+    """
+    if upper is None:
+        upper = df[y].quantile(0.95)
+    if stats is None:
+        stats = box_statistics(df, x, y, upper)
+    if stats.empty:
+        st.info("No data available for box plot")
         return None
 
+    groups = [str(value) for value in stats.index]
+    fig = go.Figure(go.Box(
+        x=groups,
+        q1=stats['q1'],
+        median=stats['median'],
+        q3=stats['q3'],
+        lowerfence=stats['lowerfence'],
+        upperfence=stats['upperfence'],
+        marker_color=BOX_COLOR,
+        name=y
+    ))
+    if outliers is None:
+        outliers = box_outliers(df, x, y, stats, upper, max_outliers)
+    if not outliers.empty:
+        fig.add_trace(go.Scatter(
+            x=outliers[x].astype(str),
+            y=outliers[y],
+            mode='markers',
+            marker=dict(size=4, color=BOX_COLOR),
+            name='Outliers'
+        ))
+    fig.update_layout(title=title, xaxis_title=x, yaxis_title=y, showlegend=False)
+    return fig
+
+
+def create_wordcloud(frequencies):
+    """由词频 {词: 次数} 渲染词云，返回PNG图片的字节（固定随机种子，相同词频得到相同图片）"""
     wordcloud = WordCloud(
         width=800,
         height=400,
         background_color='white',
-        max_words=100
-    ).generate(text)
+        max_words=100,
+        random_state=SCATTER_SEED
+    ).generate_from_frequencies(frequencies)
 
-    fig, ax = plt.subplots(figsize=(10, 5))
-    ax.imshow(wordcloud, interpolation='bilinear')
-    ax.axis('off')
-    ax.set_title('Video Transcription Word Cloud')
-    return fig
+    buffer = io.BytesIO()
+    wordcloud.to_image().save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+@st.cache_data(max_entries=32)
+def render_wordcloud(frequency_hash, _frequencies):
+    """按词频哈希缓存词云图片；frequency_hash为缓存键，_frequencies不参与缓存键"""
+    return create_wordcloud(_frequencies)
 
 
 def create_comprehensive_dashboard(filtered_df):
@@ -127,35 +401,26 @@ def create_comprehensive_dashboard(filtered_df):
         rows=2, cols=2,
         subplot_titles=('View Count Distribution', 'Duration Distribution',
                         'Views vs Duration', 'Top Categories by Average Views'),
-        specs=[[{"type": "histogram"}, {"type": "histogram"}],
+        specs=[[{"type": "bar"}, {"type": "bar"}],
                [{"type": "scatter"}, {"type": "bar"}]]
     )
 
-    # View count distribution
-    fig.add_trace(
-        go.Histogram(x=dashboard_data['video_view_count_clean'], name='View Distribution'),
-        row=1, col=1
-    )
+    # View count distribution（服务器端对数分箱）
+    views = dashboard_data['video_view_count_clean'].to_numpy(dtype=float)
+    view_edges = log_bin_edges(views, 30)
+    fig.add_trace(binned_bar_trace(view_edges, bin_values(views, view_edges), name='View Distribution'), row=1, col=1)
+    fig.update_xaxes(type='log', row=1, col=1)
 
-    # Duration distribution
-    fig.add_trace(
-        go.Histogram(x=dashboard_data['video_duration_sec_clean'], name='Duration Distribution'),
-        row=1, col=2
-    )
+    # Duration distribution（服务器端分箱）
+    durations = dashboard_data['video_duration_sec_clean'].to_numpy(dtype=float)
+    duration_edges = linear_bin_edges(durations, 30)
+    fig.add_trace(binned_bar_trace(duration_edges, bin_values(durations, duration_edges), name='Duration Distribution'),
+                  row=1, col=2)
 
-    # Views vs Duration scatter
-    scatter_sample = dashboard_data.sample(min(500, len(dashboard_data)))
-    if not scatter_sample.empty:
-        fig.add_trace(
-            go.Scatter(
-                x=scatter_sample['video_duration_sec_clean'],
-                y=scatter_sample['video_view_count_clean'],
-                mode='markers',
-                name='Views vs Duration',
-                marker=dict(size=8, opacity=0.6)
-            ),
-            row=2, col=1
-        )
+    # Views vs Duration scatter（全部视频: 点数较多时为密度栅格加稀疏点）
+    for trace in density_scatter_traces(durations, views, log_y=True, showscale=False):
+        fig.add_trace(trace, row=2, col=1)
+    fig.update_yaxes(type='log', row=2, col=1)
 
     # Top categories by average views
     if 'content_category' in dashboard_data.columns: